@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Andreas Franck <a.franck@soton.ac.uk>
+# Copyright (C) 2018 University of Southampton
+
+# Code accompanying the paper:
+
+# Andreas Franck and Filippo Maria Fazi, “VISR – A versatile open software
+# framework for audio signal processing,” in Proc. Audio Eng. Soc. 2018 Int. Conf.
+# Spatial Reproduction, Tokyo, Japan, 2018.
+
+# We kindly ask to acknowledge the use of this software in publications or software
+# by citing this paper.
+
+# The code is provided under the ISC (Internet Systems Consortium) license
+# https://www.isc.org/downloads/software-support-policy/isc-license/ :
+
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS
+# OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+File analyse_layouts.py
+
+Full-sphere quality analysis of the loudspeaker layouts for VBAP and VBAP L2 panning.
+
+For every layout file, the panning gains are computed on a regular direction
+grid with the panning components of the renderers, i.e., rcl.PanningCalculator
+(VbapRenderer) and VbapL2Panner (VbapL2Renderer, including its closed-form
+engine for planar layouts and its fallbacks), and the angular errors and magnitudes of the energy (rE) and velocity (rV)
+vectors are evaluated in bulk with the functions of helper.panningVectorMetrics.
+The layouts are analysed in parallel processes.
+
+Results written to the output directory:
+  <layout>_analysis.npz  Heatmaps (#elevations x #azimuths) reErrorVbap, reMagVbap,
+                         rvErrorVbap, rvMagVbap and the same for L2, plus the
+                         grid values azimuth and elevation (degree).
+  summary.json           Area-weighted statistics per layout and method. The
+                         failures of the L2 method are the directions rendered
+                         with fallback gains.
+
+Usage: python analyse_layouts.py [LAYOUT.xml ...] [--output DIR] [--resolution DEG] [--methods vbap l2]
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import glob
+import json
+import os
+
+import numpy as np
+
+from gain_table import gridDirections, gridSize
+from helper.vectorFunctions import normalise, angleDifference
+from helper.panningVectorMetrics import re, rv
+
+def vectorMetrics( gains, L, directions ):
+    """
+    Angular errors (degree) and magnitudes of the rE and rV vectors.
+
+    Parameters
+    ----------
+    gains: np.ndarray
+        Gains, dimension #directions x #loudspeakers. NaN rows yield NaN metrics.
+    L: np.ndarray
+        Unit loudspeaker direction vectors, dimension 3 x #loudspeakers.
+    directions: np.ndarray
+        Intended source directions, dimension #directions x 3.
+
+    Returns
+    -------
+    dict with reError, reMag, rvError, rvMag, each of dimension #directions.
+    """
+    with np.errstate( invalid='ignore', divide='ignore' ):
+        _, reDir, reMag = re( gains, L )
+        _, rvDir, rvMag = rv( gains, L )
+        return { 'reError': np.rad2deg( angleDifference( directions, reDir.T ) ),
+                 'reMag': reMag,
+                 'rvError': np.rad2deg( angleDifference( directions, rvDir.T ) ),
+                 'rvMag': rvMag }
+
+def summaryStatistics( values, weights ):
+    """
+    Area-weighted mean, 95th percentile and maximum of a heatmap, ignoring NaN entries.
+    """
+    valid = np.isfinite( values )
+    v, w = values[valid], weights[valid]
+    if v.size == 0:
+        return { 'mean': None, 'p95': None, 'max': None }
+    order = np.argsort( v )
+    cumWeights = np.cumsum( w[order] ) / np.sum( w )
+    p95 = v[order][min( np.searchsorted( cumWeights, 0.95 ), v.size-1 )]
+    return { 'mean': float( np.sum( v * w ) / np.sum( w ) ), 'p95': float( p95 ), 'max': float( np.max( v ) ) }
+
+def componentGains( component, directions, inputName, outputName, statusName = None ):
+    """
+    Run a panning component as a top-level signal flow and collect its gains.
+
+    Parameters
+    ----------
+    component: visr.Component
+        Panning component with a parameter input for the object vector and a
+        gain matrix output (#loudspeakers x #objects).
+    directions: np.ndarray
+        Source directions, dimension #directions x 3. They are processed in
+        blocks of as many point sources as the component has objects.
+    inputName, outputName: string
+        Names of the object input and the gain output.
+    statusName: string or None
+        Name of an optional per-object status output.
+
+    Returns
+    -------
+    gains: np.ndarray, dimension #directions x #loudspeakers
+    status: np.ndarray, dimension #directions, or None
+    """
+    import rrl
+    from scene_state import SceneState
+    flow = rrl.AudioSignalFlow( component )
+    objectPort = flow.parameterReceivePort( inputName )
+    gainPort = flow.parameterSendPort( outputName )
+    statusPort = flow.parameterSendPort( statusName ) if statusName is not None else None
+    numObjects = np.asarray( gainPort.data() ).shape[1]
+    scene = SceneState()
+    for objectId in range( numObjects ):
+        scene.addPointSource( objectId )
+    gains = []
+    status = []
+    for start in range( 0, directions.shape[0], numObjects ):
+        chunk = directions[start:start+numObjects]
+        # Unused objects of the last block repeat the last direction.
+        scene.updatePositions( np.concatenate( (chunk, np.repeat( chunk[-1:], numObjects-chunk.shape[0], axis=0 )) ) )
+        scene.push( objectPort, force=True )
+        flow.process()
+        gains.append( np.array( gainPort.data() ).T[:chunk.shape[0]] )
+        if statusPort is not None:
+            status.append( np.array( statusPort.data() )[:chunk.shape[0]] )
+    return np.concatenate( gains ), (np.concatenate( status ) if statusPort is not None else None)
+
+def analyseLayout( lspArray, resolution = 5.0, methods = ('vbap', 'l2'), numberOfObjects = 64 ):
+    """
+    Compute the heatmaps and summary statistics for a layout.
+
+    Parameters
+    ----------
+    lspArray: panning.LoudspeakerArray
+    resolution: float
+        Azimuth and elevation grid spacing in degree.
+    methods: sequence of strings
+        'vbap' and/or 'l2'.
+    numberOfObjects: int
+        Number of directions computed per block of the panning components.
+
+    Returns
+    -------
+    heatmaps: dict of np.ndarray (#elevations x #azimuths)
+    summary: dict
+    """
+    numAz, numEl = gridSize( resolution, resolution )
+    directions = np.reshape( gridDirections( resolution, resolution ), (-1,3) )
+    # Area weights of the grid points.
+    weights = np.cos( np.arcsin( np.clip( directions[:,2], -1.0, 1.0 ) ) ) + 1e-6
+    import visr
+    context = visr.SignalFlowContext( 64, 48000 )
+    numberOfRegularLoudspeakers = lspArray.numberOfRegularLoudspeakers
+    L = normalise( np.asarray( lspArray.positions(), dtype=np.float64 ), norm=2, axis=-1 )[:numberOfRegularLoudspeakers].T
+    heatmaps = { 'azimuth': -180.0 + resolution * np.arange( numAz ),
+                 'elevation': -90.0 + resolution * np.arange( numEl ) }
+    summary = {}
+    for method in methods:
+        if method == 'vbap':
+            import rcl
+            calculator = rcl.PanningCalculator( context, "VbapGainCalculator", None,
+                                               numberOfObjects, arrayConfig=lspArray )
+            gains, _ = componentGains( calculator, directions, 'objectVectorInput', 'vbapGains' )
+            failures = np.any( np.isnan( gains ), axis=-1 )
+        elif method == 'l2':
+            from vbap_l2_panner import VbapL2Panner, solverStatusOptimal
+            calculator = VbapL2Panner( context, "VbapGainCalculator", None,
+                                      numberOfObjects, lspArray, statusOutput=True )
+            gains, status = componentGains( calculator, directions, 'objects', 'gains', 'status' )
+            failures = status != solverStatusOptimal
+        else:
+            raise ValueError( "analyseLayout: Unknown method '%s'." % method )
+        metrics = vectorMetrics( gains, L, directions )
+        suffix = 'Vbap' if method == 'vbap' else 'L2'
+        summary[method] = { 'failures': int( np.count_nonzero( failures ) ) }
+        for key, values in metrics.items():
+            heatmaps[key + suffix] = np.reshape( values, (numEl, numAz) ).astype( np.float32 )
+            summary[method][key] = summaryStatistics( values, weights )
+    return heatmaps, summary
+
+def analyseLayoutFile( layoutFile, outputDirectory, resolution, methods ):
+    """
+    Analyse a layout file and write its heatmaps. Executed in a worker process.
+    """
+    import panning
+    lspArray = panning.LoudspeakerArray( layoutFile )
+    heatmaps, summary = analyseLayout( lspArray, resolution, methods )
+    name = os.path.splitext( os.path.basename( layoutFile ) )[0]
+    np.savez_compressed( os.path.join( outputDirectory, name + '_analysis.npz' ), **heatmaps )
+    return name, summary
+
+def main():
+    parser = argparse.ArgumentParser( description="Full-sphere rE/rV analysis of loudspeaker layouts." )
+    parser.add_argument( 'layouts', nargs='*',
+                        help='Layout files (default: all XML files in ../data).' )
+    parser.add_argument( '--output', default='layout_analysis', help='Output directory.' )
+    parser.add_argument( '--resolution', type=float, default=5.0,
+                        help='Grid resolution in degree (default: 5).' )
+    parser.add_argument( '--methods', nargs='+', default=['vbap', 'l2'], choices=['vbap', 'l2'] )
+    parser.add_argument( '--workers', type=int, default=None,
+                        help='Number of worker processes (default: number of CPUs).' )
+    args = parser.parse_args()
+    layouts = args.layouts if args.layouts else \
+        sorted( glob.glob( os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), '..', 'data', '*.xml' ) ) )
+    os.makedirs( args.output, exist_ok=True )
+    summaries = {}
+    with ProcessPoolExecutor( args.workers ) as pool:
+        futures = [ pool.submit( analyseLayoutFile, layout, args.output, args.resolution, args.methods )
+                   for layout in layouts ]
+        for future in futures:
+            name, summary = future.result()
+            summaries[name] = summary
+            for method, stats in summary.items():
+                if stats['reError']['mean'] is None:
+                    print( "%-20s %-5s no valid directions, failures %d" % (name, method, stats['failures']) )
+                    continue
+                print( "%-20s %-5s rE error mean %5.1f max %5.1f deg, rE magnitude mean %.3f, failures %d"
+                      % (name, method, stats['reError']['mean'], stats['reError']['max'],
+                         stats['reMag']['mean'], stats['failures']) )
+    with open( os.path.join( args.output, 'summary.json' ), 'w' ) as fh:
+        json.dump( { 'resolution': args.resolution, 'layouts': summaries }, fh, indent=2 )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Andreas Franck <a.franck@soton.ac.uk>
+# Copyright (C) 2018 University of Southampton
+
+# Code accompanying the paper:
+
+# Andreas Franck and Filippo Maria Fazi, “VISR – A versatile open software
+# framework for audio signal processing,” in Proc. Audio Eng. Soc. 2018 Int. Conf.
+# Spatial Reproduction, Tokyo, Japan, 2018.
+
+# We kindly ask to acknowledge the use of this software in publications or software
+# by citing this paper.
+
+# The code is provided under the ISC (Internet Systems Consortium) license
+# https://www.isc.org/downloads/software-support-policy/isc-license/ :
+
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS
+# OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+Batch rendering service for object-based scenes.
+
+The service watches a queue directory for job files and renders them in a pool
+of worker processes. Each worker keeps its renderer instances (signal flows)
+per loudspeaker layout and renderer type, so the import, construction and
+solver setup cost is paid once per worker instead of once per clip.
+
+Queue directory layout:
+
+  incoming/    New jobs, one JSON file per job. Write the file under a different
+               name (e.g., *.tmp) and rename it to *.json to submit it atomically.
+  processing/  Jobs currently rendered.
+  done/        Finished jobs.
+  failed/      Jobs that raised an error, unchanged, and the error message for each
+               job in <job>.error.txt.
+  metrics.jsonl
+               One line of metrics (latency, processing time, real-time factor) per job.
+
+Job file format:
+
+  { "audio": [ "objects.wav" ],         # Object signals, channels numbered consecutively
+    "metadata": "scene.json",           # Metadata timeline, see offline_rendering.py
+    "layout": "../data/bs2051-4+5+0.xml",
+    "renderer": "vbap",                 # "vbap" or "l2"
+    "output": "rendered.wav",
+    "blockSize": 512 }                  # Optional
+
+Relative paths are interpreted relative to the job file's original directory.
+
+Usage: python batch_render_service.py QUEUE_DIRECTORY [--workers N] [--once]
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import json
+import os
+import time
+
+import numpy as np
+
+defaultBlockSize = 512
+
+# Renderer instances of a worker process, see getRenderer().
+rendererCache = {}
+
+def objectCapacity( numObjects ):
+    """
+    Number of renderer inputs used for a job with numObjects objects.
+
+    The renderers mix only active objects, so unused inputs are free. Rounding up
+    to a power of two lets jobs with similar object counts share a renderer.
+    """
+    return max( 8, 1 << int( np.ceil( np.log2( max( numObjects, 1 ) ) ) ) )
+
+def getRenderer( layoutFile, rendererType, numObjects, blockSize, samplingFrequency ):
+    """
+    Return a cached (flow, objectInput, numberOfOutputs) tuple, creating the renderer on first use.
+
+    Returns
+    -------
+    entry: tuple
+        The signal flow, its object parameter input and the number of outputs.
+    warm: bool
+        Whether the renderer was taken from the cache.
+    """
+    key = (os.path.abspath( layoutFile ), rendererType, numObjects, blockSize, samplingFrequency)
+    if key in rendererCache:
+        return rendererCache[key], True
+    import visr
+    import panning
+    import rrl
+    context = visr.SignalFlowContext( blockSize, samplingFrequency )
+    lc = panning.LoudspeakerArray( layoutFile )
+    if rendererType == 'vbap':
+        from vbap_renderer import VbapRenderer
+        renderer = VbapRenderer( context, 'renderer', None, numObjects, lc,
+                                adaptiveObjectCount = True )
+    elif rendererType == 'l2':
+        from vbap_l2_renderer import VbapL2Renderer
+        renderer = VbapL2Renderer( context, 'renderer', None, numObjects, lc,
+                                  adaptiveObjectCount = True )
+    else:
+        raise ValueError( "Unknown renderer type '%s'." % rendererType )
+    flow = rrl.AudioSignalFlow( renderer )
+    # The renderer object must be kept alive together with the flow.
+    entry = (flow, flow.parameterReceivePort( 'objects' ), lc.numberOfRegularLoudspeakers, renderer)
+    rendererCache[key] = entry
+    return entry, False
+
+def resetRenderer( flow, objectInput, numObjects, blockSize ):
+    """
+    Bring a reused renderer into its initial state: an empty scene fades out the
+    gains of the previous job within one block of silence.
+    """
+    objectInput.data().set( [] )
+    objectInput.swapBuffers()
+    flow.process( np.zeros( (numObjects, blockSize), dtype=np.float32 ) )
+
+def renderJob( jobFile, baseDirectory ):
+    """
+    Render a single job. Executed in a worker process.
+
+    Returns
+    -------
+    dict with the metrics of the job.
+    """
+    from offline_rendering import MetadataTimeline, readAudioFiles, writeAudioFile, renderOffline
+    startTime = time.time()
+    with open( jobFile, 'r' ) as fh:
+        job = json.load( fh )
+    resolve = lambda path: os.path.join( baseDirectory, path )
+    blockSize = int( job.get( 'blockSize', defaultBlockSize ) )
+    inputSignal, fs = readAudioFiles( [ resolve( f ) for f in job['audio'] ] )
+    timeline = MetadataTimeline.fromFile( resolve( job['metadata'] ) )
+    capacity = objectCapacity( inputSignal.shape[0] )
+    paddedInput = np.zeros( (capacity, inputSignal.shape[-1]), dtype=np.float32 )
+    paddedInput[:inputSignal.shape[0],:] = inputSignal
+
+    constructionStart = time.time()
+    (flow, objectInput, numOutputs, _), warm = getRenderer( resolve( job['layout'] ), job['renderer'],
+                                                           capacity, blockSize, fs )
+    if warm:
+        resetRenderer( flow, objectInput, capacity, blockSize )
+    constructionTime = time.time() - constructionStart
+
+    output, realtimeFactor = renderOffline( flow, objectInput, paddedInput, timeline,
+                                           blockSize, fs, numOutputs )
+    writeAudioFile( resolve( job['output'] ), output, fs )
+    return { 'job': os.path.basename( jobFile ),
+             'renderer': job['renderer'],
+             'layout': job['layout'],
+             'objects': int( inputSignal.shape[0] ),
+             'duration': inputSignal.shape[-1] / fs,
+             'warm': warm,
+             'constructionTime': constructionTime,
+             'processingTime': time.time() - startTime,
+             'realtimeFactor': realtimeFactor,
+             'worker': os.getpid() }
+
+class BatchRenderService:
+    """
+    Queue directory watcher distributing jobs to a process pool.
+    """
+    def __init__( self, queueDirectory, numWorkers = None ):
+        self.queueDirectory = queueDirectory
+        self.dirs = { name: os.path.join( queueDirectory, name )
+                     for name in ['incoming', 'processing', 'done', 'failed'] }
+        for path in self.dirs.values():
+            os.makedirs( path, exist_ok=True )
+        self.metricsFile = os.path.join( queueDirectory, 'metrics.jsonl' )
+        self.numWorkers = numWorkers
+        self.pool = ProcessPoolExecutor( numWorkers )
+        self.pending = {}
+
+    def restartPool( self ):
+        """
+        Replace a broken pool, e.g., after a worker process crashed. The jobs of the
+        broken pool fail with BrokenProcessPool, the new workers start with empty
+        renderer caches.
+        """
+        self.pool.shutdown( wait=False )
+        self.pool = ProcessPoolExecutor( self.numWorkers )
+
+    def claimJobs( self ):
+        """
+        Move new job files to the processing directory and submit them to the pool.
+        """
+        for fileName in sorted( os.listdir( self.dirs['incoming'] ) ):
+            if not fileName.endswith( '.json' ):
+                continue
+            source = os.path.join( self.dirs['incoming'], fileName )
+            submitTime = os.path.getmtime( source )
+            target = os.path.join( self.dirs['processing'], fileName )
+            os.replace( source, target )
+            try:
+                future = self.pool.submit( renderJob, target, self.dirs['incoming'] )
+            except BrokenProcessPool:
+                self.restartPool()
+                future = self.pool.submit( renderJob, target, self.dirs['incoming'] )
+            self.pending[future] = (fileName, submitTime, self.pool)
+
+    def collectResults( self ):
+        """
+        Record the metrics of finished jobs and move their files.
+        """
+        poolBroken = False
+        for future in [ f for f in self.pending if f.done() ]:
+            fileName, submitTime, pool = self.pending.pop( future )
+            processingPath = os.path.join( self.dirs['processing'], fileName )
+            try:
+                metrics = future.result()
+                os.replace( processingPath, os.path.join( self.dirs['done'], fileName ) )
+            except Exception as ex:
+                # The job file is moved as it is, it might not be valid JSON.
+                poolBroken |= isinstance( ex, BrokenProcessPool ) and (pool is self.pool)
+                error = "%s: %s" % (type( ex ).__name__, ex)
+                metrics = { 'job': fileName, 'error': error }
+                os.replace( processingPath, os.path.join( self.dirs['failed'], fileName ) )
+                with open( os.path.join( self.dirs['failed'], os.path.splitext( fileName )[0] + '.error.txt' ),
+                          'w' ) as fh:
+                    fh.write( error + '\n' )
+            metrics['latency'] = time.time() - submitTime
+            with open( self.metricsFile, 'a' ) as fh:
+                fh.write( json.dumps( metrics ) + '\n' )
+            print( "%s: %s" % (fileName, 'failed: ' + metrics['error'] if 'error' in metrics
+                              else 'done, %.1fx real time, latency %.2f s'
+                              % (metrics['realtimeFactor'], metrics['latency'])) )
+        if poolBroken:
+            self.restartPool()
+
+    def run( self, pollInterval = 0.5, once = False ):
+        """
+        Process jobs until interrupted, or until the queue is empty if once is True.
+        """
+        try:
+            while True:
+                self.claimJobs()
+                self.collectResults()
+                if once and not self.pending:
+                    break
+                time.sleep( pollInterval )
+        finally:
+            self.pool.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser( description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter )
+    parser.add_argument( 'queueDirectory', help='Root of the queue directory.' )
+    parser.add_argument( '--workers', type=int, default=None,
+                        help='Number of worker processes (default: number of CPUs).' )
+    parser.add_argument( '--poll-interval', type=float, default=0.5,
+                        help='Interval for checking for new jobs in seconds (default: 0.5).' )
+    parser.add_argument( '--once', action='store_true',
+                        help='Exit when all queued jobs are finished.' )
+    args = parser.parse_args()
+    BatchRenderService( args.queueDirectory, args.workers ).run( args.poll_interval, args.once )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Andreas Franck <a.franck@soton.ac.uk>
+# Copyright (C) 2018 University of Southampton
+
+# Code accompanying the paper:
+
+# Andreas Franck and Filippo Maria Fazi, “VISR – A versatile open software
+# framework for audio signal processing,” in Proc. Audio Eng. Soc. 2018 Int. Conf.
+# Spatial Reproduction, Tokyo, Japan, 2018.
+
+# We kindly ask to acknowledge the use of this software in publications or software
+# by citing this paper.
+
+# The code is provided under the ISC (Internet Systems Consortium) license
+# https://www.isc.org/downloads/software-support-policy/isc-license/ :
+
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS
+# OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+File benchmark_import_time.py
+
+Measure the import time of the renderer modules using 'python -X importtime'.
+
+Each entry point is imported in a fresh interpreter, so the measured times include
+all dependencies pulled in by the module. The script reports the total import
+time per module (median over several runs) and flags whether any of the heavy
+optional dependencies (cvxpy, matplotlib, visr_bst) are loaded.
+
+Usage: python benchmark_import_time.py [-n RUNS] [module ...]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+# Modules that define the renderer components. The run_*/simulate_* scripts are
+# not included because they start processing when imported.
+defaultEntryPoints = [ 'gain_matrix',
+                      'vbap_renderer',
+                      'vbap_l2_panner',
+                      'vbap_l2_renderer',
+                      'panning_auralization' ]
+
+# Dependencies that should only be loaded by the features that use them.
+heavyDependencies = [ 'cvxpy', 'matplotlib', 'visr_bst' ]
+
+def parseImportTime( stderrOutput ):
+    """
+    Parse the output of 'python -X importtime'.
+
+    Parameters
+    ----------
+    stderrOutput: string
+        The text written to stderr by the interpreter.
+
+    Returns
+    -------
+    total: float
+        Total cumulative import time in seconds (sum over all top-level imports).
+    cumulative: dict
+        Cumulative import time in seconds for each imported module.
+    """
+    total = 0.0
+    cumulative = {}
+    for line in stderrOutput.splitlines():
+        if not line.startswith( 'import time:' ):
+            continue
+        fields = line[len('import time:'):].split( '|' )
+        try:
+            cumUs = int( fields[1] )
+        except ValueError:
+            continue # Header line
+        moduleName = fields[2].rstrip()
+        # Top-level imports are not indented beyond the separating space.
+        if not moduleName.startswith( '  ' ):
+            total += 1e-6 * cumUs
+        cumulative[moduleName.strip()] = 1e-6 * cumUs
+    return total, cumulative
+
+def measureImportTime( moduleName, runs ):
+    """
+    Import a module in a fresh interpreter a number of times.
+
+    Returns
+    -------
+    times: np.ndarray
+        Total import times in seconds, one per run.
+    cumulative: dict
+        Per-module cumulative times of the last run.
+    """
+    times = np.zeros( runs )
+    cumulative = {}
+    scriptDir = os.path.dirname( os.path.abspath( __file__ ) )
+    for runIdx in range(runs):
+        res = subprocess.run( [sys.executable, '-X', 'importtime', '-c',
+                               'import ' + moduleName ],
+                             cwd=scriptDir, stdout=subprocess.DEVNULL,
+                             stderr=subprocess.PIPE, universal_newlines=True )
+        if res.returncode != 0:
+            lastLine = res.stderr.strip().splitlines()[-1]
+            raise RuntimeError( "Importing %s failed: %s" % (moduleName, lastLine) )
+        times[runIdx], cumulative = parseImportTime( res.stderr )
+    return times, cumulative
+
+def main():
+    parser = argparse.ArgumentParser( description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter )
+    parser.add_argument( 'modules', nargs='*', default=defaultEntryPoints,
+                        help='Modules to be measured.' )
+    parser.add_argument( '-n', '--runs', type=int, default=5,
+                        help='Number of runs per module (default: 5).' )
+    args = parser.parse_args()
+
+    print( "%-24s %10s %10s  %s" % ('module', 'median[ms]', 'max[ms]', 'heavy dependencies loaded') )
+    for moduleName in args.modules:
+        try:
+            times, cumulative = measureImportTime( moduleName, args.runs )
+        except RuntimeError as ex:
+            print( "%-24s %s" % (moduleName, str(ex)) )
+            continue
+        loaded = [ dep for dep in heavyDependencies if dep in cumulative ]
+        print( "%-24s %10.1f %10.1f  %s" % (moduleName, 1e3*np.median(times),
+                                           1e3*np.max(times),
+                                           ', '.join(loaded) if loaded else '-' ) )
+
+if __name__ == "__main__":
+    main()
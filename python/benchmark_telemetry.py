@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Andreas Franck <a.franck@soton.ac.uk>
+# Copyright (C) 2018 University of Southampton
+
+# Code accompanying the paper:
+
+# Andreas Franck and Filippo Maria Fazi, “VISR – A versatile open software
+# framework for audio signal processing,” in Proc. Audio Eng. Soc. 2018 Int. Conf.
+# Spatial Reproduction, Tokyo, Japan, 2018.
+
+# We kindly ask to acknowledge the use of this software in publications or software
+# by citing this paper.
+
+# The code is provided under the ISC (Internet Systems Consortium) license
+# https://www.isc.org/downloads/software-support-policy/isc-license/ :
+
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS
+# OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+File benchmark_telemetry.py
+
+Measure the cost of publishing a telemetry record (see telemetry.py) relative to
+the block period, for several loudspeaker and object counts. The measurement
+uses the ring buffer directly, i.e., it does not require VISR. With telemetry
+disabled, the renderers do not instantiate the telemetry component at all.
+"""
+
+import numpy as np
+import time
+
+from telemetry import TelemetryWriter, TelemetryReader
+
+blockSize = 512
+samplingFrequency = 48000
+numIterations = 20000
+
+# (loudspeakers, objects) combinations, e.g., stereo, 4+5+0, 9+10+3
+configurations = [ (2, 16), (9, 64), (22, 64), (22, 256) ]
+
+blockPeriod = blockSize / samplingFrequency
+
+print( "%4s %8s %10s %10s %10s %12s" % ('lsp', 'objects', 'mean[us]', '99%[us]', 'max[us]', 'max/period') )
+for numLsp, numObjects in configurations:
+    name = 'telemetry_benchmark_%d' % np.random.randint( 1 << 30 )
+    writer = TelemetryWriter( name, numLsp, numObjects )
+    # A concurrently attached reader does not influence the writer, attach one to verify.
+    reader = TelemetryReader( name )
+    gains = np.random.rand( numLsp, numObjects ).astype( np.float32 )
+    positions = np.random.rand( numObjects, 3 ).astype( np.float32 )
+    status = np.zeros( numObjects, dtype=np.int32 )
+    times = np.zeros( numIterations )
+    for idx in range( numIterations ):
+        start = time.perf_counter()
+        writer.publish( idx, gains, positions, status )
+        times[idx] = time.perf_counter() - start
+    assert reader.latest()['block'] == numIterations-1
+    reader.close()
+    writer.close()
+    print( "%4d %8d %10.2f %10.2f %10.2f %11.3f%%"
+          % (numLsp, numObjects, 1e6*np.mean( times ), 1e6*np.percentile( times, 99 ),
+             1e6*np.max( times ), 100.0*np.max( times )/blockPeriod ) )
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Andreas Franck <a.franck@soton.ac.uk>
+# Copyright (C) 2018 University of Southampton
+
+# Code accompanying the paper:
+
+# Andreas Franck and Filippo Maria Fazi, “VISR – A versatile open software
+# framework for audio signal processing,” in Proc. Audio Eng. Soc. 2018 Int. Conf.
+# Spatial Reproduction, Tokyo, Japan, 2018.
+
+# We kindly ask to acknowledge the use of this software in publications or software
+# by citing this paper.
+
+# The code is provided under the ISC (Internet Systems Consortium) license
+# https://www.isc.org/downloads/software-support-policy/isc-license/ :
+
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS
+# OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+File brir_cache.py
+
+Preprocessing and caching of BRIR data sets for the panning auralization.
+
+Parsing a multi-speaker BRIR SOFA file and truncating and transforming the
+impulse responses takes a considerable time at every start of the renderer.
+prepareBrirCache() performs these steps once for a given loudspeaker layout and
+block size. It keeps only the BRIRs of the emitters that correspond to the
+loudspeakers of the layout and stores the time-domain BRIRs and the
+frequency-domain partitions for uniformly partitioned convolution as .npy files
+that are subsequently loaded as memory-mapped arrays.
+
+The SOFA file is read with h5py, which is only required for creating a cache entry.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from partitioned_convolution import computeFilterPartitions
+from helper.baseTrigFunctions import deg2rad, sph2cart
+from helper.vectorFunctions import normalise
+
+# Increment if the format of the cached data changes.
+cacheFormatVersion = 1
+
+class BrirCache:
+    """
+    Container for a preprocessed BRIR data set, typically loaded from cache files.
+
+    Attributes
+    ----------
+    listenerViews: np.ndarray
+        Listener view directions as unit vectors, dimension #orientations x 3.
+    listenerViewsSofa: np.ndarray
+        Listener views as stored in the SOFA file (ListenerView variable).
+    brirs: np.ndarray
+        Time-domain BRIRs, dimension #orientations x #loudspeakers x 2 x #taps.
+    delays: np.ndarray
+        Delays of the BRIRs in samples, dimension #orientations x #loudspeakers x 2
+    partitions: np.ndarray
+        Frequency-domain partitions for the block size of the cache (delays included),
+        dimension #orientations x 2 x #loudspeakers x #partitions x (blockSize+1)
+    blockSize: int
+        Partition size.
+    samplingFrequency: int
+        Sampling frequency of the BRIRs.
+    """
+    def __init__( self, listenerViews, listenerViewsSofa, brirs, delays, partitions,
+                 blockSize, samplingFrequency ):
+        self.listenerViews = listenerViews
+        self.listenerViewsSofa = listenerViewsSofa
+        self.brirs = brirs
+        self.delays = delays
+        self.partitions = partitions
+        self.blockSize = blockSize
+        self.samplingFrequency = samplingFrequency
+
+def sofaPositionsToCartesian( positions, coordinateType ):
+    """
+    Convert a SOFA position variable (... x 3) to unit direction vectors.
+    """
+    if coordinateType == 'spherical':
+        cart = sph2cart( deg2rad( positions[...,0] ), deg2rad( positions[...,1] ), 1.0 )
+    else:
+        cart = positions
+    return normalise( cart, norm=2, axis=-1 )
+
+def readSofaAttribute( variable, name, default ):
+    value = variable.attrs.get( name, default )
+    return value.decode() if isinstance( value, bytes ) else str( value )
+
+def truncateImpulseResponses( irs, truncationLength, windowLength = 16 ):
+    """
+    Truncate impulse responses to a given length and apply a half-cosine fade-out.
+    """
+    if (truncationLength is None) or (truncationLength >= irs.shape[-1]):
+        return irs
+    truncated = np.array( irs[...,:truncationLength] )
+    windowLength = min( windowLength, truncationLength )
+    fade = 0.5 * (1.0 + np.cos( np.pi * np.arange( 1, windowLength+1 ) / windowLength ))
+    truncated[...,truncationLength-windowLength:] *= fade
+    return truncated
+
+def cacheKey( sofaFile, lspConfig, blockSize, samplingFrequency, irTruncationLength ):
+    """
+    Create a key identifying a cache entry from all parameters that influence its content.
+    """
+    stat = os.stat( sofaFile )
+    numLsp = lspConfig.numberOfRegularLoudspeakers
+    description = { 'version': cacheFormatVersion,
+                    'sofaFile': os.path.abspath( sofaFile ),
+                    'size': stat.st_size,
+                    'mtime': stat.st_mtime_ns,
+                    'loudspeakers': np.round( lspConfig.positions()[:numLsp,:], 4 ).tolist(),
+                    'blockSize': blockSize,
+                    'samplingFrequency': samplingFrequency,
+                    'irTruncationLength': irTruncationLength }
+    return hashlib.sha1( json.dumps( description, sort_keys=True ).encode() ).hexdigest()[:16]
+
+def loadBrirCache( basePath ):
+    """
+    Load a cache entry created by prepareBrirCache(). The BRIR arrays are memory-mapped.
+    """
+    meta = np.load( basePath + '_meta.npz' )
+    return BrirCache( listenerViews = meta['listenerViews'],
+                     listenerViewsSofa = meta['listenerViewsSofa'],
+                     brirs = np.load( basePath + '_brirs.npy', mmap_mode='r' ),
+                     delays = meta['delays'],
+                     partitions = np.load( basePath + '_partitions.npy', mmap_mode='r' ),
+                     blockSize = int( meta['blockSize'] ),
+                     samplingFrequency = int( meta['samplingFrequency'] ) )
+
+def prepareBrirCache( sofaFile, lspConfig, blockSize, samplingFrequency, *,
+                     cacheDirectory = None,
+                     irTruncationLength = None,
+                     maxDirectionError = 5.0 ):
+    """
+    Return the preprocessed BRIRs for a loudspeaker layout, creating the cache entry if necessary.
+
+    Parameters
+    ----------
+    sofaFile: string
+        Path to a SOFA file following the MultiSpeakerBRIR convention
+        (Data.IR dimension #orientations x #ears x #emitters x #taps).
+    lspConfig: panning.LoudspeakerArray
+        Loudspeaker layout. For each regular loudspeaker, the emitter with the
+        closest direction is selected.
+    blockSize: int
+        Block size of the renderer, used as the partition size.
+    samplingFrequency: int
+        Sampling frequency of the renderer. Must match the SOFA file.
+    cacheDirectory: string or None
+        Directory for the cache files. Default: subdirectory 'brircache' next to the SOFA file.
+    irTruncationLength: int or None
+        Maximum length of the BRIRs in samples. None retains the full length.
+    maxDirectionError: float
+        Maximum angle in degree between a loudspeaker and the matched emitter direction.
+
+    Returns
+    -------
+    BrirCache
+    """
+    if cacheDirectory is None:
+        cacheDirectory = os.path.join( os.path.dirname( os.path.abspath( sofaFile ) ), 'brircache' )
+    key = cacheKey( sofaFile, lspConfig, blockSize, samplingFrequency, irTruncationLength )
+    basePath = os.path.join( cacheDirectory, os.path.splitext( os.path.basename( sofaFile ) )[0]
+                            + '_' + key )
+    if os.path.exists( basePath + '_meta.npz' ):
+        return loadBrirCache( basePath )
+
+    import h5py # Only needed for creating the cache.
+    with h5py.File( sofaFile, 'r' ) as fh:
+        sofaFs = int( np.asarray( fh['Data.SamplingRate'] ).flat[0] )
+        if sofaFs != samplingFrequency:
+            raise ValueError( "prepareBrirCache: Sampling frequency of SOFA file (%d Hz) does not match %d Hz."
+                             % (sofaFs, samplingFrequency) )
+        irVar = fh['Data.IR']
+        if irVar.ndim != 4:
+            raise ValueError( "prepareBrirCache: SOFA file does not follow the MultiSpeakerBRIR convention." )
+        numOrientations, numEars, numEmitters, _ = irVar.shape
+        emitterVar = fh['EmitterPosition']
+        emitterPos = np.asarray( emitterVar )
+        if emitterPos.ndim == 3:
+            emitterPos = emitterPos[:,:,0]
+        emitterDirs = sofaPositionsToCartesian( emitterPos,
+                                               readSofaAttribute( emitterVar, 'Type', 'cartesian' ) )
+        viewVar = fh['ListenerView']
+        listenerViewsSofa = np.broadcast_to( np.asarray( viewVar ), (numOrientations, 3) ).copy()
+        listenerViews = sofaPositionsToCartesian( listenerViewsSofa,
+                                                 readSofaAttribute( viewVar, 'Type', 'cartesian' ) )
+        if 'Data.Delay' in fh:
+            sofaDelays = np.asarray( fh['Data.Delay'], dtype=np.float64 )
+            sofaDelays = np.broadcast_to( np.reshape( sofaDelays, sofaDelays.shape
+                                                     + (1,)*(3-sofaDelays.ndim) ),
+                                         (numOrientations, numEars, numEmitters) )
+        else:
+            sofaDelays = np.zeros( (numOrientations, numEars, numEmitters) )
+
+        # Match the loudspeakers to the emitters.
+        numLsp = lspConfig.numberOfRegularLoudspeakers
+        lspDirs = normalise( lspConfig.positions()[:numLsp,:], norm=2, axis=-1 )
+        cosAngles = np.clip( lspDirs @ emitterDirs.T, -1.0, 1.0 )
+        emitterIndices = np.argmax( cosAngles, axis=-1 )
+        maxError = np.rad2deg( np.max( np.arccos( cosAngles[np.arange(numLsp), emitterIndices] ) ) )
+        if maxError > maxDirectionError:
+            raise ValueError( "prepareBrirCache: The SOFA file does not contain BRIRs for all loudspeakers "
+                             "(maximum direction error %.1f deg)." % maxError )
+
+        irLength = irVar.shape[-1] if irTruncationLength is None \
+          else min( irVar.shape[-1], irTruncationLength )
+        delays = np.transpose( sofaDelays[:,:,emitterIndices], (0,2,1) )
+        # The partitions include the integer part of the delays.
+        maxDelay = int( np.round( np.max( delays ) ) )
+
+        os.makedirs( cacheDirectory, exist_ok=True )
+        brirs = np.lib.format.open_memmap( basePath + '_brirs.npy', mode='w+', dtype=np.float32,
+                                          shape=(numOrientations, numLsp, numEars, irLength) )
+        numPartitions = max( 1, -(-(irLength+maxDelay) // blockSize) )
+        partitions = np.lib.format.open_memmap( basePath + '_partitions.npy', mode='w+',
+                                               dtype=np.complex64,
+                                               shape=(numOrientations, numEars, numLsp,
+                                                      numPartitions, blockSize+1) )
+        # Process one orientation at a time to limit the memory consumption.
+        for oIdx in range( numOrientations ):
+            # h5py requires increasing indices for fancy indexing.
+            irs = np.asarray( irVar[oIdx,...] )[:,emitterIndices,:] # ears x lsp x taps
+            irs = truncateImpulseResponses( irs, irTruncationLength )
+            brirs[oIdx,...] = np.transpose( irs, (1,0,2) )
+            delayed = np.zeros( (numEars, numLsp, numPartitions*blockSize), dtype=np.float32 )
+            for earIdx in range( numEars ):
+                for lspIdx in range( numLsp ):
+                    d = int( np.round( delays[oIdx,lspIdx,earIdx] ) )
+                    delayed[earIdx,lspIdx,d:d+irLength] = irs[earIdx,lspIdx,:]
+            partitions[oIdx,...] = computeFilterPartitions( delayed, blockSize )
+        brirs.flush()
+        partitions.flush()
+        del brirs, partitions
+    # The metadata file is written last, its existence marks a complete cache entry.
+    np.savez( basePath + '_meta.npz', listenerViews=listenerViews,
+             listenerViewsSofa=listenerViewsSofa, delays=delays,
+             blockSize=blockSize, samplingFrequency=samplingFrequency )
+    return loadBrirCache( basePath )
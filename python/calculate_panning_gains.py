@@ -39,13 +39,13 @@ panning algorithm and compare them to the standard VBAP algorithm.
 import visr
 import rcl
 import rrl
-import objectmodel as om
 import panning
 import numpy as np;
-import matplotlib.pyplot as plt
 
 # Import the VbapL2 panner.
 from vbap_l2_panner import VbapL2Panner
+from trajectory import sphericalTrajectory
+from scene_state import SceneState
 
 from helper.baseTrigFunctions import rad2deg, sph2cart
 from helper.vectorFunctions import angleDifference
@@ -61,6 +61,9 @@ numBlocks = 360
 
 numObjects = 1
 
+# Whether to plot the results (requires matplotlib).
+plotResults = True
+
 # Load the loudspeaker configuation
 lc = panning.LoudspeakerArray( '../data/bs2051-4+5+0.xml' )
 
@@ -88,6 +91,12 @@ paramOutputL2 = flowL2.parameterSendPort('gains')
 az = np.linspace( 0.0, 2*np.pi, numBlocks )
 el = 10.0*np.pi/180.0
 
+# Compute all positions before the simulation loop. The point source object is
+# kept in a scene state and only its position is updated in each iteration.
+positions = sphericalTrajectory( az, el, 1.0 )
+scene = SceneState()
+scene.addPointSource( 0 ) # 0 is the source id, also used as the channel index.
+
 # %% Preallocate a matrix of output gains (#numLsp x #directions)
 gainsVbap = np.zeros( (numBlocks, numLsp) )
 gainsL2 = np.zeros( (numBlocks, numLsp) )
@@ -95,36 +104,20 @@ gainsL2 = np.zeros( (numBlocks, numLsp) )
 # %% Run the simulation as a number of iterations, where a new source position
 # is set in each iteration.
 for bi in range(0,numBlocks):
-    # Create a point source with a givel azimuth and elevation.
-    ps1 = om.PointSource(0) # 0 is the source id.
-    ps1.position = sph2cart( az[bi], el, 1.0 )
-    # Set other object properties.
-    ps1.channels = [0]; ps1.level=1.0
-
-    # Send the point source as input to the VBAP panning gain calculator.
-    ovVbap = paramInputVbap.data()
-    ovVbap.set( [ps1] )
-    # Trigger sending of a new parameter value./
-    paramInputVbap.swapBuffers()
+    # Send the point source as input to the VBAP panning gain calculator and the VBAP L2 panner.
+    # This triggers sending of a new parameter value if the position changed.
+    scene.updatePositions( positions[bi:bi+1] )
+    scene.push( paramInputVbap, paramInputL2 )
     # Run the signal flow graph for one iteration.
     flowVbap.process()
     # Obtain the computed gains from the parameter output port of the signal flow.
     gainsVbap[bi,:] = np.array(paramOutputVbap.data())[:,0]
 
     # Same for the VBAP L2 panner.
-    ovL2 = paramInputL2.data()
-    ovL2.set( [ps1] )
-    paramInputL2.swapBuffers()
     flowL2.process()
     gainsL2[bi,:] = np.array(paramOutputL2.data())[:,0]
 
 
-# Plot the gains for two specific loudspeakers (U+110 and U-110)
-plt.figure()
-plt.plot( 180/np.pi*az, gainsVbap[:,7], 'b.:', 180/np.pi*az, gainsVbap[:,8], 'b.-', label = 'VBAP' )
-plt.plot( 180/np.pi*az, gainsL2[:,7], 'm.:', 180/np.pi*az, gainsL2[:,8], 'm.-', label = 'VBAP L2' )
-plt.gca().legend()
-
 # %% Compute energy vector difference
 L = lc.positions()[:numLsp,...]
 
@@ -138,13 +131,24 @@ reAngleDiffL2 = rad2deg(angleDifference( pDes.T, reDirVbapL2.T) )
 
 azDeg = rad2deg( az )
 
-plt.figure()
-plt.plot( azDeg, reAngleDiff, linestyle='-', color=(0.5,0.5,0.5) )
-plt.plot( azDeg, reAngleDiffL2, linestyle='-', color='red' )
-plt.xlabel( 'Source azimuth [deg]' )
-plt.ylabel( 'Energy direction error [deg]')
-plt.tight_layout()
-plt.gca().set_aspect( 3 )
+# %% Plot the results.
+# matplotlib is imported only here because it takes a noticeable time to load.
+if plotResults:
+    import matplotlib.pyplot as plt
+
+    # Plot the gains for two specific loudspeakers (U+110 and U-110)
+    plt.figure()
+    plt.plot( 180/np.pi*az, gainsVbap[:,7], 'b.:', 180/np.pi*az, gainsVbap[:,8], 'b.-', label = 'VBAP' )
+    plt.plot( 180/np.pi*az, gainsL2[:,7], 'm.:', 180/np.pi*az, gainsL2[:,8], 'm.-', label = 'VBAP L2' )
+    plt.gca().legend()
+
+    plt.figure()
+    plt.plot( azDeg, reAngleDiff, linestyle='-', color=(0.5,0.5,0.5) )
+    plt.plot( azDeg, reAngleDiffL2, linestyle='-', color='red' )
+    plt.xlabel( 'Source azimuth [deg]' )
+    plt.ylabel( 'Energy direction error [deg]')
+    plt.tight_layout()
+    plt.gca().set_aspect( 3 )
 # Save plots and plot data
 #plt.savefig( '../../figures/offline_simulation_energy_direction_difference.pdf' )
 # reData = np.concatenate( (np.reshape( azDeg, (1,-1) ), np.reshape(reAngleDiff, (1,-1)), np.reshape(reAngleDiffL2, (1,-1))), axis=0 )
@@ -37,17 +37,16 @@ on a circular trajectory.
 import visr
 #import rcl
 import rrl
-import objectmodel as om
 import panning
 
 
 import numpy as np;
-import matplotlib.pyplot as plt
 
 from vbap_l2_renderer import VbapL2Renderer
 from vbap_renderer import VbapRenderer
 
-from helper.baseTrigFunctions import sph2cart
+from trajectory import sphericalTrajectory
+from scene_state import SceneState
 
 bs = 128
 samplingFrequency = 48000
@@ -56,6 +55,9 @@ numBlocks = 128
 
 numObjects = 1
 
+# Whether to plot the results (requires matplotlib).
+plotResults = True
+
 signalLength = bs * numBlocks
 t = 1.0/samplingFrequency * np.arange(0,signalLength)
 
@@ -79,6 +81,12 @@ az = np.linspace( 0, 2.0*np.pi, numBlocks )
 el = 10.0 * np.pi/180.0
 r = 1.0
 
+# Compute the whole trajectory before the processing loop. The point source
+# object is kept in a scene state and only its position is updated per block.
+positions = sphericalTrajectory( az, el, r )
+scene = SceneState()
+scene.addPointSource( 0 )
+
 inSig = np.zeros( (numObjects, signalLength ), dtype=np.float32 )
 inSig[0,:] = 0.75*np.sin( 2.0*np.pi*88 * t )
 
@@ -87,26 +95,21 @@ outSigVbap = np.zeros( (numOutputChannels, signalLength ), dtype=np.float32 )
 
 
 for bi in range(0,numBlocks):
-    # x,y,z = sph2cart( az[bi], el, r )
-    ps1 = om.PointSource(0)
-    # ps1.position = [x,y,z]
-    ps1.position = sph2cart( az[bi], el, r )
-    ps1.channels = [0]; ps1.level=1.0
-
-    paramInput.data().set( [ps1] )
-    paramInput.swapBuffers()
+    scene.updatePositions( positions[bi:bi+1] )
+    scene.push( paramInput, paramInputVbap )
     outSigL2[:,bi*bs:(bi+1)*bs] = flow.process( inSig[:, bi*bs:(bi+1)*bs] )
-
-    paramInputVbap.data().set( [ps1] )
-    paramInputVbap.swapBuffers()
     outSigVbap[:,bi*bs:(bi+1)*bs] = flowVbap.process( inSig[:, bi*bs:(bi+1)*bs] )
 
 
 
-plt.figure()
-plt.plot( t, outSigL2[7,:], 'r-', label='VBAP L2' )
-plt.plot( t, outSigVbap[7,:], 'b-', label='VBAP' )
-plt.xlabel( 'time [s]' )
-plt.ylabel( 'Amplitude' )
-plt.tight_layout()
-plt.gca().set_aspect( 0.25 )
+# matplotlib is imported only here because it takes a noticeable time to load.
+if plotResults:
+    import matplotlib.pyplot as plt
+
+    plt.figure()
+    plt.plot( t, outSigL2[7,:], 'r-', label='VBAP L2' )
+    plt.plot( t, outSigVbap[7,:], 'b-', label='VBAP' )
+    plt.xlabel( 'time [s]' )
+    plt.ylabel( 'Amplitude' )
+    plt.tight_layout()
+    plt.gca().set_aspect( 0.25 )
@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Andreas Franck <a.franck@soton.ac.uk>
+# Copyright (C) 2018 University of Southampton
+
+# Code accompanying the paper:
+
+# Andreas Franck and Filippo Maria Fazi, “VISR – A versatile open software
+# framework for audio signal processing,” in Proc. Audio Eng. Soc. 2018 Int. Conf.
+# Spatial Reproduction, Tokyo, Japan, 2018.
+
+# We kindly ask to acknowledge the use of this software in publications or software
+# by citing this paper.
+
+# The code is provided under the ISC (Internet Systems Consortium) license
+# https://www.isc.org/downloads/software-support-policy/isc-license/ :
+
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS
+# OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+File direct_binaural.py
+
+Binaural rendering of panned objects without the virtual loudspeaker signals.
+
+Panning followed by virtual loudspeaker rendering convolves every loudspeaker
+signal with two BRIRs, so the cost scales with the number of loudspeakers.
+Since both stages are linear, an object can instead be convolved directly with
+its combined object-to-ear filter, i.e., the sum of the BRIRs of the
+loudspeakers weighted by the panning gains of the object. This is cheaper if
+there are fewer active objects than loudspeakers and the objects do not move
+too often: the combined filter of an object must be recomputed if its gains or
+the head orientation change. With VBAP, only the BRIRs of the (at most three)
+loudspeakers of an object contribute to its filter.
+
+DirectBinauralRenderer estimates the cost of both paths from the number of
+active objects and the observed update rate, and selects the cheaper one.
+Path switches and filter updates are crossfaded over one block.
+"""
+
+import numpy as np
+
+import visr
+import pml
+import panning
+import objectmodel
+
+from vbap_gains import VbapCalculator
+from gain_matrix import objectChannel
+from partitioned_convolution import multiplyAccumulate
+from helper.rotationFunctions import rotationMatrix
+
+class DirectBinauralRenderer( visr.AtomicComponent ):
+    """
+    VBAP panning and binaural rendering of single-channel objects using uniformly
+    partitioned convolution, with an automatic choice between a direct
+    object-to-binaural path and the virtual loudspeaker path.
+
+    The delay line of the object signals is always maintained, the one of the
+    loudspeaker signals only on the loudspeaker path. When switching to the
+    loudspeaker path, it is reconstructed from the object delay line with the
+    current gains.
+
+    In the direct path, the current gains are applied to the complete filter
+    history of an object, i.e., including the reverberant tail of earlier
+    signal parts. The resulting deviations from the loudspeaker path are limited
+    to the blocks following position changes, and are smoothed by the crossfade.
+    """
+    def __init__( self, context, name, parent, *,
+                 numberOfObjects,
+                 lspConfig,
+                 filterPartitions,
+                 listenerViews = None,
+                 headTracking = False,
+                 initialFilterSet = 0,
+                 pathSelection = "auto",
+                 switchHysteresis = 0.8,
+                 updateRateSmoothing = 0.05 ):
+        """
+        Constructor.
+
+        Parameters
+        ----------
+        context: visr.SignalFlowContext
+            A context object containing the sampling frequency and the block size.
+        name: string
+            Name of the component to be identified within a containing component.
+        parent: visr.CompositeComponent
+            A containing component, or None if this is the top-level component.
+        numberOfObjects: int
+            Number of object audio channels.
+        lspConfig: panning.LoudspeakerArray
+            Loudspeaker configuration, must match the loudspeakers of the filters.
+        filterPartitions: np.ndarray
+            Frequency-domain BRIR partitions as stored in the BRIR cache, dimension
+            #filterSets x 2 x #loudspeakers x #partitions x (period+1).
+        listenerViews: np.ndarray or None
+            Unit vectors of the listener view direction for each filter set, dimension
+            #filterSets x 3. Mandatory if headTracking is True.
+        headTracking: bool
+            Whether a parameter input "tracking" (pml.ListenerPosition) is created.
+        initialFilterSet: int
+            Index of the filter set used initially, respectively without head tracking.
+        pathSelection: string
+            "auto" (default) selects the path with the lower estimated cost, see pathCosts().
+            "direct" and "loudspeaker" force the respective path.
+        switchHysteresis: float
+            The path is switched only if the estimated cost of the other path is below this
+            fraction of the cost of the current path.
+        updateRateSmoothing: float
+            Coefficient of the exponential averaging of the update statistics per block.
+        """
+        super().__init__( context, name, parent )
+        if not isinstance( lspConfig, panning.LoudspeakerArray ):
+            lspConfig = panning.LoudspeakerArray( lspConfig )
+        if pathSelection not in ["auto", "direct", "loudspeaker"]:
+            raise ValueError( "DirectBinauralRenderer: Unknown pathSelection '%s'." % pathSelection )
+        self.calculator = VbapCalculator.fromLoudspeakerArray( lspConfig )
+        numLsp = self.calculator.numberOfRegularLoudspeakers
+        if filterPartitions.ndim != 5 or filterPartitions.shape[1] != 2 \
+           or filterPartitions.shape[2] != numLsp or filterPartitions.shape[-1] != context.period+1:
+            raise ValueError( "DirectBinauralRenderer: filterPartitions does not match the loudspeaker configuration or the block size." )
+        self.filters = filterPartitions
+        self.blockSize = context.period
+        self.numberOfObjects = numberOfObjects
+        self.numberOfLoudspeakers = numLsp
+        self.pathSelection = pathSelection
+        self.switchHysteresis = switchHysteresis
+        self.updateRateSmoothing = updateRateSmoothing
+        numPartitions, numBins = filterPartitions.shape[3:]
+
+        self.audioIn = visr.AudioInputFloat( "in", self, numberOfObjects )
+        self.audioOut = visr.AudioOutputFloat( "out", self, 2 )
+        self.objectIn = visr.ParameterInput( "objects", self,
+                                            pml.ObjectVector.staticType,
+                                            pml.DoubleBufferingProtocol.staticType,
+                                            pml.EmptyParameterConfig() )
+        if headTracking:
+            if listenerViews is None:
+                raise ValueError( "DirectBinauralRenderer: Head tracking requires the listenerViews argument." )
+            self.listenerViews = np.asarray( listenerViews )
+            self.trackingIn = visr.ParameterInput( "tracking", self,
+                pml.ListenerPosition.staticType,
+                pml.DoubleBufferingProtocol.staticType,
+                pml.EmptyParameterConfig() )
+        else:
+            self.trackingIn = None
+
+        # Frequency-domain delay lines (newest spectrum at partition index 0).
+        self.objectBuffer = np.zeros( (numberOfObjects, 2*self.blockSize), dtype=np.float32 )
+        self.objectFdl = np.zeros( (numberOfObjects, numPartitions, numBins ), dtype=filterPartitions.dtype )
+        self.lspBuffer = np.zeros( (numLsp, 2*self.blockSize), dtype=np.float32 )
+        self.lspFdl = np.zeros( (numLsp, numPartitions, numBins ), dtype=filterPartitions.dtype )
+
+        self.gains = np.zeros( (numLsp, numberOfObjects), dtype=np.float32 )
+        self.filterSet = initialFilterSet
+        # Combined filters of all objects, valid only for the objects marked in filtersValid.
+        self.objectFilters = np.zeros( (2, numberOfObjects, numPartitions, numBins), dtype=filterPartitions.dtype )
+        self.filtersValid = np.ones( numberOfObjects, dtype=bool )
+        self.activeObjects = np.zeros( 0, dtype=int )
+        self.activeFilters = self.objectFilters[:,:0,...]
+        self.directPath = pathSelection != "loudspeaker"
+        self.fadeIn = np.arange( 1, self.blockSize+1, dtype=np.float32 ) / self.blockSize
+        self.fadeOut = 1.0 - self.fadeIn
+        self.pathSwitches = 0
+        # Exponentially averaged fraction of blocks with gain updates and number of updated objects per block.
+        self.updateRate = 0.0
+        self.updatedObjectsRate = 0.0
+
+    def pathCosts( self, numActiveObjects, support ):
+        """
+        Estimated cost per block of the direct and the loudspeaker path, in complex
+        multiply-accumulate operations.
+
+        The direct path convolves the active objects, renders twice in blocks with
+        updates (crossfade), and recomputes the combined filters of the updated
+        objects, each from `support` loudspeakers. The loudspeaker path convolves
+        and transforms all loudspeaker signals.
+        """
+        numPartitions, numBins = self.filters.shape[3:]
+        convolution = 2 * numPartitions * numBins
+        # Real FFT of length 2*blockSize, approximately.
+        fft = 0.3 * numBins * np.log2( 2 * self.blockSize )
+        directCost = numActiveObjects * convolution * (1.0 + self.updateRate) \
+          + self.updatedObjectsRate * support * convolution
+        lspCost = self.numberOfLoudspeakers * (convolution + fft)
+        return directCost, lspCost
+
+    def selectPath( self, numActiveObjects, support ):
+        """
+        Return True if the direct path is to be used.
+        """
+        if self.pathSelection != "auto":
+            return self.pathSelection == "direct"
+        directCost, lspCost = self.pathCosts( numActiveObjects, support )
+        if self.directPath:
+            return not (lspCost < self.switchHysteresis * directCost)
+        return directCost < self.switchHysteresis * lspCost
+
+    def updateObjectFilters( self, objects ):
+        """
+        Recompute the combined filters of the given objects from their own nonzero gains.
+        """
+        if len( objects ) == 0:
+            return
+        objectGains = self.gains[:,objects] # #loudspeakers x #objects
+        support = max( 1, int( np.max( np.sum( objectGains != 0.0, axis=0 ) ) ) )
+        # The loudspeakers with the largest gains of each object (padded with zero gains).
+        lspIndices = np.argsort( -objectGains, axis=0, kind='stable' )[:support,:] # support x #objects
+        weights = np.take_along_axis( objectGains, lspIndices, axis=0 )
+        brirs = self.filters[self.filterSet] # 2 x #loudspeakers x #partitions x #bins
+        combined = np.zeros( (2, len( objects )) + brirs.shape[2:], dtype=brirs.dtype )
+        for k in range( support ):
+            combined += brirs[:,lspIndices[k],...] * weights[k][np.newaxis,:,np.newaxis,np.newaxis]
+        self.objectFilters[:,objects,...] = combined
+        self.filtersValid[objects] = True
+
+    def calculateGains( self, objectVector ):
+        """
+        Panning gains of the point sources in the object vector, dimension #loudspeakers x #objects.
+        """
+        gains = np.zeros_like( self.gains )
+        sources = [ obj for obj in objectVector
+                   if isinstance( obj, objectmodel.PointSource ) and obj.level != 0.0
+                   and 0 <= objectChannel( obj ) < self.numberOfObjects ]
+        if sources:
+            columns = np.array( [ objectChannel( obj ) for obj in sources ] )
+            directions = np.array( [ obj.position for obj in sources ], dtype=np.float64 )
+            levels = np.array( [ obj.level for obj in sources ] )
+            gains[:,columns] = (np.atleast_2d( self.calculator.calculateGains( directions ) )
+                                * levels[:,np.newaxis]).T
+        return gains
+
+    def updateDelayLine( self, buffer, fdl, signals ):
+        buffer[:,:self.blockSize] = buffer[:,self.blockSize:]
+        buffer[:,self.blockSize:] = signals
+        fdl[:,1:,:] = fdl[:,:-1,:]
+        fdl[:,0,:] = np.fft.rfft( buffer, axis=-1 )
+
+    def render( self, directPath, filterSet ):
+        """
+        Compute the binaural output block of one path from the current delay lines.
+        """
+        if directPath:
+            spectrum = multiplyAccumulate( self.activeFilters, self.objectFdl[self.activeObjects,...] )
+        else:
+            spectrum = multiplyAccumulate( self.filters[filterSet], self.lspFdl )
+        return np.fft.irfft( spectrum, n=2*self.blockSize, axis=-1 )[:,self.blockSize:]
+
+    def process( self ):
+        """
+        Process function, executed for each block.
+        """
+        objectSignals = np.asarray( self.audioIn.data() )
+        newSet = self.filterSet
+        if (self.trackingIn is not None) and self.trackingIn.protocol.changed():
+            orientation = self.trackingIn.protocol.data().orientation
+            viewDirection = rotationMatrix( *orientation )[:,0]
+            newSet = int( np.argmax( self.listenerViews @ viewDirection ) )
+            self.trackingIn.protocol.resetChanged()
+        newGains = self.gains
+        if self.objectIn.protocol.changed():
+            newGains = self.calculateGains( self.objectIn.protocol.data() )
+            self.objectIn.protocol.resetChanged()
+        updatedObjects = np.flatnonzero( np.any( newGains != self.gains, axis=0 ) )
+        setChanged = newSet != self.filterSet
+        alpha = self.updateRateSmoothing
+        self.updateRate += alpha * (float( updatedObjects.size > 0 ) - self.updateRate)
+        self.updatedObjectsRate += alpha * (updatedObjects.size - self.updatedObjectsRate)
+
+        self.updateDelayLine( self.objectBuffer, self.objectFdl, objectSignals )
+        if not self.directPath:
+            # Loudspeaker signals with gain interpolation over the block, as in the panning renderers.
+            lspSignals = self.gains @ objectSignals
+            if updatedObjects.size > 0:
+                lspSignals = self.fadeOut * lspSignals + self.fadeIn * (newGains @ objectSignals)
+            self.updateDelayLine( self.lspBuffer, self.lspFdl, lspSignals )
+
+        output = self.render( self.directPath, self.filterSet )
+        activeObjects = np.flatnonzero( np.any( newGains != 0.0, axis=0 ) )
+        support = max( 1, int( np.max( np.sum( newGains != 0.0, axis=0 ), initial=0 ) ) )
+        directPath = self.selectPath( len( activeObjects ), support )
+        pathChanged = directPath != self.directPath
+        if updatedObjects.size == 0 and not setChanged and not pathChanged:
+            self.audioOut.set( output )
+            return
+
+        self.gains = newGains
+        self.filterSet = newSet
+        self.filtersValid[updatedObjects] = False
+        if setChanged:
+            self.filtersValid[:] = False
+        if directPath:
+            self.updateObjectFilters( activeObjects[~self.filtersValid[activeObjects]] )
+            self.activeObjects = activeObjects
+            self.activeFilters = self.objectFilters[:,activeObjects,...]
+        elif self.directPath:
+            # Switch to the loudspeaker path: reconstruct the loudspeaker delay line (the
+            # overlap-save buffer and the spectra) from the object signals with the current gains.
+            self.lspBuffer[...] = self.gains @ self.objectBuffer
+            self.lspFdl[...] = np.einsum( 'lo,opf->lpf', self.gains.astype( self.lspFdl.real.dtype ),
+                                         self.objectFdl )
+        # The loudspeaker path handles gain changes through the interpolated loudspeaker
+        # signals, a crossfade is only needed for the direct path and for changes of the
+        # path or the filter set.
+        if directPath or self.directPath or setChanged:
+            newOutput = self.render( directPath, newSet )
+            output = self.fadeOut * output + self.fadeIn * newOutput
+        if pathChanged:
+            self.pathSwitches += 1
+        self.directPath = directPath
+        self.audioOut.set( output )
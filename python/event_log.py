@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Andreas Franck <a.franck@soton.ac.uk>
+# Copyright (C) 2018 University of Southampton
+
+# Code accompanying the paper:
+
+# Andreas Franck and Filippo Maria Fazi, “VISR – A versatile open software
+# framework for audio signal processing,” in Proc. Audio Eng. Soc. 2018 Int. Conf.
+# Spatial Reproduction, Tokyo, Japan, 2018.
+
+# We kindly ask to acknowledge the use of this software in publications or software
+# by citing this paper.
+
+# The code is provided under the ISC (Internet Systems Consortium) license
+# https://www.isc.org/downloads/software-support-policy/isc-license/ :
+
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS
+# OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+File event_log.py
+
+Logging of events from the audio processing thread without blocking it.
+"""
+
+import collections
+import logging
+import threading
+import time
+import weakref
+
+# All logs share a single background thread per process, so creating many renderers or
+# panners (e.g., in batch_render_service.py or analyse_layouts.py) does not accumulate threads.
+# The logs are referenced weakly, and the thread ends when no log is left.
+_activeLogs = weakref.WeakSet()
+_activeLogsLock = threading.Lock()
+_drainThread = None
+
+def _flushActiveLogs():
+    """
+    Flush all open logs and return the poll interval, or None if no log is left.
+    """
+    global _drainThread
+    with _activeLogsLock:
+        logs = list( _activeLogs )
+        if not logs:
+            _drainThread = None
+            return None
+    for log in logs:
+        log.flush()
+    return min( log.pollInterval for log in logs )
+
+def _drainLogs():
+    # No references to the logs are held while sleeping, so unused logs can be collected.
+    while True:
+        pollInterval = _flushActiveLogs()
+        if pollInterval is None:
+            return
+        time.sleep( pollInterval )
+
+def _registerLog( log ):
+    global _drainThread
+    with _activeLogsLock:
+        _activeLogs.add( log )
+        if _drainThread is None:
+            _drainThread = threading.Thread( target=_drainLogs, name='event-log', daemon=True )
+            _drainThread.start()
+
+class NonBlockingEventLog:
+    """
+    Event log for realtime code.
+
+    post() only increments a counter and appends to a bounded deque, it never
+    waits for a lock or performs I/O. A background thread, shared by all logs
+    of the process, drains the deque periodically and writes the messages to a
+    Python logger. If the deque is full, messages are dropped (and counted),
+    but the counters remain exact.
+    """
+    def __init__( self, loggerName, maxQueueSize = 1024, pollInterval = 0.1,
+                 level = logging.WARNING ):
+        """
+        Constructor.
+
+        Parameters
+        ----------
+        loggerName: string
+            Name of the logging.Logger the messages are written to.
+        maxQueueSize: int
+            Maximum number of pending messages.
+        pollInterval: float
+            Interval in seconds in which the background thread writes the pending messages.
+            The shared thread uses the smallest interval of all open logs.
+        level: int
+            Logging level of the messages.
+        """
+        self.logger = logging.getLogger( loggerName )
+        self.level = level
+        self.pending = collections.deque()
+        self.maxQueueSize = maxQueueSize
+        self.pollInterval = pollInterval
+        # Event counters, indexed by the event key. Only modified by the posting thread.
+        self.counters = collections.Counter()
+        self.droppedMessages = 0
+        _registerLog( self )
+
+    def post( self, key, message, *args ):
+        """
+        Record an event. Safe to call from the audio thread.
+
+        Parameters
+        ----------
+        key: hashable
+            Event category, used for the counters.
+        message: string
+            Log message, formatted with args by the logging thread (printf style).
+        """
+        self.counters[key] += 1
+        if len( self.pending ) >= self.maxQueueSize:
+            self.droppedMessages += 1
+        else:
+            # deque.append() is atomic, no locking required.
+            self.pending.append( (message, args) )
+
+    def flush( self ):
+        """
+        Write all pending messages to the logger.
+        """
+        while True:
+            try:
+                # close() may flush concurrently with the background thread.
+                message, args = self.pending.popleft()
+            except IndexError:
+                return
+            self.logger.log( self.level, message, *args )
+
+    def close( self ):
+        """
+        Write the pending messages and detach the log from the background thread.
+        """
+        with _activeLogsLock:
+            _activeLogs.discard( self )
+        self.flush()
+
+    def __del__( self ):
+        # Write messages posted shortly before the owner of the log was discarded.
+        self.flush()
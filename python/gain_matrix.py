@@ -30,11 +30,15 @@
 File: gain_matrix.py
 
 """
+import time
+
 import numpy as np
 
 import visr
 import pml
 
+from load_supervisor import tierNoInterpolation
+
 class GainMatrix( visr.AtomicComponent ):
   """
   VISR atomic component implementing a multichannel audio gain matrix.
@@ -74,3 +78,195 @@ class GainMatrix( visr.AtomicComponent ):
     gains  = np.array( self.mtxIn.protocol.data() )
     ins = self.audioIn.data()
     self.audioOut.set( gains @ ins )
+
+def objectChannel( obj ):
+  """
+  Audio input channel of a single-channel object, i.e., the gain matrix column.
+  """
+  channels = obj.channels
+  return channels[0] if len( channels ) > 0 else obj.objectId
+
+class ActiveObjectGainMatrix( visr.AtomicComponent ):
+  """
+  Gain matrix that processes only the columns of currently active objects.
+
+  The component receives the object vector in addition to the gains. An object
+  is active if it is contained in the object vector and its level is nonzero.
+  Only the gains and audio signals of active objects take part in the
+  interpolation and the matrix multiplication, so the cost scales with the number
+  of active objects instead of the maximum number of objects. Objects that
+  become inactive are faded out over one block.
+  """
+  def __init__( self, context, name, parent, nIn, nOut, interpolation = True, supervisor = None ):
+    """
+    Constructor, initializes the component.
+
+    Parameters
+    ----------
+
+    self: ActiveObjectGainMatrix
+        Mandatory object handle for Python methods.
+    context: visr.SignalFlowContext
+        Object providing the sampling frequency and the period (buffer size) for the processing.
+    name: string
+        Name of the component, must be unique within the containing component.
+    parent: visr.CompositeComponent or None
+        The containing component, or None if this is a top-level component.
+    nIn: int
+        Number of input channels, i.e., the maximum number of objects.
+    nOut:int
+        Number of output channels.
+    interpolation: bool
+        Whether gain changes are interpolated linearly over one block.
+    supervisor: load_supervisor.DegradationSupervisor or None
+        If given, the processing time is reported to the supervisor, and the interpolation
+        is disabled in the tier tierNoInterpolation.
+    """
+    super().__init__( context, name, parent )
+    self.audioIn = visr.AudioInputFloat( "in", self, nIn )
+    self.audioOut = visr.AudioOutputFloat( "out", self, nOut )
+    self.mtxIn = visr.ParameterInput( "gainInput", self,
+     pml.MatrixParameterFloat.staticType,
+     pml.SharedDataProtocol.staticType,
+     pml.MatrixParameterConfig(nOut, nIn ))
+    self.objectIn = visr.ParameterInput( "objects", self,
+     pml.ObjectVector.staticType,
+     pml.DoubleBufferingProtocol.staticType,
+     pml.EmptyParameterConfig() )
+    self.numberOfInputs = nIn
+    self.interpolation = interpolation
+    self.supervisor = supervisor
+    self.active = np.zeros( 0, dtype=int )
+    self.fadingOut = np.zeros( 0, dtype=int )
+    self.currentGains = np.zeros( (nOut, nIn), dtype=np.float32 )
+    self.ramp = np.arange( 1, context.period+1, dtype=np.float32 ) / context.period
+
+  def updateActiveObjects( self ):
+    """
+    Recompute the set of active columns from the object vector.
+    """
+    active = set()
+    for obj in self.objectIn.protocol.data():
+      channel = objectChannel( obj )
+      if (obj.level != 0.0) and (0 <= channel < self.numberOfInputs):
+        active.add( channel )
+    active = np.array( sorted( active ), dtype=int )
+    self.fadingOut = np.setdiff1d( self.active, active )
+    self.active = active
+
+  def process( self ):
+    """
+    Process function, executed for each processed audio block.
+    """
+    if self.supervisor is not None:
+      startTime = time.perf_counter()
+      interpolation = self.interpolation and (self.supervisor.tier < tierNoInterpolation)
+    else:
+      interpolation = self.interpolation
+    self.processBlock( interpolation )
+    if self.supervisor is not None:
+      self.supervisor.report( time.perf_counter() - startTime )
+
+  def processBlock( self, interpolation ):
+    """
+    Mix the active objects of one block, with or without gain interpolation.
+    """
+    if self.objectIn.protocol.changed():
+      self.updateActiveObjects()
+      self.objectIn.protocol.resetChanged()
+    columns = np.concatenate( (self.active, self.fadingOut) )
+    if columns.size == 0:
+      self.audioOut.set( np.zeros( (self.currentGains.shape[0], self.ramp.size), dtype=np.float32 ) )
+      return
+    ins = self.audioIn.data()[columns,:]
+    newGains = np.array( self.mtxIn.protocol.data() )[:,columns]
+    newGains[:,self.active.size:] = 0.0 # Objects fading out
+    oldGains = self.currentGains[:,columns]
+    newOut = newGains @ ins
+    if interpolation and not np.array_equal( newGains, oldGains ):
+      out = newOut * self.ramp + (oldGains @ ins) * (1.0 - self.ramp)
+    else:
+      out = newOut
+    self.currentGains[:,columns] = newGains
+    self.fadingOut = self.fadingOut[:0]
+    self.audioOut.set( out )
+
+class AdaptiveInterpolationGainMatrix( visr.AtomicComponent ):
+  """
+  Gain matrix that adapts the interpolation of each column to the size of its gain change.
+
+  Columns whose gains did not change are not interpolated at all, small changes
+  are ramped over a short interval, and only large changes use a ramp over the
+  whole block. The output is computed as the product with the new gains for the
+  whole block plus a correction term for the ramped columns that only covers
+  the ramp length, so the interpolation cost is proportional to the number of
+  changed columns and their ramp lengths. The ports are the same as for
+  rcl.GainMatrix.
+  """
+  def __init__( self, context, name, parent, nIn, nOut, *, changeThreshold = 1e-6,
+                deltaThresholds = (0.02, 0.1), rampLengths = (16, 64) ):
+    """
+    Constructor, initializes the component.
+
+    Parameters
+    ----------
+
+    self: AdaptiveInterpolationGainMatrix
+        Mandatory object handle for Python methods.
+    context: visr.SignalFlowContext
+        Object providing the sampling frequency and the period (buffer size) for the processing.
+    name: string
+        Name of the component, must be unique within the containing component.
+    parent: visr.CompositeComponent or None
+        The containing component, or None if this is a top-level component.
+    nIn: int
+        Number of input channels.
+    nOut:int
+        Number of output channels.
+    changeThreshold: float
+        Columns whose maximum absolute gain change does not exceed this value are switched
+        without interpolation.
+    deltaThresholds: sequence of float
+        Increasing limits of the maximum absolute gain change for the ramp lengths in rampLengths.
+        Larger changes are ramped over the whole block.
+    rampLengths: sequence of int
+        Ramp length in samples for each entry of deltaThresholds, limited to the block size.
+    """
+    super().__init__( context, name, parent )
+    self.audioIn = visr.AudioInputFloat( "in", self, nIn )
+    self.audioOut = visr.AudioOutputFloat( "out", self, nOut )
+    self.mtxIn = visr.ParameterInput( "gainInput", self,
+     pml.MatrixParameterFloat.staticType,
+     pml.SharedDataProtocol.staticType,
+     pml.MatrixParameterConfig(nOut, nIn ))
+    if len( deltaThresholds ) != len( rampLengths ):
+      raise ValueError( "AdaptiveInterpolationGainMatrix: deltaThresholds and rampLengths must have the same length." )
+    self.changeThreshold = changeThreshold
+    self.deltaThresholds = np.asarray( deltaThresholds, dtype=np.float32 )
+    self.rampLengths = [ min( int( length ), context.period ) for length in rampLengths ] + [ context.period ]
+    # Complementary ramps (1 -> 0) applied to the gain differences, one per ramp length.
+    self.fadeOut = [ 1.0 - np.arange( 1, length+1, dtype=np.float32 ) / length
+                    for length in self.rampLengths ]
+    self.currentGains = np.zeros( (nOut, nIn), dtype=np.float32 )
+    # Statistics: number of interpolated columns per ramp length class.
+    self.rampCounts = np.zeros( len( self.rampLengths ), dtype=np.int64 )
+
+  def process( self ):
+    """
+    Process function, executed for each processed audio block.
+    """
+    newGains = np.array( self.mtxIn.protocol.data(), dtype=np.float32 )
+    ins = self.audioIn.data()
+    out = newGains @ ins
+    diff = self.currentGains - newGains
+    delta = np.max( np.abs( diff ), axis=0 )
+    changed = np.flatnonzero( delta > self.changeThreshold )
+    if changed.size > 0:
+      rampClass = np.searchsorted( self.deltaThresholds, delta[changed], side='left' )
+      for classIdx in np.unique( rampClass ):
+        columns = changed[rampClass == classIdx]
+        length = self.rampLengths[classIdx]
+        out[:,:length] += (diff[:,columns] @ ins[columns,:length]) * self.fadeOut[classIdx]
+        self.rampCounts[classIdx] += columns.size
+      self.currentGains[:,changed] = newGains[:,changed]
+    self.audioOut.set( out )
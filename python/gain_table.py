@@ -0,0 +1,680 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Andreas Franck <a.franck@soton.ac.uk>
+# Copyright (C) 2018 University of Southampton
+
+# Code accompanying the paper:
+
+# Andreas Franck and Filippo Maria Fazi, “VISR – A versatile open software
+# framework for audio signal processing,” in Proc. Audio Eng. Soc. 2018 Int. Conf.
+# Spatial Reproduction, Tokyo, Japan, 2018.
+
+# We kindly ask to acknowledge the use of this software in publications or software
+# by citing this paper.
+
+# The code is provided under the ISC (Internet Systems Consortium) license
+# https://www.isc.org/downloads/software-support-policy/isc-license/ :
+
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS
+# OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+File gain_table.py
+
+Direction-indexed tables of precomputed panning gains.
+
+A GainTable stores the gains for a regular azimuth/elevation grid, so the entry
+closest to a direction is found by rounding instead of a search. Tables are
+typically computed once for a loudspeaker layout, e.g., with the VBAP L2 solver,
+and stored in a .npz file.
+
+An AdaptiveGainTable stores the gains on the vertices of a geodesic grid that
+is refined only where the gains cannot be interpolated within a tolerance, e.g.,
+where the set of active loudspeakers changes. Directions are located by
+descending the subdivision hierarchy, and the gains are interpolated linearly
+within the triangle containing the direction.
+
+A CompressedGainTable holds the same grid as a GainTable, but stores only the
+nonzero gains of each entry (at most a few for VBAP-type panning) with their
+loudspeaker indices, quantised to 16 bit. This reduces the memory by an order
+of magnitude, so the table fits into the CPU caches.
+"""
+
+import numpy as np
+
+from helper.baseTrigFunctions import sph2cart
+
+class GainTable:
+    """
+    Panning gains on a regular azimuth/elevation grid with nearest-neighbour lookup.
+
+    The grid comprises the elevations -90, -90+elevationResolution, ..., 90 degree and
+    the azimuths -180, -180+azimuthResolution, ... (excluding 180) degree.
+    """
+    def __init__( self, gains, azimuthResolution, elevationResolution ):
+        """
+        Constructor.
+
+        Parameters
+        ----------
+        gains: np.ndarray
+            Gains, dimension #elevations x #azimuths x #loudspeakers.
+        azimuthResolution: float
+            Azimuth grid spacing in degree, must divide 360.
+        elevationResolution: float
+            Elevation grid spacing in degree, must divide 180.
+        """
+        self.gains = np.asarray( gains )
+        self.azimuthResolution = float( azimuthResolution )
+        self.elevationResolution = float( elevationResolution )
+        self.numAzimuths, self.numElevations = gridSize( azimuthResolution, elevationResolution )
+        if self.gains.shape[:2] != (self.numElevations, self.numAzimuths):
+            raise ValueError( "GainTable: The dimension of the gains does not match the grid resolution." )
+        self.numberOfLoudspeakers = self.gains.shape[-1]
+        # Flat view for vectorised lookup.
+        self.flatGains = np.reshape( self.gains, (-1, self.numberOfLoudspeakers) )
+
+    @classmethod
+    def build( cls, gainFunction, azimuthResolution = 2.0, elevationResolution = 2.0 ):
+        """
+        Compute a table by evaluating a gain function on all grid directions.
+
+        Parameters
+        ----------
+        gainFunction: callable
+            Function that takes an array of unit direction vectors (#directions x 3) and
+            returns the gains (#directions x #loudspeakers), e.g., VbapCalculator.calculateGains.
+            Rows containing NaN (failed solutions) are replaced by the gains of the closest
+            grid direction with a valid result.
+        azimuthResolution: float
+            Azimuth grid spacing in degree.
+        elevationResolution: float
+            Elevation grid spacing in degree.
+        """
+        directions = np.reshape( gridDirections( azimuthResolution, elevationResolution ), (-1,3) )
+        numAz, numEl = gridSize( azimuthResolution, elevationResolution )
+        gains = np.array( gainFunction( directions ), dtype=np.float64 )
+        failed = ~np.all( np.isfinite( gains ), axis=-1 )
+        if np.any( failed ):
+            valid = np.flatnonzero( ~failed )
+            if valid.size == 0:
+                raise ValueError( "GainTable: The gain function failed for all directions." )
+            closest = valid[ np.argmax( directions[failed] @ directions[valid].T, axis=-1 ) ]
+            gains[failed] = gains[closest]
+        return cls( np.reshape( gains, (numEl, numAz, -1) ), azimuthResolution, elevationResolution )
+
+    @classmethod
+    def load( cls, fileName ):
+        """
+        Load a table stored with save().
+        """
+        data = np.load( fileName )
+        return cls( data['gains'], float( data['azimuthResolution'] ),
+                   float( data['elevationResolution'] ) )
+
+    def save( self, fileName ):
+        """
+        Store the table in a .npz file.
+        """
+        np.savez( fileName, gains=self.gains, azimuthResolution=self.azimuthResolution,
+                 elevationResolution=self.elevationResolution )
+
+    def gridIndices( self, directions ):
+        """
+        Flat indices of the grid points closest to the given directions.
+
+        Parameters
+        ----------
+        directions: np.ndarray
+            Direction vectors (cartesian, need not be normalised), dimension #directions x 3.
+        """
+        directions = np.reshape( np.asarray( directions, dtype=np.float64 ), (-1,3) )
+        az = np.rad2deg( np.arctan2( directions[:,1], directions[:,0] ) )
+        el = np.rad2deg( np.arctan2( directions[:,2], np.hypot( directions[:,0], directions[:,1] ) ) )
+        azIdx = np.round( (az + 180.0) / self.azimuthResolution ).astype( int ) % self.numAzimuths
+        elIdx = np.round( (el + 90.0) / self.elevationResolution ).astype( int )
+        return elIdx * self.numAzimuths + azIdx
+
+    def lookup( self, directions ):
+        """
+        Return the gains of the grid points closest to the given directions.
+
+        Parameters
+        ----------
+        directions: np.ndarray
+            Direction vectors, dimension #directions x 3 or a single vector.
+
+        Returns
+        -------
+        np.ndarray, dimension #directions x #loudspeakers, or a vector for a single direction.
+        """
+        single = np.ndim( directions ) == 1
+        gains = self.flatGains[ self.gridIndices( directions ) ]
+        return gains[0] if single else gains
+
+def gridSize( azimuthResolution, elevationResolution ):
+    """
+    Number of azimuth and elevation grid values for the given resolutions (in degree).
+    """
+    numAz = int( round( 360.0 / azimuthResolution ) )
+    numEl = int( round( 180.0 / elevationResolution ) ) + 1
+    if not (np.isclose( numAz * azimuthResolution, 360.0 )
+            and np.isclose( (numEl-1) * elevationResolution, 180.0 )):
+        raise ValueError( "GainTable: The grid resolutions must divide 360 and 180 degree, respectively." )
+    return numAz, numEl
+
+def gridDirections( azimuthResolution, elevationResolution ):
+    """
+    Unit direction vectors of the table grid, dimension #elevations x #azimuths x 3.
+    """
+    numAz, numEl = gridSize( azimuthResolution, elevationResolution )
+    az = np.deg2rad( -180.0 + azimuthResolution * np.arange( numAz ) )
+    el = np.deg2rad( -90.0 + elevationResolution * np.arange( numEl ) )
+    return sph2cart( az[np.newaxis,:], el[:,np.newaxis], 1.0 )
+
+class AdaptiveGainTable:
+    """
+    Panning gains on an adaptively refined geodesic (icosphere) grid.
+
+    The table is a forest of triangles with the 20 faces of an icosahedron as
+    roots. Each triangle is either a leaf or split into four children by its edge
+    midpoints (projected onto the sphere).
+
+    The attribute maxError holds the largest interpolation error at the test points
+    of the leaf triangles found during build() (NaN if unknown).
+    """
+    def __init__( self, vertices, gains, faces, children, maxError = np.nan ):
+        """
+        Constructor, use build() or load() to create a table.
+
+        Parameters
+        ----------
+        vertices: np.ndarray
+            Unit vectors of the grid vertices, dimension #vertices x 3.
+        gains: np.ndarray
+            Gains at the vertices, dimension #vertices x #loudspeakers.
+        faces: np.ndarray
+            Vertex indices of all triangles, dimension #triangles x 3. The first 20
+            triangles are the roots.
+        children: np.ndarray
+            Indices of the four child triangles, dimension #triangles x 4, -1 for leaves.
+        maxError: float
+            Maximum interpolation error at the test points of the leaves, NaN if unknown.
+        """
+        self.vertices = np.asarray( vertices, dtype=np.float64 )
+        self.gains = np.asarray( gains )
+        self.faces = np.asarray( faces, dtype=np.int32 )
+        self.children = np.asarray( children, dtype=np.int32 )
+        self.numberOfLoudspeakers = self.gains.shape[-1]
+        # Inverse vertex matrices to compute the barycentric-like weights d @ inv of a direction d.
+        self.inverses = np.linalg.inv( self.vertices[self.faces] )
+        self.depth = _treeDepth( self.children )
+        self.maxError = float( maxError )
+
+    @classmethod
+    def build( cls, gainFunction, tolerance = 0.01, minLevel = 2, maxLevel = 7 ):
+        """
+        Compute a table by recursive subdivision.
+
+        A triangle is split if the gains at any of its test points differ from the
+        gains interpolated within the triangle by more than tolerance (maximum
+        absolute difference over the loudspeakers). The test points are the edge
+        midpoints, which become the vertices of the children, and four interior
+        points: the centroid and the centroids of the three corner children. The
+        gain function is called twice per subdivision level, with all new vertices
+        and with all interior test points.
+
+        Parameters
+        ----------
+        gainFunction: callable
+            Function that takes an array of unit direction vectors (#directions x 3) and
+            returns the gains (#directions x #loudspeakers), e.g.,
+            L2GainSolver.calculateGains. Rows containing NaN (failed solutions) are
+            replaced by the interpolated gains.
+        tolerance: float
+            Maximum interpolation error at the test points.
+        minLevel: int
+            Number of uniform subdivisions applied to all triangles.
+        maxLevel: int
+            Maximum subdivision level.
+
+        Notes
+        -----
+        The triangles at maxLevel are tested, but not split further. If the
+        tolerance cannot be met there (e.g., where the gain function is
+        discontinuous), maxError of the table exceeds the tolerance.
+        """
+        vertices, rootFaces = _icosahedron()
+        gains = np.asarray( gainFunction( vertices ), dtype=np.float64 )
+        if np.any( np.isnan( gains ) ):
+            raise ValueError( "AdaptiveGainTable: The gain function failed for an icosahedron vertex." )
+        vertexList = [ vertices ]
+        gainList = [ gains ]
+        numVertices = vertices.shape[0]
+        midpointIndex = {}
+        faces = [ rootFaces ]
+        children = [ np.full( (rootFaces.shape[0], 4), -1, dtype=np.int32 ) ]
+        numFaces = rootFaces.shape[0]
+        activeFaces = np.arange( numFaces )
+        maxError = 0.0
+        for level in range( maxLevel+1 ):
+            if activeFaces.size == 0:
+                break
+            allFaces = np.concatenate( faces )
+            allVertices = np.concatenate( vertexList )
+            allGains = np.concatenate( gainList )
+            tri = allFaces[activeFaces]
+            # Edges (a,b), (b,c), (c,a) of the active triangles and their midpoint vertex indices.
+            edges = np.stack( (tri, np.roll( tri, -1, axis=1 )), axis=-1 ) # #active x 3 x 2
+            edgeKeys = np.sort( edges, axis=-1 )
+            midIdx = np.empty( edgeKeys.shape[:2], dtype=np.int64 )
+            newVertices = []
+            newEdges = []
+            for faceIdx, edgeIdx in np.ndindex( *edgeKeys.shape[:2] ):
+                key = (int( edgeKeys[faceIdx,edgeIdx,0] ), int( edgeKeys[faceIdx,edgeIdx,1] ))
+                vIdx = midpointIndex.get( key )
+                if vIdx is None:
+                    vIdx = numVertices + len( newEdges )
+                    midpointIndex[key] = vIdx
+                    newEdges.append( key )
+                midIdx[faceIdx,edgeIdx] = vIdx
+            if newEdges:
+                newEdges = np.array( newEdges )
+                mid = allVertices[newEdges[:,0]] + allVertices[newEdges[:,1]]
+                mid /= np.linalg.norm( mid, axis=-1, keepdims=True )
+                interpolated = 0.5 * (allGains[newEdges[:,0]] + allGains[newEdges[:,1]])
+                newGains = np.asarray( gainFunction( mid ), dtype=np.float64 )
+                failed = np.any( np.isnan( newGains ), axis=-1 )
+                newGains[failed] = interpolated[failed]
+                vertexList.append( mid )
+                gainList.append( newGains )
+                numVertices += mid.shape[0]
+                allGains = np.concatenate( gainList )
+            if level < minLevel:
+                refine = np.ones( activeFaces.size, dtype=bool )
+            else:
+                midGains = allGains[midIdx] # #active x 3 x #loudspeakers
+                endGains = 0.5 * (allGains[edges[...,0]] + allGains[edges[...,1]])
+                error = np.max( np.abs( midGains - endGains ), axis=(1,2) )
+                # Interior test points, interpolated with the same weights as in lookup().
+                cornerGains = allGains[tri] # #active x 3 x #loudspeakers
+                samples = np.einsum( 'sk,fkj->fsj', _interiorWeights, allVertices[tri] )
+                samples /= np.linalg.norm( samples, axis=-1, keepdims=True )
+                sampleGains = np.asarray( gainFunction( samples.reshape( (-1,3) ) ), dtype=np.float64 )
+                sampleGains = sampleGains.reshape( cornerGains.shape[:1] + (-1, cornerGains.shape[-1]) )
+                sampleError = np.abs( sampleGains - np.einsum( 'sk,fkl->fsl', _interiorWeights, cornerGains ) )
+                # Failed solutions are not used as test points.
+                sampleError = np.max( np.where( np.isnan( sampleError ), 0.0, sampleError ), axis=(1,2) )
+                error = np.maximum( error, sampleError )
+                refine = (error > tolerance) & (level < maxLevel)
+                if np.any( ~refine ):
+                    maxError = max( maxError, float( np.max( error[~refine] ) ) )
+            split = activeFaces[refine]
+            splitMid = midIdx[refine]
+            splitTri = allFaces[split]
+            a, b, c = splitTri[:,0], splitTri[:,1], splitTri[:,2]
+            ab, bc, ca = splitMid[:,0], splitMid[:,1], splitMid[:,2]
+            newFaces = np.stack( (np.stack( (a, ab, ca), axis=-1 ), np.stack( (ab, b, bc), axis=-1 ),
+                                 np.stack( (ca, bc, c), axis=-1 ), np.stack( (ab, bc, ca), axis=-1 )),
+                                axis=1 ).reshape( (-1,3) )
+            allChildren = np.concatenate( children )
+            allChildren[split] = numFaces + np.arange( 4*split.size ).reshape( (-1,4) )
+            children = [ allChildren, np.full( (newFaces.shape[0], 4), -1, dtype=np.int32 ) ]
+            faces = [ allFaces, newFaces ]
+            activeFaces = numFaces + np.arange( newFaces.shape[0] )
+            numFaces += newFaces.shape[0]
+        faces = np.concatenate( faces )
+        children = np.concatenate( children )
+        vertices = np.concatenate( vertexList )
+        gains = np.concatenate( gainList )
+        # Remove midpoint vertices that are not used by any triangle.
+        used = np.zeros( vertices.shape[0], dtype=bool )
+        used[faces] = True
+        newIndex = np.cumsum( used ) - 1
+        return cls( vertices[used], gains[used], newIndex[faces], children, maxError )
+
+    @classmethod
+    def load( cls, fileName ):
+        """
+        Load a table stored with save().
+        """
+        data = np.load( fileName )
+        return cls( data['vertices'], data['gains'], data['faces'], data['children'],
+                   data['maxError'] if 'maxError' in data else np.nan )
+
+    def save( self, fileName ):
+        """
+        Store the table in a .npz file.
+        """
+        np.savez( fileName, vertices=self.vertices, gains=self.gains, faces=self.faces,
+                 children=self.children, maxError=self.maxError )
+
+    def locate( self, directions ):
+        """
+        Find the leaf triangles containing the given directions.
+
+        Parameters
+        ----------
+        directions: np.ndarray
+            Direction vectors, dimension #directions x 3.
+
+        Returns
+        -------
+        faceIndices: np.ndarray of int, dimension #directions
+        weights: np.ndarray, dimension #directions x 3
+            Non-negative interpolation weights for the vertices of the triangles, summing to one.
+        """
+        directions = np.reshape( np.asarray( directions, dtype=np.float64 ), (-1,3) )
+        # Root triangles: choose the one with the largest minimum weight.
+        rootWeights = np.einsum( 'dj,fjk->dfk', directions, self.inverses[:20] )
+        faceIdx = np.argmax( np.min( rootWeights, axis=-1 ), axis=-1 )
+        for _ in range( self.depth ):
+            candidates = self.children[faceIdx] # #directions x 4
+            inner = np.flatnonzero( candidates[:,0] >= 0 )
+            if inner.size == 0:
+                break
+            cand = candidates[inner]
+            weights = np.einsum( 'dj,dcjk->dck', directions[inner], self.inverses[cand] )
+            best = np.argmax( np.min( weights, axis=-1 ), axis=-1 )
+            faceIdx[inner] = cand[np.arange( inner.size ), best]
+        weights = np.einsum( 'dj,djk->dk', directions, self.inverses[faceIdx] )
+        weights = np.maximum( weights, 0.0 )
+        weights /= np.sum( weights, axis=-1, keepdims=True )
+        return faceIdx, weights
+
+    def lookup( self, directions ):
+        """
+        Return the interpolated gains for the given directions.
+
+        Parameters
+        ----------
+        directions: np.ndarray
+            Direction vectors, dimension #directions x 3 or a single vector.
+
+        Returns
+        -------
+        np.ndarray, dimension #directions x #loudspeakers, or a vector for a single direction.
+        """
+        single = np.ndim( directions ) == 1
+        faceIdx, weights = self.locate( directions )
+        gains = np.einsum( 'dk,dkl->dl', weights, self.gains[self.faces[faceIdx]] )
+        return gains[0] if single else gains
+
+class CompressedGainTable:
+    """
+    Panning gains on the grid of a GainTable, stored as quantised sparse entries.
+
+    Each entry holds up to maxSupport loudspeaker indices (uint8, or uint16 for more
+    than 255 loudspeakers) and the corresponding gains, either as uint16 values
+    relative to a per-entry float32 scale (the largest gain of the entry), or as
+    float16 values. Unused slots point to an extra dummy column that is discarded
+    in lookup().
+
+    The gains must be non-negative. Error bounds for gains in [0,1] (e.g., unit-power
+    normalised gains), in addition to
+    the dropped gains below the threshold and beyond maxSupport:
+      "uint16": half a quantisation step of the scale, i.e., at most 0.5/65535 = 7.7e-6.
+      "float16": half a unit in the last place, i.e., at most 2^-12 = 2.4e-4.
+    The maximum error with respect to the source table is computed during
+    construction and stored in the attribute maxError.
+
+    For many directions, lookupSparse() is faster than the lookup in a dense
+    GainTable, because only the nonzero gains are gathered. lookup() returns dense
+    gain rows for compatibility, which is slower than the dense table.
+
+    Entries that contain NaN (e.g., solver failures) are returned as NaN.
+    """
+    def __init__( self, indices, values, scales, numberOfLoudspeakers,
+                 azimuthResolution, elevationResolution, maxError = np.nan ):
+        """
+        Constructor.
+
+        Parameters
+        ----------
+        indices: np.ndarray of unsigned int
+            Loudspeaker indices, dimension #entries x maxSupport. Unused slots contain
+            numberOfLoudspeakers.
+        values: np.ndarray of np.uint16 or np.float16
+            Quantised gains, dimension #entries x maxSupport.
+        scales: np.ndarray of np.float32 or None
+            Per-entry scale factors for uint16 values, dimension #entries. None for float16 values.
+        numberOfLoudspeakers: int
+        azimuthResolution: float
+            Azimuth grid spacing in degree, see GainTable.
+        elevationResolution: float
+            Elevation grid spacing in degree, see GainTable.
+        maxError: float
+            Maximum absolute error with respect to the uncompressed gains, NaN if unknown.
+        """
+        self.indices = np.asarray( indices )
+        self.values = np.asarray( values )
+        self.scales = None if scales is None else np.asarray( scales, dtype=np.float32 )
+        if (self.values.dtype == np.uint16) == (self.scales is None):
+            raise ValueError( "CompressedGainTable: uint16 gains require scales, float16 gains must not have scales." )
+        self.numberOfLoudspeakers = int( numberOfLoudspeakers )
+        self.azimuthResolution = float( azimuthResolution )
+        self.elevationResolution = float( elevationResolution )
+        self.numAzimuths, self.numElevations = gridSize( azimuthResolution, elevationResolution )
+        if self.indices.shape != self.values.shape \
+           or self.indices.shape[0] != self.numAzimuths * self.numElevations:
+            raise ValueError( "CompressedGainTable: The dimension of the entries does not match the grid resolution." )
+        self.maxError = float( maxError )
+        # Dequantisation factor of the values.
+        self.valueScale = np.float32( 1.0 / 65535.0 ) if self.scales is not None else np.float32( 1.0 )
+        invalid = np.isnan( self.scales ) if self.scales is not None \
+          else np.any( np.isnan( self.values ), axis=-1 )
+        self.invalid = invalid if np.any( invalid ) else None
+
+    @classmethod
+    def fromGainTable( cls, table, precision = "uint16", threshold = 1e-6, maxSupport = None ):
+        """
+        Compress a GainTable.
+
+        Parameters
+        ----------
+        table: GainTable
+        precision: string
+            "uint16" (default) or "float16", see the class documentation.
+        threshold: float
+            Gains with an absolute value up to this threshold are dropped.
+        maxSupport: int or None
+            Maximum number of stored gains per entry, the smallest gains of larger entries
+            are dropped. None uses the largest number of gains above the threshold.
+        """
+        if precision not in ["uint16", "float16"]:
+            raise ValueError( "CompressedGainTable: Unknown precision '%s'." % precision )
+        gains = np.asarray( table.flatGains, dtype=np.float64 )
+        numLsp = table.numberOfLoudspeakers
+        invalid = np.any( np.isnan( gains ), axis=-1 )
+        gains = np.where( invalid[:,np.newaxis], 0.0, gains )
+        support = np.abs( gains ) > threshold
+        if maxSupport is None:
+            maxSupport = max( 1, int( np.max( np.sum( support, axis=-1 ) ) ) )
+        # The largest gains of each entry, in ascending loudspeaker order.
+        order = np.argsort( -np.abs( gains ) * support, axis=-1, kind='stable' )[:,:maxSupport]
+        order = np.sort( order, axis=-1 )
+        rows = np.arange( gains.shape[0] )[:,np.newaxis]
+        used = support[rows, order]
+        selected = np.where( used, gains[rows, order], 0.0 )
+        indices = np.where( used, order, numLsp ).astype( np.uint8 if numLsp < 255 else np.uint16 )
+        if precision == "uint16":
+            scales = np.max( np.abs( selected ), axis=-1 ).astype( np.float32 )
+            safeScales = np.where( scales > 0.0, scales, 1.0 ).astype( np.float64 )
+            values = np.round( np.clip( selected / safeScales[:,np.newaxis], 0.0, 1.0 ) * 65535.0 ).astype( np.uint16 )
+            scales[invalid] = np.nan
+        else:
+            scales = None
+            values = selected.astype( np.float16 )
+            values[invalid,:] = np.nan
+        compressed = cls( indices, values, scales, numLsp, table.azimuthResolution, table.elevationResolution )
+        # Measure the error over the valid entries in chunks to limit the temporary memory.
+        maxError = 0.0
+        valid = np.flatnonzero( ~invalid )
+        for start in range( 0, valid.size, 65536 ):
+            entries = valid[start:start+65536]
+            maxError = max( maxError, float( np.max( np.abs( compressed.entryGains( entries ) - gains[entries] ),
+                                                     initial=0.0 ) ) )
+        compressed.maxError = maxError
+        return compressed
+
+    @classmethod
+    def build( cls, gainFunction, azimuthResolution = 2.0, elevationResolution = 2.0, **kwargs ):
+        """
+        Compute a table by evaluating a gain function on all grid directions, see GainTable.build().
+        Additional keyword arguments are passed to fromGainTable().
+        """
+        return cls.fromGainTable( GainTable.build( gainFunction, azimuthResolution, elevationResolution ),
+                                 **kwargs )
+
+    @classmethod
+    def load( cls, fileName ):
+        """
+        Load a table stored with save().
+        """
+        data = np.load( fileName )
+        scales = data['scales'] if data['values'].dtype == np.uint16 else None
+        return cls( data['supportIndices'], data['values'], scales, int( data['numberOfLoudspeakers'] ),
+                   float( data['azimuthResolution'] ), float( data['elevationResolution'] ),
+                   float( data['maxError'] ) )
+
+    def save( self, fileName ):
+        """
+        Store the table in a .npz file.
+        """
+        arrays = { 'supportIndices': self.indices, 'values': self.values,
+                   'numberOfLoudspeakers': self.numberOfLoudspeakers,
+                   'azimuthResolution': self.azimuthResolution,
+                   'elevationResolution': self.elevationResolution, 'maxError': self.maxError }
+        if self.scales is not None:
+            arrays['scales'] = self.scales
+        np.savez( fileName, **arrays )
+
+    @property
+    def nbytes( self ):
+        """
+        Memory of the table data in bytes.
+        """
+        return self.indices.nbytes + self.values.nbytes + (0 if self.scales is None else self.scales.nbytes)
+
+    # Same grid as GainTable.
+    gridIndices = GainTable.gridIndices
+
+    def entrySparse( self, entries ):
+        """
+        Dequantised sparse gains of table entries.
+
+        Returns
+        -------
+        indices: np.ndarray of unsigned int, dimension #entries x maxSupport
+            Loudspeaker indices, numberOfLoudspeakers for unused slots.
+        gains: np.ndarray of np.float32 (np.float16 for float16 tables), dimension #entries x maxSupport
+            Gains, zero for unused slots.
+        """
+        if self.scales is not None:
+            gains = self.values[entries] * (self.scales[entries] * self.valueScale)[:,np.newaxis]
+        else:
+            gains = self.values[entries]
+        if self.invalid is not None:
+            gains[self.invalid[entries],:] = np.nan
+        return self.indices[entries], gains
+
+    def entryGains( self, entries ):
+        """
+        Dequantised gains of table entries, dimension #entries x #loudspeakers.
+        """
+        indices, gains = self.entrySparse( entries )
+        # One extra column receives the unused slots, whose indices may repeat.
+        numColumns = self.numberOfLoudspeakers+1
+        result = np.zeros( (len( entries ), numColumns) )
+        flatIndices = (np.arange( len( entries ) ) * numColumns)[:,np.newaxis] + indices
+        result.ravel()[flatIndices.ravel()] = gains.ravel()
+        if self.invalid is not None:
+            result[self.invalid[entries],:] = np.nan
+        return result[:,:self.numberOfLoudspeakers]
+
+    def lookupSparse( self, directions ):
+        """
+        Return the gains of the grid points closest to the given directions in sparse form,
+        see entrySparse().
+
+        This avoids building dense gain rows, which dominates lookup(). Callers scatter the
+        gains into their gain matrix, skipping the slots with index numberOfLoudspeakers,
+        e.g., gains[indices[valid], column[valid]] = values[valid].
+
+        Parameters
+        ----------
+        directions: np.ndarray
+            Direction vectors, dimension #directions x 3.
+        """
+        return self.entrySparse( self.gridIndices( directions ) )
+
+    def lookup( self, directions ):
+        """
+        Return the gains of the grid points closest to the given directions.
+
+        Parameters
+        ----------
+        directions: np.ndarray
+            Direction vectors, dimension #directions x 3 or a single vector.
+
+        Returns
+        -------
+        np.ndarray, dimension #directions x #loudspeakers, or a vector for a single direction.
+        """
+        single = np.ndim( directions ) == 1
+        gains = self.entryGains( self.gridIndices( directions ) )
+        return gains[0] if single else gains
+
+def loadGainTable( fileName ):
+    """
+    Load a GainTable, an AdaptiveGainTable or a CompressedGainTable from a .npz file.
+    """
+    with np.load( fileName ) as data:
+        adaptive = 'faces' in data
+        compressed = 'supportIndices' in data
+    if compressed:
+        return CompressedGainTable.load( fileName )
+    return AdaptiveGainTable.load( fileName ) if adaptive else GainTable.load( fileName )
+
+# Barycentric weights of the interior test points of a triangle in AdaptiveGainTable.build():
+# the centroid and the centroids of the three corner children.
+_interiorWeights = np.array( [ [1.0/3.0, 1.0/3.0, 1.0/3.0],
+                               [2.0/3.0, 1.0/6.0, 1.0/6.0],
+                               [1.0/6.0, 2.0/3.0, 1.0/6.0],
+                               [1.0/6.0, 1.0/6.0, 2.0/3.0] ] )
+
+def _icosahedron():
+    """
+    Unit vertices (12 x 3) and faces (20 x 3) of a regular icosahedron.
+    """
+    phi = 0.5 * (1.0 + np.sqrt( 5.0 ))
+    vertices = np.array( [ [-1, phi, 0], [1, phi, 0], [-1, -phi, 0], [1, -phi, 0],
+                           [0, -1, phi], [0, 1, phi], [0, -1, -phi], [0, 1, -phi],
+                           [phi, 0, -1], [phi, 0, 1], [-phi, 0, -1], [-phi, 0, 1] ], dtype=np.float64 )
+    vertices /= np.linalg.norm( vertices, axis=-1, keepdims=True )
+    faces = np.array( [ [0, 11, 5], [0, 5, 1], [0, 1, 7], [0, 7, 10], [0, 10, 11],
+                        [1, 5, 9], [5, 11, 4], [11, 10, 2], [10, 7, 6], [7, 1, 8],
+                        [3, 9, 4], [3, 4, 2], [3, 2, 6], [3, 6, 8], [3, 8, 9],
+                        [4, 9, 5], [2, 4, 11], [6, 2, 10], [8, 6, 7], [9, 8, 1] ], dtype=np.int32 )
+    return vertices, faces
+
+def _treeDepth( children ):
+    """
+    Maximum depth of the triangle forest below the root level.
+    """
+    depth = 0
+    level = np.arange( 20 )
+    while level.size > 0:
+        level = children[level]
+        level = level[level >= 0]
+        if level.size > 0:
+            depth += 1
+    return depth
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Andreas Franck <a.franck@soton.ac.uk>
+# Copyright (C) 2018 University of Southampton
+
+# Code accompanying the paper:
+
+# Andreas Franck and Filippo Maria Fazi, “VISR – A versatile open software
+# framework for audio signal processing,” in Proc. Audio Eng. Soc. 2018 Int. Conf.
+# Spatial Reproduction, Tokyo, Japan, 2018.
+
+# We kindly ask to acknowledge the use of this software in publications or software
+# by citing this paper.
+
+# The code is provided under the ISC (Internet Systems Consortium) license
+# https://www.isc.org/downloads/software-support-policy/isc-license/ :
+
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS
+# OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+File head_rotation.py
+
+Define a VISR atomic component that compensates small head rotations by
+counter-rotating the object positions before the panning stage.
+
+With dynamic binaural rendering, every orientation update of the head tracker
+causes the virtual loudspeaker renderer to switch or interpolate the BRIRs of all
+loudspeakers. This component instead keeps the BRIR orientation fixed (the
+'anchor' orientation) as long as the head stays within a configurable angle of
+it, and applies the residual rotation to the objects. Only if the head moves
+further than this threshold, a new anchor orientation is sent to the binaural
+renderer, which then reloads its filters.
+"""
+
+import numpy as np
+
+import visr
+import pml
+import objectmodel
+
+from helper.rotationFunctions import rotationMatrix, rotationAngle
+
+class HeadRotationController( visr.AtomicComponent ):
+    """
+    Component to split head tracking data into an object rotation and sparse
+    BRIR orientation updates.
+
+    Parameter ports:
+
+    * "objectIn": Input object vector (pml.ObjectVector, DoubleBufferingProtocol).
+    * "trackingIn": Head orientation from a tracker (pml.ListenerPosition, DoubleBufferingProtocol).
+    * "objectOut": Counter-rotated object vector (pml.ObjectVector, DoubleBufferingProtocol).
+    * "trackingOut": Anchor orientation for the binaural renderer (pml.ListenerPosition,
+      DoubleBufferingProtocol).
+    """
+    def __init__( self, context, name, parent, *,
+                 updateInterval = 0.02,
+                 quantisationStep = 1.0,
+                 reloadThreshold = 15.0 ):
+        """
+        Constructor.
+
+        Parameters
+        ----------
+        context: visr.SignalFlowContext
+            A context object containing the sampling frequency and the block size.
+        name: string
+            Name of the component to be identified within a containing component.
+        parent: visr.CompositeComponent
+            A containing component, or None if this is the top-level component.
+        updateInterval: float
+            Minimum time between two evaluations of tracker data, in seconds.
+            Tracker updates arriving in between are coalesced. 0 evaluates in
+            every block.
+        quantisationStep: float
+            Quantisation of the yaw, pitch and roll angles in degree. Orientation
+            changes below this resolution do not trigger any update. 0 disables
+            the quantisation.
+        reloadThreshold: float
+            Angle in degree between the head orientation and the current anchor
+            orientation beyond which a new orientation is sent to the binaural renderer.
+        """
+        super().__init__( context, name, parent )
+        self.objectIn = visr.ParameterInput( "objectIn", self,
+            pml.ObjectVector.staticType,
+            pml.DoubleBufferingProtocol.staticType,
+            pml.EmptyParameterConfig() )
+        self.trackingIn = visr.ParameterInput( "trackingIn", self,
+            pml.ListenerPosition.staticType,
+            pml.DoubleBufferingProtocol.staticType,
+            pml.EmptyParameterConfig() )
+        self.objectOut = visr.ParameterOutput( "objectOut", self,
+            pml.ObjectVector.staticType,
+            pml.DoubleBufferingProtocol.staticType,
+            pml.EmptyParameterConfig() )
+        self.trackingOut = visr.ParameterOutput( "trackingOut", self,
+            pml.ListenerPosition.staticType,
+            pml.DoubleBufferingProtocol.staticType,
+            pml.EmptyParameterConfig() )
+        blockPeriod = context.period / context.samplingFrequency
+        self.updateIntervalBlocks = max( 1, int( np.round( updateInterval / blockPeriod ) ) )
+        self.quantisationStep = np.deg2rad( quantisationStep )
+        self.reloadThreshold = np.deg2rad( reloadThreshold )
+
+        self.blocksSinceUpdate = self.updateIntervalBlocks
+        self.pendingOrientation = None
+        self.headOrientation = np.zeros( 3 )
+        self.anchorRotation = np.eye( 3 )
+        # Rotation applied to the object positions, anchor @ head^T
+        self.residualRotation = np.eye( 3 )
+        self.objects = []
+        self.pointSources = []
+        self.objectPositions = np.zeros( (0,3) )
+        # Statistics, e.g., for assessing the effect of the threshold.
+        self.numberOfTrackingUpdates = 0
+        self.numberOfFilterReloads = 0
+
+    def quantise( self, orientation ):
+        """
+        Quantise a yaw/pitch/roll vector to the configured angular resolution.
+        """
+        if self.quantisationStep <= 0.0:
+            return orientation
+        return self.quantisationStep * np.round( orientation / self.quantisationStep )
+
+    def process( self ):
+        """
+        Process function, executed for each block.
+        """
+        rotationChanged = False
+        if self.trackingIn.protocol.changed():
+            self.pendingOrientation = np.array( self.trackingIn.protocol.data().orientation )
+            self.trackingIn.protocol.resetChanged()
+        self.blocksSinceUpdate += 1
+        # Rate limiting: evaluate the most recent tracker value at most every
+        # updateIntervalBlocks blocks.
+        if (self.pendingOrientation is not None) \
+           and (self.blocksSinceUpdate >= self.updateIntervalBlocks):
+            orientation = self.quantise( self.pendingOrientation )
+            self.pendingOrientation = None
+            self.blocksSinceUpdate = 0
+            if not np.array_equal( orientation, self.headOrientation ):
+                self.headOrientation = orientation
+                self.numberOfTrackingUpdates += 1
+                headRotation = rotationMatrix( *orientation )
+                if rotationAngle( self.anchorRotation, headRotation ) > self.reloadThreshold:
+                    self.anchorRotation = headRotation
+                    self.numberOfFilterReloads += 1
+                    trackingData = self.trackingOut.protocol.data()
+                    trackingData.orientation = orientation
+                    self.trackingOut.protocol.swapBuffers()
+                self.residualRotation = self.anchorRotation @ headRotation.T
+                rotationChanged = True
+
+        objectsChanged = self.objectIn.protocol.changed()
+        if objectsChanged:
+            self.objects = [ o for o in self.objectIn.protocol.data() ]
+            # Keep the unrotated positions, the object instances are modified below.
+            self.pointSources = [ o for o in self.objects
+                                 if isinstance( o, objectmodel.PointSource ) ]
+            self.objectPositions = np.array( [ o.position for o in self.pointSources ],
+                                            ndmin=2 ).reshape( -1, 3 )
+            self.objectIn.protocol.resetChanged()
+        if objectsChanged or rotationChanged:
+            rotatedPositions = self.objectPositions @ self.residualRotation.T
+            for obj, pos in zip( self.pointSources, rotatedPositions ):
+                obj.position = pos
+            self.objectOut.protocol.data().set( self.objects )
+            self.objectOut.protocol.swapBuffers()
@@ -30,6 +30,8 @@
 Utility functions for angles and coordinate system transformations.
 """
 
+import math
+
 import numpy as np
 
 def deg2rad( phi ):
@@ -39,6 +41,27 @@ def rad2deg( phi ):
     return (180.0/np.pi) * phi
 
 def cart2sph( X ):
+    """
+    Convert Cartesian coordinates to spherical coordinates.
+
+    Parameters
+    ----------
+    X: array-like, shape (..., 3)
+        Cartesian coordinates in the last dimension.
+
+    Returns
+    -------
+    az, el, radius: Azimuth and elevation in radians, and radius, each of shape X.shape[:-1].
+    For a single position, the results are scalars.
+    """
+    if len( X ) == 3 and np.ndim( X ) == 1:
+        # Fast path for single positions, avoids the overhead of the array operations.
+        x, y, z = float( X[0] ), float( X[1] ), float( X[2] )
+        radius = math.sqrt( x*x + y*y + z*z )
+        # The elevation of the origin is undefined (NaN), as in the array code path.
+        el = math.asin( z / radius ) if radius > 0.0 else math.nan
+        return math.atan2( y, x ), el, radius
+    X = np.asarray( X )
     x = X[...,0]
     y = X[...,1]
     z = X[...,2]
@@ -47,11 +70,37 @@ def cart2sph( X ):
     el = np.arcsin( z / radius );
     return az, el, radius
 
-def sph2cart( az, el, r ):
+def sph2cart( az, el, r, out = None ):
+    """
+    Convert spherical coordinates (azimuth and elevation in radians) to Cartesian coordinates.
+
+    Parameters
+    ----------
+    az, el, r: array-like
+        Azimuth, elevation and radius, broadcast against each other.
+    out: np.ndarray, optional
+        Array of shape broadcastShape + (3,) to hold the result. Avoids allocations
+        if a function is called repeatedly, e.g., for precomputing trajectories.
+
+    Returns
+    -------
+    np.ndarray of shape broadcastShape + (3,)
+    """
+    if np.isscalar( az ) and np.isscalar( el ) and np.isscalar( r ):
+        # Fast path for single positions.
+        elFactor = math.cos( el ) * r
+        x = math.cos( az ) * elFactor
+        y = math.sin( az ) * elFactor
+        z = math.sin( el ) * r
+        if out is None:
+            return np.array( (x,y,z) )
+        out[0] = x; out[1] = y; out[2] = z
+        return out
     (azBC, elBC, rBC ) = np.broadcast_arrays( az, el, r )
-    elFactor = np.cos( elBC )
-    x = np.cos( azBC ) * elFactor * rBC
-    y = np.sin( azBC ) * elFactor * rBC
-    z = np.sin( elBC ) * rBC
-    cart = np.stack( (x,y,z), -1 )
-    return cart
+    if out is None:
+        out = np.empty( azBC.shape + (3,), dtype=np.result_type( azBC, elBC, rBC, 1.0 ) )
+    elFactor = np.cos( elBC ) * rBC
+    np.multiply( np.cos( azBC ), elFactor, out=out[...,0] )
+    np.multiply( np.sin( azBC ), elFactor, out=out[...,1] )
+    np.multiply( np.sin( elBC ), rBC, out=out[...,2] )
+    return out
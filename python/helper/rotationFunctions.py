@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Andreas Franck <a.franck@soton.ac.uk>
+# Copyright (C) 2018 University of Southampton
+
+# Code accompanying the paper:
+
+# Andreas Franck and Filippo Maria Fazi, “VISR – A versatile open software
+# framework for audio signal processing,” in Proc. Audio Eng. Soc. 2018 Int. Conf.
+# Spatial Reproduction, Tokyo, Japan, 2018.
+
+# We kindly ask to acknowledge the use of this software in publications or software
+# by citing this paper.
+
+# The code is provided under the ISC (Internet Systems Consortium) license
+# https://www.isc.org/downloads/software-support-policy/isc-license/ :
+
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS
+# OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+Utility functions for 3D rotations given as yaw, pitch and roll angles.
+"""
+
+import numpy as np
+
+def rotationMatrix( yaw, pitch, roll ):
+    """
+    Compute the rotation matrix for a yaw/pitch/roll (intrinsic z-y'-x'') rotation.
+
+    Parameters
+    ----------
+    yaw: float
+        Rotation around the z axis in radian (positive to the left).
+    pitch: float
+        Rotation around the rotated y axis in radian.
+    roll: float
+        Rotation around the rotated x axis in radian.
+
+    Returns
+    -------
+    np.ndarray, 3 x 3 rotation matrix R = Rz(yaw) @ Ry(pitch) @ Rx(roll)
+    """
+    cy, sy = np.cos( yaw ), np.sin( yaw )
+    cp, sp = np.cos( pitch ), np.sin( pitch )
+    cr, sr = np.cos( roll ), np.sin( roll )
+    Rz = np.array( [[ cy, -sy, 0.0 ], [ sy, cy, 0.0 ], [ 0.0, 0.0, 1.0 ]] )
+    Ry = np.array( [[ cp, 0.0, sp ], [ 0.0, 1.0, 0.0 ], [ -sp, 0.0, cp ]] )
+    Rx = np.array( [[ 1.0, 0.0, 0.0 ], [ 0.0, cr, -sr ], [ 0.0, sr, cr ]] )
+    return Rz @ Ry @ Rx
+
+def rotationAngle( R1, R2 ):
+    """
+    Angle of the relative rotation between two rotation matrices in radian.
+
+    Parameters
+    ----------
+    R1: np.ndarray
+        First 3 x 3 rotation matrix.
+    R2: np.ndarray
+        Second 3 x 3 rotation matrix.
+
+    Returns
+    -------
+    float, the angle of the rotation R1^T R2, in the range [0, pi].
+    """
+    cosAngle = 0.5 * (np.trace( R1.T @ R2 ) - 1.0)
+    # Clipping protects against arguments slightly outside [-1,1] due to rounding.
+    return np.arccos( np.clip( cosAngle, -1.0, 1.0 ) )
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Andreas Franck <a.franck@soton.ac.uk>
+# Copyright (C) 2018 University of Southampton
+
+# Code accompanying the paper:
+
+# Andreas Franck and Filippo Maria Fazi, “VISR – A versatile open software
+# framework for audio signal processing,” in Proc. Audio Eng. Soc. 2018 Int. Conf.
+# Spatial Reproduction, Tokyo, Japan, 2018.
+
+# We kindly ask to acknowledge the use of this software in publications or software
+# by citing this paper.
+
+# The code is provided under the ISC (Internet Systems Consortium) license
+# https://www.isc.org/downloads/software-support-policy/isc-license/ :
+
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS
+# OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+File load_supervisor.py
+
+Load-dependent quality tiers for the realtime renderers.
+
+The components of a renderer report the time spent in their process() method
+to a DegradationSupervisor. The supervisor relates the total to the block
+period (blockSize / samplingFrequency) and steps down through a sequence of
+quality tiers when the headroom becomes small, and back up when the load has
+recovered. The components query the current tier and reduce their cost
+accordingly (see VbapL2Panner and gain_matrix.ActiveObjectGainMatrix).
+"""
+
+import collections
+import logging
+
+import numpy as np
+
+from event_log import NonBlockingEventLog
+
+# Quality tiers, each including the reductions of the lower tiers.
+tierFull = 0                # Full quality, e.g., L2 optimisation for all objects.
+tierApproximateGains = 1    # Gains from a precomputed table or plain VBAP instead of the solver.
+tierReducedUpdateRate = 2   # Panning gains are updated only every few blocks.
+tierNoInterpolation = 3     # Gain changes are applied without interpolation.
+numberOfTiers = 4
+
+class DegradationSupervisor:
+    """
+    Tracks the processing load and selects the quality tier.
+
+    Tier changes use hysteresis: the tier is lowered if the smoothed load exceeds
+    degradeThreshold for degradeBlocks consecutive blocks, and raised if it stays
+    below recoverThreshold for recoverBlocks consecutive blocks. report() and
+    endBlock() are cheap and safe to call from the audio thread, tier changes are
+    posted to a NonBlockingEventLog.
+    """
+    def __init__( self, blockSize, samplingFrequency, *, degradeThreshold = 0.7,
+                 recoverThreshold = 0.35, degradeBlocks = 2, recoverBlocks = 200,
+                 smoothing = 0.3, maxTier = tierNoInterpolation, eventLog = None ):
+        """
+        Constructor.
+
+        Parameters
+        ----------
+        blockSize: int
+        samplingFrequency: int
+        degradeThreshold: float
+            Load (fraction of the block period) above which the quality is reduced.
+        recoverThreshold: float
+            Load below which the quality is increased again.
+        degradeBlocks: int
+            Number of consecutive blocks above degradeThreshold to step down one tier.
+        recoverBlocks: int
+            Number of consecutive blocks below recoverThreshold to step up one tier.
+        smoothing: float
+            Coefficient of the exponential smoothing of the load (1: no smoothing).
+        maxTier: int
+            Lowest quality tier that may be selected.
+        eventLog: NonBlockingEventLog or None
+            Log for tier changes. By default, a log writing to the logger "load_supervisor"
+            with level INFO is created.
+        """
+        self.period = blockSize / float( samplingFrequency )
+        self.degradeThreshold = degradeThreshold
+        self.recoverThreshold = recoverThreshold
+        self.degradeBlocks = degradeBlocks
+        self.recoverBlocks = recoverBlocks
+        self.smoothing = smoothing
+        self.maxTier = maxTier
+        self.eventLog = NonBlockingEventLog( "load_supervisor", level=logging.INFO ) \
+          if eventLog is None else eventLog
+        self.tier = tierFull
+        self.load = 0.0
+        self.peakLoad = 0.0
+        self.blockTime = 0.0
+        self.aboveCount = 0
+        self.belowCount = 0
+        # Statistics: number of blocks per tier, and counts of 'degrade'/'recover' events.
+        self.blocksPerTier = np.zeros( numberOfTiers, dtype=np.int64 )
+        self.counters = collections.Counter()
+
+    def report( self, seconds ):
+        """
+        Add the processing time of a component for the current block.
+        """
+        self.blockTime += seconds
+
+    def endBlock( self ):
+        """
+        Evaluate the load of the finished block and update the tier. To be called
+        once per block, after all components have reported.
+
+        Returns
+        -------
+        int: The tier for the next block.
+        """
+        instantLoad = self.blockTime / self.period
+        self.blockTime = 0.0
+        self.load += self.smoothing * (instantLoad - self.load)
+        self.peakLoad = max( self.peakLoad, instantLoad )
+        self.blocksPerTier[self.tier] += 1
+        if self.load > self.degradeThreshold:
+            self.aboveCount += 1
+            self.belowCount = 0
+            if self.aboveCount >= self.degradeBlocks and self.tier < self.maxTier:
+                self.changeTier( self.tier + 1, 'degrade' )
+        elif self.load < self.recoverThreshold:
+            self.belowCount += 1
+            self.aboveCount = 0
+            if self.belowCount >= self.recoverBlocks and self.tier > tierFull:
+                self.changeTier( self.tier - 1, 'recover' )
+        else:
+            self.aboveCount = 0
+            self.belowCount = 0
+        return self.tier
+
+    def changeTier( self, newTier, reason ):
+        self.eventLog.post( reason, "Quality tier %d -> %d (%s, load %.2f)",
+                           self.tier, newTier, reason, self.load )
+        self.counters[reason] += 1
+        self.tier = newTier
+        self.aboveCount = 0
+        self.belowCount = 0
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Andreas Franck <a.franck@soton.ac.uk>
+# Copyright (C) 2018 University of Southampton
+
+# Code accompanying the paper:
+
+# Andreas Franck and Filippo Maria Fazi, “VISR – A versatile open software
+# framework for audio signal processing,” in Proc. Audio Eng. Soc. 2018 Int. Conf.
+# Spatial Reproduction, Tokyo, Japan, 2018.
+
+# We kindly ask to acknowledge the use of this software in publications or software
+# by citing this paper.
+
+# The code is provided under the ISC (Internet Systems Consortium) license
+# https://www.isc.org/downloads/software-support-policy/isc-license/ :
+
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS
+# OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+File metadata_ingress.py
+
+Object metadata ingress from multiple network senders.
+
+MetadataIngress runs an asyncio event loop on a background thread that accepts
+JSON object updates from any number of UDP ports and local TCP connections
+(newline-delimited messages). The updates of all senders are parsed and merged
+into one object state on this thread. The resulting object list is published by
+replacing a single reference, which is atomic in Python, so the audio thread
+reads the latest complete state without locks and without parsing.
+
+Message format (angles in degree, compatible with the VISR object JSON format):
+
+  { "objects": [ { "id": 0, "channels": 0, "level": 1.0,
+                   "position": { "az": 30.0, "el": 0.0, "radius": 1.0 } } ],
+    "remove": [ 3, 4 ] }
+
+"position" may also be given as { "x": ..., "y": ..., "z": ... } or as a list
+[ x, y, z ], and "az", "el",
+"radius" and "channel" are accepted as top-level keys of an object. Objects keep
+their state until they are updated or removed by any sender.
+
+IngressObjectSource is a VISR component that outputs the published object list,
+see the argument ingress of RealtimeVbapRenderer and RealtimeVbapL2Renderer.
+"""
+
+import asyncio
+import collections
+import json
+import threading
+
+import visr
+import pml
+import objectmodel as om
+
+from helper.baseTrigFunctions import deg2rad, sph2cart
+
+def parseObjectDescription( desc, previous = None ):
+    """
+    Merge an object description into the previous state of the object.
+
+    Returns
+    -------
+    dict with the keys id, position (Cartesian list), level and channel.
+    """
+    state = dict( previous ) if previous is not None else \
+      { 'id': int( desc['id'] ), 'position': [1.0, 0.0, 0.0], 'level': 1.0, 'channel': int( desc['id'] ) }
+    position = desc.get( 'position', desc )
+    if isinstance( position, list ):
+        if len( position ) != 3:
+            raise ValueError( "parseObjectDescription: A position list must have three elements." )
+        state['position'] = [ float( v ) for v in position ]
+    elif 'x' in position:
+        state['position'] = [ float( position.get( c, 0.0 ) ) for c in ('x', 'y', 'z') ]
+    elif 'az' in position or 'el' in position:
+        state['position'] = sph2cart( deg2rad( float( position.get( 'az', 0.0 ) ) ),
+                                     deg2rad( float( position.get( 'el', 0.0 ) ) ),
+                                     float( position.get( 'radius', 1.0 ) ) ).tolist()
+    if 'level' in desc:
+        state['level'] = float( desc['level'] )
+    channel = desc.get( 'channels', desc.get( 'channel' ) )
+    if channel is not None:
+        state['channel'] = int( channel[0] if isinstance( channel, list ) else channel )
+    return state
+
+class _UdpProtocol( asyncio.DatagramProtocol ):
+    def __init__( self, ingress, source ):
+        self.ingress = ingress
+        self.source = source
+
+    def datagram_received( self, data, addr ):
+        self.ingress.handleMessage( data, self.source )
+
+class MetadataIngress:
+    """
+    Receives and merges object metadata from multiple senders on a background thread.
+    """
+    def __init__( self, udpPorts = (4242,), tcpPorts = (), *, udpHost = '0.0.0.0',
+                 tcpHost = '127.0.0.1' ):
+        """
+        Constructor, starts the receiving thread.
+
+        Parameters
+        ----------
+        udpPorts: sequence of int
+            UDP ports to listen on, one datagram per message.
+        tcpPorts: sequence of int
+            TCP ports to accept connections on, messages separated by newlines.
+        udpHost: string
+            Interface address for the UDP ports.
+        tcpHost: string
+            Interface address for the TCP ports, local only by default.
+        """
+        self.objects = {}
+        # Published state: (version, list of objectmodel.PointSource). Replaced, never modified.
+        self.scene = (0, [])
+        self.publishPending = False
+        self.messageCounts = collections.Counter()
+        self.parseErrors = collections.Counter()
+        self.loop = asyncio.new_event_loop()
+        self.servers = []
+        self.transports = []
+        started = threading.Event()
+        self.startError = None
+        self.thread = threading.Thread( target=self.run, args=(udpPorts, tcpPorts, udpHost, tcpHost, started),
+                                       name='metadata-ingress', daemon=True )
+        self.thread.start()
+        started.wait()
+        if self.startError is not None:
+            self.thread.join()
+            raise self.startError
+
+    def run( self, udpPorts, tcpPorts, udpHost, tcpHost, started ):
+        asyncio.set_event_loop( self.loop )
+        try:
+            for port in udpPorts:
+                transport, _ = self.loop.run_until_complete( self.loop.create_datagram_endpoint(
+                    lambda port=port: _UdpProtocol( self, 'udp:%d' % port ), local_addr=(udpHost, port) ) )
+                self.transports.append( transport )
+            for port in tcpPorts:
+                server = self.loop.run_until_complete( asyncio.start_server(
+                    lambda reader, writer, port=port: self.serveTcp( reader, writer, 'tcp:%d' % port ),
+                    tcpHost, port ) )
+                self.servers.append( server )
+        except Exception as ex:
+            self.startError = ex
+            for transport in self.transports:
+                transport.close()
+            for server in self.servers:
+                server.close()
+            self.loop.close()
+            started.set()
+            return
+        started.set()
+        self.loop.run_forever()
+        for transport in self.transports:
+            transport.close()
+        for server in self.servers:
+            server.close()
+            self.loop.run_until_complete( server.wait_closed() )
+        self.loop.close()
+
+    async def serveTcp( self, reader, writer, source ):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    self.handleMessage( line, source )
+        finally:
+            writer.close()
+
+    def handleMessage( self, data, source ):
+        """
+        Parse a message and merge it into the object state. Runs on the ingress thread.
+        """
+        self.messageCounts[source] += 1
+        try:
+            message = json.loads( data )
+            for objectId in message.get( 'remove', [] ):
+                self.objects.pop( int( objectId ), None )
+            for desc in message.get( 'objects', [] ):
+                objectId = int( desc['id'] )
+                self.objects[objectId] = parseObjectDescription( desc, self.objects.get( objectId ) )
+        except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+            self.parseErrors[source] += 1
+            return
+        # Coalesce bursts of messages into a single publication.
+        if not self.publishPending:
+            self.publishPending = True
+            self.loop.call_soon( self.publish )
+
+    def publish( self ):
+        """
+        Create a new object list from the merged state and swap it in.
+        """
+        self.publishPending = False
+        objectList = []
+        for state in self.objects.values():
+            ps = om.PointSource( state['id'] )
+            ps.position = state['position']
+            ps.level = state['level']
+            ps.channels = [ state['channel'] ]
+            objectList.append( ps )
+        self.scene = (self.scene[0] + 1, objectList)
+
+    def close( self ):
+        """
+        Stop the receiving thread and close all sockets.
+        """
+        if self.thread.is_alive():
+            self.loop.call_soon_threadsafe( self.loop.stop )
+            self.thread.join()
+
+class IngressObjectSource( visr.AtomicComponent ):
+    """
+    Component that outputs the object list published by a MetadataIngress.
+
+    process() only compares a version number and, if the state changed, copies the
+    prepared object list into the output.
+    """
+    def __init__( self, context, name, parent, ingress ):
+        """
+        Constructor.
+
+        Parameters
+        ----------
+        context: visr.SignalFlowContext
+        name: string
+        parent: visr.CompositeComponent or None
+        ingress: MetadataIngress
+        """
+        super().__init__( context, name, parent )
+        # Same port name as rcl.SceneDecoder, which this component replaces in the renderers.
+        self.objectOut = visr.ParameterOutput( "objectVectorOutput", self,
+                                              pml.ObjectVector.staticType,
+                                              pml.DoubleBufferingProtocol.staticType,
+                                              pml.EmptyParameterConfig() )
+        self.ingress = ingress
+        self.version = 0
+
+    def process( self ):
+        version, objectList = self.ingress.scene # Single reference read, consistent snapshot.
+        if version != self.version:
+            self.objectOut.protocol.data().set( objectList )
+            self.objectOut.protocol.swapBuffers()
+            self.version = version
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Andreas Franck <a.franck@soton.ac.uk>
+# Copyright (C) 2018 University of Southampton
+
+# Code accompanying the paper:
+
+# Andreas Franck and Filippo Maria Fazi, “VISR – A versatile open software
+# framework for audio signal processing,” in Proc. Audio Eng. Soc. 2018 Int. Conf.
+# Spatial Reproduction, Tokyo, Japan, 2018.
+
+# We kindly ask to acknowledge the use of this software in publications or software
+# by citing this paper.
+
+# The code is provided under the ISC (Internet Systems Consortium) license
+# https://www.isc.org/downloads/software-support-policy/isc-license/ :
+
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS
+# OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+File metadata_replay.py
+
+Recording and replay of object metadata datagrams.
+
+A recording stores the UDP datagrams received by a renderer (e.g., the JSON
+object vectors consumed by RealtimeVbapRenderer) together with their arrival
+times in a compact binary file:
+
+  header   magic 'VMDR', version (uint16), reserved (uint16), start time (float64, epoch)
+  records  time since start (float64), length (uint32), payload bytes
+  index    (time (float64), record offset (uint64)) for each record
+  trailer  index offset (uint64), number of records (uint64), magic 'VMDX'
+
+All values are little-endian. If the trailer is missing (e.g., the recorder was
+killed), the index is rebuilt by scanning the records.
+
+Recordings can be replayed to a UDP port in real time, N times faster, or as
+fast as possible, or fed block by block into an offline signal flow of a
+renderer created with nwPort=None, so that a metadata load is reproduced
+deterministically.
+
+Usage:
+  python metadata_replay.py record FILE [--port 4242] [--duration S] [--forward PORT]
+  python metadata_replay.py replay FILE [--port 4242] [--speed N | --afap]
+  python metadata_replay.py info FILE
+"""
+
+import argparse
+import mmap
+import socket
+import struct
+import time
+
+import numpy as np
+
+headerStruct = struct.Struct( '<4sHHd' )
+recordStruct = struct.Struct( '<dI' )
+trailerStruct = struct.Struct( '<QQ4s' )
+indexType = np.dtype( [ ('time', '<f8'), ('offset', '<u8') ] )
+fileVersion = 1
+
+class MetadataRecordingWriter:
+    """
+    Write datagrams to a recording file.
+    """
+    def __init__( self, fileName, startTime = None ):
+        self.file = open( fileName, 'wb' )
+        self.startTime = time.time() if startTime is None else startTime
+        self.file.write( headerStruct.pack( b'VMDR', fileVersion, 0, self.startTime ) )
+        self.times = []
+        self.offsets = []
+
+    def write( self, timestamp, payload ):
+        """
+        Append a datagram.
+
+        Parameters
+        ----------
+        timestamp: float
+            Arrival time in seconds relative to the start of the recording, must be non-decreasing.
+        payload: bytes
+        """
+        self.times.append( timestamp )
+        self.offsets.append( self.file.tell() )
+        self.file.write( recordStruct.pack( timestamp, len( payload ) ) )
+        self.file.write( payload )
+
+    def close( self ):
+        if self.file.closed:
+            return
+        indexOffset = self.file.tell()
+        index = np.empty( len( self.times ), dtype=indexType )
+        index['time'] = self.times
+        index['offset'] = self.offsets
+        self.file.write( index.tobytes() )
+        self.file.write( trailerStruct.pack( indexOffset, index.size, b'VMDX' ) )
+        self.file.close()
+
+    def __enter__( self ):
+        return self
+
+    def __exit__( self, *args ):
+        self.close()
+
+class MetadataRecording:
+    """
+    Read access to a recording file. The file is memory-mapped, so only the
+    index is read on opening.
+    """
+    def __init__( self, fileName ):
+        with open( fileName, 'rb' ) as fh:
+            self.buffer = mmap.mmap( fh.fileno(), 0, access=mmap.ACCESS_READ )
+        magic, version, _, self.startTime = headerStruct.unpack_from( self.buffer, 0 )
+        if magic != b'VMDR' or version != fileVersion:
+            raise ValueError( "MetadataRecording: '%s' is not a metadata recording." % fileName )
+        self.index = self._readIndex()
+        self.times = self.index['time']
+
+    def _readIndex( self ):
+        size = len( self.buffer )
+        if size >= headerStruct.size + trailerStruct.size:
+            indexOffset, numRecords, magic = trailerStruct.unpack_from( self.buffer, size - trailerStruct.size )
+            if magic == b'VMDX':
+                return np.frombuffer( self.buffer, dtype=indexType, count=numRecords, offset=indexOffset ).copy()
+        # No valid trailer: scan the records.
+        entries = []
+        offset = headerStruct.size
+        while offset + recordStruct.size <= size:
+            timestamp, length = recordStruct.unpack_from( self.buffer, offset )
+            if offset + recordStruct.size + length > size:
+                break # Truncated last record.
+            entries.append( (timestamp, offset) )
+            offset += recordStruct.size + length
+        return np.array( entries, dtype=indexType )
+
+    def __len__( self ):
+        return self.index.size
+
+    @property
+    def duration( self ):
+        return float( self.times[-1] ) if len( self ) > 0 else 0.0
+
+    def payload( self, recordIdx ):
+        """
+        Return the datagram of a record as bytes.
+        """
+        offset = int( self.index['offset'][recordIdx] )
+        _, length = recordStruct.unpack_from( self.buffer, offset )
+        start = offset + recordStruct.size
+        return self.buffer[start:start+length]
+
+    def recordRange( self, startTime, endTime ):
+        """
+        Indices of the records with startTime <= time < endTime, as a range.
+        """
+        first, last = np.searchsorted( self.times, [startTime, endTime], side='left' )
+        return range( int( first ), int( last ) )
+
+    def close( self ):
+        self.buffer.close()
+
+def recordUdp( fileName, port = 4242, *, host = '', duration = None, forwardTo = None ):
+    """
+    Record the datagrams arriving at a UDP port.
+
+    Parameters
+    ----------
+    fileName: string
+        The recording file.
+    port: int
+        UDP port to listen on, i.e., the port the renderer normally uses.
+    host: string
+        Interface address to bind to, default: all interfaces.
+    duration: float, optional
+        Recording duration in seconds. Default: until interrupted (KeyboardInterrupt).
+    forwardTo: (host, port) tuple, optional
+        Forward each datagram to this address, e.g., to a renderer listening on another port.
+
+    Returns
+    -------
+    Number of recorded datagrams.
+    """
+    sock = socket.socket( socket.AF_INET, socket.SOCK_DGRAM )
+    sock.bind( (host, port) )
+    sock.settimeout( 0.1 )
+    numRecords = 0
+    with MetadataRecordingWriter( fileName ) as writer:
+        startTime = time.perf_counter()
+        try:
+            while duration is None or time.perf_counter() - startTime < duration:
+                try:
+                    payload = sock.recv( 65536 )
+                except socket.timeout:
+                    continue
+                writer.write( time.perf_counter() - startTime, payload )
+                numRecords += 1
+                if forwardTo is not None:
+                    sock.sendto( payload, forwardTo )
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sock.close()
+    return numRecords
+
+def replayUdp( recording, port = 4242, host = '127.0.0.1', speed = 1.0 ):
+    """
+    Send the datagrams of a recording to a UDP port.
+
+    Parameters
+    ----------
+    recording: MetadataRecording
+    port, host:
+        Destination address.
+    speed: float or None
+        Replay speed relative to the recorded timing, e.g., 1.0 for real time or
+        10.0 for ten times faster. None sends the datagrams as fast as possible.
+
+    Returns
+    -------
+    Maximum lateness of a datagram with respect to its scheduled time in seconds.
+    """
+    sock = socket.socket( socket.AF_INET, socket.SOCK_DGRAM )
+    maxLateness = 0.0
+    startTime = time.perf_counter()
+    for recordIdx in range( len( recording ) ):
+        if speed is not None:
+            scheduled = startTime + recording.times[recordIdx] / speed
+            delay = scheduled - time.perf_counter()
+            if delay > 0.0:
+                time.sleep( delay )
+            else:
+                maxLateness = max( maxLateness, -delay )
+        sock.sendto( recording.payload( recordIdx ), (host, port) )
+    sock.close()
+    return maxLateness
+
+def replayOffline( flow, datagramInput, recording, inputSignal, blockSize, samplingFrequency,
+                  numberOfOutputs ):
+    """
+    Render an input signal with the datagrams of a recording in an offline signal flow.
+
+    A datagram recorded at time t is delivered before the first block that starts
+    at or after t, so the result is identical for every run.
+
+    Parameters
+    ----------
+    flow: rrl.AudioSignalFlow
+        Flow of a renderer created with nwPort=None, e.g., RealtimeVbapRenderer.
+    datagramInput: parameter receive port of the flow
+        Message queue port for the datagrams, e.g., flow.parameterReceivePort('datagrams').
+    recording: MetadataRecording
+    inputSignal: np.ndarray
+        Object audio signals, dimension #objects x #samples. If the recording is longer,
+        the signal is zero-padded.
+    blockSize: int
+    samplingFrequency: int
+    numberOfOutputs: int
+        Number of output channels of the flow.
+
+    Returns
+    -------
+    output: np.ndarray
+        Rendered signal, dimension #outputs x #samples.
+    realtimeFactor: float
+        Ratio between the signal duration and the processing time.
+    maxMessagesPerBlock: int
+        Largest number of datagrams delivered to a single block.
+    """
+    import pml
+    numSamples = max( inputSignal.shape[-1],
+                     int( np.ceil( recording.duration * samplingFrequency ) ) + 1 )
+    numBlocks = -(-numSamples // blockSize) # Integer ceil
+    paddedInput = np.zeros( (inputSignal.shape[0], numBlocks*blockSize), dtype=np.float32 )
+    paddedInput[:,:inputSignal.shape[-1]] = inputSignal
+    output = np.zeros( (numberOfOutputs, numBlocks*blockSize), dtype=np.float32 )
+    maxMessagesPerBlock = 0
+    recordIdx = 0
+    startTime = time.perf_counter()
+    for blockIdx in range( numBlocks ):
+        # Deliver all records with time <= block start time.
+        blockStart = blockIdx * blockSize / samplingFrequency
+        lastIdx = int( np.searchsorted( recording.times, blockStart, side='right' ) )
+        for idx in range( recordIdx, lastIdx ):
+            datagramInput.enqueue( pml.StringParameter( recording.payload( idx ).decode( 'utf-8' ) ) )
+        maxMessagesPerBlock = max( maxMessagesPerBlock, lastIdx - recordIdx )
+        recordIdx = lastIdx
+        blockSlice = slice( blockIdx*blockSize, (blockIdx+1)*blockSize )
+        output[:,blockSlice] = flow.process( paddedInput[:,blockSlice] )
+    processingTime = time.perf_counter() - startTime
+    realtimeFactor = numBlocks * blockSize / samplingFrequency / max( processingTime, 1e-9 )
+    return output[:,:numSamples], realtimeFactor, maxMessagesPerBlock
+
+def main():
+    parser = argparse.ArgumentParser( description="Record and replay object metadata datagrams." )
+    subparsers = parser.add_subparsers( dest='command' )
+    subparsers.required = True
+    recordParser = subparsers.add_parser( 'record', help='Record datagrams arriving at a UDP port.' )
+    recordParser.add_argument( 'file' )
+    recordParser.add_argument( '--port', type=int, default=4242 )
+    recordParser.add_argument( '--duration', type=float, default=None,
+                              help='Recording duration in seconds (default: until Ctrl-C).' )
+    recordParser.add_argument( '--forward', type=int, default=None,
+                              help='Forward the datagrams to this local port.' )
+    replayParser = subparsers.add_parser( 'replay', help='Send a recording to a UDP port.' )
+    replayParser.add_argument( 'file' )
+    replayParser.add_argument( '--port', type=int, default=4242 )
+    replayParser.add_argument( '--host', default='127.0.0.1' )
+    replayParser.add_argument( '--speed', type=float, default=1.0,
+                              help='Replay speed relative to real time (default: 1).' )
+    replayParser.add_argument( '--afap', action='store_true', help='Replay as fast as possible.' )
+    infoParser = subparsers.add_parser( 'info', help='Print statistics of a recording.' )
+    infoParser.add_argument( 'file' )
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        forwardTo = None if args.forward is None else ('127.0.0.1', args.forward)
+        numRecords = recordUdp( args.file, args.port, duration=args.duration, forwardTo=forwardTo )
+        print( "Recorded %d datagrams." % numRecords )
+    elif args.command == 'replay':
+        recording = MetadataRecording( args.file )
+        maxLateness = replayUdp( recording, args.port, args.host, None if args.afap else args.speed )
+        print( "Sent %d datagrams, maximum lateness %.1f ms." % (len( recording ), 1000.0*maxLateness) )
+    else:
+        recording = MetadataRecording( args.file )
+        rate = len( recording ) / recording.duration if recording.duration > 0 else 0.0
+        sizes = [ len( recording.payload( idx ) ) for idx in range( len( recording ) ) ]
+        print( "%d datagrams over %.2f s (%.1f per second), mean size %.0f bytes, max size %d bytes."
+              % (len( recording ), recording.duration, rate,
+                 np.mean( sizes ) if sizes else 0.0, max( sizes, default=0 )) )
+        if len( recording ) > 1:
+            print( "Maximum number of datagrams within 10 ms: %d"
+                  % int( np.max( np.searchsorted( recording.times, recording.times + 0.01 )
+                                - np.arange( len( recording ) ) ) ) )
+
+if __name__ == "__main__":
+    main()
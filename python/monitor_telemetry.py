@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Andreas Franck <a.franck@soton.ac.uk>
+# Copyright (C) 2018 University of Southampton
+
+# Code accompanying the paper:
+
+# Andreas Franck and Filippo Maria Fazi, “VISR – A versatile open software
+# framework for audio signal processing,” in Proc. Audio Eng. Soc. 2018 Int. Conf.
+# Spatial Reproduction, Tokyo, Japan, 2018.
+
+# We kindly ask to acknowledge the use of this software in publications or software
+# by citing this paper.
+
+# The code is provided under the ISC (Internet Systems Consortium) license
+# https://www.isc.org/downloads/software-support-policy/isc-license/ :
+
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS
+# OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+Monitor the telemetry published by a renderer (see telemetry.py) in a separate process.
+
+Enable telemetry in the renderer with the telemetryName argument, e.g.,
+RealtimeVbapRenderer( ..., telemetryName='vbap' ), and run
+
+  python monitor_telemetry.py vbap
+
+to display the current gain matrix. With --text, the gains, object positions and
+solver status are printed instead (no matplotlib required).
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from telemetry import TelemetryReader
+
+def printRecord( record ):
+    print( "Block %d:" % record['block'] )
+    for objIdx in np.nonzero( np.all( np.isfinite( record['positions'] ), axis=-1 ) )[0]:
+        print( "  object %d position %s status %d gains %s"
+              % (objIdx, np.array2string( record['positions'][objIdx], precision=2 ),
+                 record['status'][objIdx],
+                 np.array2string( record['gains'][:,objIdx], precision=3 )) )
+
+def main():
+    parser = argparse.ArgumentParser( description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter )
+    parser.add_argument( 'name', help='Name of the telemetry buffer.' )
+    parser.add_argument( '--interval', type=float, default=0.1,
+                        help='Update interval in seconds (default: 0.1).' )
+    parser.add_argument( '--text', action='store_true', help='Print the data instead of plotting.' )
+    args = parser.parse_args()
+
+    reader = TelemetryReader( args.name )
+    if args.text:
+        lastBlock = None
+        while True:
+            record = reader.latest()
+            if (record is not None) and (record['block'] != lastBlock):
+                printRecord( record )
+                lastBlock = record['block']
+            time.sleep( args.interval )
+    else:
+        import matplotlib.pyplot as plt
+        fig, ax = plt.subplots()
+        image = ax.imshow( np.zeros( (reader.numLoudspeakers, reader.numObjects) ),
+                          vmin=0.0, vmax=1.0, aspect='auto', interpolation='nearest' )
+        ax.set_xlabel( 'Object' )
+        ax.set_ylabel( 'Loudspeaker' )
+        fig.colorbar( image )
+        while plt.fignum_exists( fig.number ):
+            record = reader.latest()
+            if record is not None:
+                image.set_data( np.abs( record['gains'] ) )
+                ax.set_title( 'Block %d' % record['block'] )
+            plt.pause( args.interval )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Andreas Franck <a.franck@soton.ac.uk>
+# Copyright (C) 2018 University of Southampton
+
+# Code accompanying the paper:
+
+# Andreas Franck and Filippo Maria Fazi, “VISR – A versatile open software
+# framework for audio signal processing,” in Proc. Audio Eng. Soc. 2018 Int. Conf.
+# Spatial Reproduction, Tokyo, Japan, 2018.
+
+# We kindly ask to acknowledge the use of this software in publications or software
+# by citing this paper.
+
+# The code is provided under the ISC (Internet Systems Consortium) license
+# https://www.isc.org/downloads/software-support-policy/isc-license/ :
+
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS
+# OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+File multi_layout_renderer.py
+
+Rendering of one object scene to several loudspeaker layouts at once.
+
+The object vector is received (and decoded) once. The VBAP gains of each layout
+are computed by an rcl.PanningCalculator, i.e., with the loudspeaker triplets of
+the layout configuration exactly as in VbapRenderer. The gains of all layouts
+are stacked into one gain matrix, so the object audio is mixed in one pass. The
+rows of the combined output are routed to one audio output per layout.
+"""
+
+import numpy as np
+
+import visr
+import pml
+import panning
+import rcl
+
+class GainStacker( visr.AtomicComponent ):
+    """
+    Stacks the gain matrices of several layouts into one matrix.
+
+    Inputs "gains0", "gains1", ...: matrices of dimension #loudspeakers x numberOfObjects
+    of the individual layouts. Output "gains": matrix of dimension
+    (sum of #loudspeakers) x numberOfObjects, the rows in the order of the inputs.
+    """
+    def __init__( self, context, name, parent, numberOfObjects, numbersOfLoudspeakers ):
+        """
+        Constructor.
+
+        Parameters
+        ----------
+        context: visr.SignalFlowContext
+        name: string
+        parent: visr.CompositeComponent or None
+        numberOfObjects: int
+            Number of gain matrix columns.
+        numbersOfLoudspeakers: sequence of int
+            Number of rows of each input.
+        """
+        super().__init__( context, name, parent )
+        self.rowOffsets = np.cumsum( [0] + list( numbersOfLoudspeakers ) )
+        self.gainInputs = [ visr.ParameterInput( "gains%d" % idx, self,
+                                                pml.MatrixParameterFloat.staticType,
+                                                pml.SharedDataProtocol.staticType,
+                                                pml.MatrixParameterConfig( int( numLsp ), numberOfObjects ) )
+                           for idx, numLsp in enumerate( numbersOfLoudspeakers ) ]
+        self.gainOut = visr.ParameterOutput( "gains", self,
+                                            pml.MatrixParameterFloat.staticType,
+                                            pml.SharedDataProtocol.staticType,
+                                            pml.MatrixParameterConfig( int( self.rowOffsets[-1] ), numberOfObjects ) )
+
+    def process( self ):
+        # Shared data has no change notification, and the copy is cheap compared to the mixing.
+        gains = np.asarray( self.gainOut.protocol.data() )
+        for idx, gainIn in enumerate( self.gainInputs ):
+            gains[self.rowOffsets[idx]:self.rowOffsets[idx+1],:] = np.asarray( gainIn.protocol.data() )
+
+class MultiLayoutVbapRenderer( visr.CompositeComponent ):
+    """
+    VBAP renderer with one audio output per loudspeaker layout.
+
+    The outputs are named "out0", "out1", ... in the order of the layouts.
+    """
+    def __init__( self, context, name, parent, numberOfObjects, lspConfigs ):
+        """
+        Constructor.
+
+        Parameters
+        ----------
+        context: visr.SignalFlowContext
+        name: string
+        parent: visr.CompositeComponent or None
+        numberOfObjects: int
+            The maximum number of objects.
+        lspConfigs: sequence of panning.LoudspeakerArray or layout file names
+            The target layouts.
+        """
+        super().__init__( context, name, parent )
+        lspConfigs = [ cfg if isinstance( cfg, panning.LoudspeakerArray ) else panning.LoudspeakerArray( cfg )
+                      for cfg in lspConfigs ]
+        numbersOfLoudspeakers = [ cfg.numberOfRegularLoudspeakers for cfg in lspConfigs ]
+        self.audioIn = visr.AudioInputFloat( "in", self, numberOfObjects )
+        self.objectIn = visr.ParameterInput( "objects", self,
+                                            pml.ObjectVector.staticType,
+                                            pml.DoubleBufferingProtocol.staticType,
+                                            pml.EmptyParameterConfig() )
+        self.calculators = [ rcl.PanningCalculator( context, "VbapGainCalculator%d" % idx, self,
+                                                   numberOfObjects, cfg )
+                            for idx, cfg in enumerate( lspConfigs ) ]
+        self.stacker = GainStacker( context, "GainStacker", self, numberOfObjects, numbersOfLoudspeakers )
+        self.rowOffsets = self.stacker.rowOffsets
+        self.matrix = rcl.GainMatrix( context, "GainMatrix", self, numberOfObjects,
+                                     int( self.rowOffsets[-1] ), interpolationSteps=context.period,
+                                     initialGains=0.0 )
+        for idx, calculator in enumerate( self.calculators ):
+            self.parameterConnection( self.objectIn, calculator.parameterPort("objectVectorInput") )
+            self.parameterConnection( calculator.parameterPort("vbapGains"),
+                                     self.stacker.parameterPort( "gains%d" % idx ) )
+        self.parameterConnection( self.stacker.parameterPort("gains"),
+                                 self.matrix.parameterPort("gainInput") )
+        self.audioConnection( self.audioIn, self.matrix.audioPort("in") )
+        self.audioOutputs = []
+        for layoutIdx, numLsp in enumerate( numbersOfLoudspeakers ):
+            output = visr.AudioOutputFloat( "out%d" % layoutIdx, self, numLsp )
+            start = int( self.rowOffsets[layoutIdx] )
+            self.audioConnection( self.matrix.audioPort("out"), list( range( start, start+numLsp ) ),
+                                 output, list( range( numLsp ) ) )
+            self.audioOutputs.append( output )
+
+class RealtimeMultiLayoutVbapRenderer( visr.CompositeComponent ):
+    """
+    MultiLayoutVbapRenderer receiving the object metadata via UDP.
+
+    The network messages are received and decoded once for all layouts.
+    """
+    def __init__( self, context, name, parent, numberOfObjects, lspConfigs, nwPort ):
+        """
+        Constructor, see MultiLayoutVbapRenderer.
+
+        Parameters
+        ----------
+        nwPort: int
+            Port number of a UDP connection to receive object metadata messages.
+        """
+        super().__init__( context, name, parent )
+        self.audioIn = visr.AudioInputFloat( "in", self, numberOfObjects )
+        self.receiver = rcl.UdpReceiver( context, "NetworkReceiver", self, port=nwPort )
+        self.decoder = rcl.SceneDecoder( context, "SceneDecoder", self )
+        self.renderer = MultiLayoutVbapRenderer( context, "Renderer", self, numberOfObjects, lspConfigs )
+        self.parameterConnection( self.receiver.parameterPort("messageOutput"),
+                                 self.decoder.parameterPort("datagramInput") )
+        self.parameterConnection( self.decoder.parameterPort("objectVectorOutput"),
+                                 self.renderer.parameterPort("objects") )
+        self.audioConnection( self.audioIn, self.renderer.audioPort("in") )
+        self.audioOutputs = []
+        rowOffsets = self.renderer.rowOffsets
+        for layoutIdx in range( len( rowOffsets ) - 1 ):
+            numLsp = int( rowOffsets[layoutIdx+1] - rowOffsets[layoutIdx] )
+            output = visr.AudioOutputFloat( "out%d" % layoutIdx, self, numLsp )
+            self.audioConnection( self.renderer.audioPort( "out%d" % layoutIdx ), output )
+            self.audioOutputs.append( output )
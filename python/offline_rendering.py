@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Andreas Franck <a.franck@soton.ac.uk>
+# Copyright (C) 2018 University of Southampton
+
+# Code accompanying the paper:
+
+# Andreas Franck and Filippo Maria Fazi, “VISR – A versatile open software
+# framework for audio signal processing,” in Proc. Audio Eng. Soc. 2018 Int. Conf.
+# Spatial Reproduction, Tokyo, Japan, 2018.
+
+# We kindly ask to acknowledge the use of this software in publications or software
+# by citing this paper.
+
+# The code is provided under the ISC (Internet Systems Consortium) license
+# https://www.isc.org/downloads/software-support-policy/isc-license/ :
+
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS
+# OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+File offline_rendering.py
+
+Functions to render object-based scenes offline, i.e., without an audio interface
+and as fast as possible, by calling rrl.AudioSignalFlow block by block.
+
+The object metadata is given as a timeline of scene keyframes in a JSON file:
+
+  [ { "time": 0.0,
+      "objects": [ { "id": 0, "channel": 0, "az": 30.0, "el": 0.0, "radius": 1.0, "level": 1.0 } ] },
+    { "time": 1.5,
+      "objects": [ ... ] } ]
+
+Each keyframe describes the complete scene from its time (in seconds) on. Angles
+are given in degree, "channel" defaults to the object id and "radius" and "level"
+default to 1.0.
+"""
+
+import json
+import time
+
+import numpy as np
+
+import objectmodel as om
+
+from helper.baseTrigFunctions import deg2rad, sph2cart
+
+def createPointSource( description ):
+    """
+    Create an objectmodel.PointSource from an object entry of a metadata timeline.
+    """
+    objectId = int( description['id'] )
+    ps = om.PointSource( objectId )
+    ps.position = sph2cart( deg2rad( float( description.get( 'az', 0.0 ) ) ),
+                           deg2rad( float( description.get( 'el', 0.0 ) ) ),
+                           float( description.get( 'radius', 1.0 ) ) )
+    ps.channels = [ int( description.get( 'channel', objectId ) ) ]
+    ps.level = float( description.get( 'level', 1.0 ) )
+    return ps
+
+class MetadataTimeline:
+    """
+    Sequence of object scenes with start times.
+
+    The object instances are created once at construction, so that rendering
+    only needs to pass them to the signal flow.
+    """
+    def __init__( self, keyframes ):
+        """
+        Constructor.
+
+        Parameters
+        ----------
+        keyframes: list of dict
+            Keyframes as described in the module documentation.
+        """
+        keyframes = sorted( keyframes, key = lambda kf: float( kf['time'] ) )
+        self.times = np.array( [ float( kf['time'] ) for kf in keyframes ] )
+        self.scenes = [ [ createPointSource( obj ) for obj in kf['objects'] ]
+                       for kf in keyframes ]
+
+    @classmethod
+    def fromFile( cls, fileName ):
+        """
+        Read a metadata timeline from a JSON file.
+        """
+        with open( fileName, 'r' ) as fh:
+            return cls( json.load( fh ) )
+
+    def sceneIndex( self, t ):
+        """
+        Index of the keyframe that is active at time t (in seconds), -1 if t is before the first keyframe.
+        """
+        return int( np.searchsorted( self.times, t, side='right' ) ) - 1
+
+def readAudioFiles( fileNames ):
+    """
+    Read one or multiple WAV files and concatenate their channels.
+
+    Returns
+    -------
+    signal: np.ndarray
+        Audio signal as float32, dimension #channels x #samples. Shorter files are zero-padded.
+    samplingFrequency: int
+    """
+    from scipy.io import wavfile
+    signals = []
+    samplingFrequency = None
+    for fileName in fileNames:
+        fs, data = wavfile.read( fileName )
+        if samplingFrequency is None:
+            samplingFrequency = fs
+        elif fs != samplingFrequency:
+            raise ValueError( "readAudioFiles: Sampling frequency of '%s' does not match." % fileName )
+        if np.issubdtype( data.dtype, np.integer ):
+            info = np.iinfo( data.dtype )
+            # Unsigned formats (8 bit WAV) are offset binary, 128 is zero.
+            offset = (info.max + 1) // 2 if info.min == 0 else 0
+            data = (data.astype( np.float64 ) - offset) / float( info.max - offset )
+        signals.append( np.atleast_2d( data.T ) )
+    length = max( sig.shape[-1] for sig in signals )
+    signal = np.zeros( (sum( sig.shape[0] for sig in signals ), length), dtype=np.float32 )
+    chIdx = 0
+    for sig in signals:
+        signal[chIdx:chIdx+sig.shape[0],:sig.shape[-1]] = sig
+        chIdx += sig.shape[0]
+    return signal, samplingFrequency
+
+def writeAudioFile( fileName, signal, samplingFrequency ):
+    """
+    Write a multichannel signal (#channels x #samples) as a 32-bit float WAV file.
+    """
+    from scipy.io import wavfile
+    wavfile.write( fileName, samplingFrequency, np.asarray( signal.T, dtype=np.float32 ) )
+
+def renderOffline( flow, objectInput, inputSignal, timeline, blockSize, samplingFrequency,
+                  numberOfOutputs, *, tailLength = 0 ):
+    """
+    Run a signal flow block by block on an input signal.
+
+    Parameters
+    ----------
+    flow: rrl.AudioSignalFlow
+        Flow object of the renderer.
+    objectInput: parameter receive port of the flow
+        Port accepting a pml.ObjectVector, e.g., flow.parameterReceivePort('objects')
+    inputSignal: np.ndarray
+        Object audio signals, dimension #objects x #samples.
+    timeline: MetadataTimeline
+        The object metadata. A keyframe is applied to the first block starting at or
+        after its time.
+    blockSize: int
+        Block size of the flow.
+    samplingFrequency: int
+        Sampling frequency of the flow.
+    numberOfOutputs: int
+        Number of output channels of the flow.
+    tailLength: int
+        Number of samples to render after the end of the input, e.g., for reverberation tails.
+
+    Returns
+    -------
+    output: np.ndarray
+        Rendered signal, dimension #outputs x (#samples + tailLength)
+    realtimeFactor: float
+        Ratio between the signal duration and the processing time.
+    """
+    outputLength = inputSignal.shape[-1] + tailLength
+    numBlocks = -(-outputLength // blockSize) # Integer ceil
+    paddedInput = np.zeros( (inputSignal.shape[0], numBlocks*blockSize), dtype=np.float32 )
+    paddedInput[:,:inputSignal.shape[-1]] = inputSignal
+    output = np.zeros( (numberOfOutputs, numBlocks*blockSize), dtype=np.float32 )
+    currentScene = -1
+    startTime = time.perf_counter()
+    for blockIdx in range( numBlocks ):
+        sceneIdx = timeline.sceneIndex( blockIdx * blockSize / samplingFrequency )
+        if (sceneIdx >= 0) and (sceneIdx != currentScene):
+            objectInput.data().set( timeline.scenes[sceneIdx] )
+            objectInput.swapBuffers()
+            currentScene = sceneIdx
+        blockSlice = slice( blockIdx*blockSize, (blockIdx+1)*blockSize )
+        output[:,blockSlice] = flow.process( paddedInput[:,blockSlice] )
+    processingTime = time.perf_counter() - startTime
+    realtimeFactor = numBlocks * blockSize / samplingFrequency / max( processingTime, 1e-9 )
+    return output[:,:outputLength], realtimeFactor
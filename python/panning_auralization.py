@@ -32,18 +32,30 @@ File panning_auralization.py
 Define a VISR component consisting of a VBAP renderer and a binaural virtual
 loudspeaker renderer to auralise the loudspeaker reproduction over headphones.
 
-This class makes uses the VISR Binaural Synthesis Toolkit.
+This class makes uses the VISR Binaural Synthesis Toolkit. The visr_bst package
+is imported only when a PanningAuralization is constructed, and the tracker
+support only if head tracking is enabled.
+
+Optionally, the BRIRs are preprocessed once and loaded from a cache (see
+brir_cache.py), and the binaural convolution can be performed by a uniformly
+partitioned convolver (see partitioned_convolution.py) instead of the BST
+virtual loudspeaker renderer. With directBinaural, the objects are convolved
+with combined object-to-ear filters if there are fewer active objects than
+loudspeakers (see direct_binaural.py).
 """
 
+import numpy as np
+
 import visr
+import pml
 import panning
+import rcl
 
-from visr_bst import VirtualLoudspeakerRenderer
-# Example tracker based on the Razor AHRS tracker
-# https://github.com/Razor-AHRS/razor-9dof-ahrs
-from visr_bst.tracker import RazorAHRSWithUdpCalibrationTrigger
-
-from vbap_renderer import RealtimeVbapRenderer
+from vbap_renderer import VbapRenderer, RealtimeVbapRenderer
+from head_rotation import HeadRotationController
+from brir_cache import prepareBrirCache
+from partitioned_convolution import PartitionedConvolver
+from direct_binaural import DirectBinauralRenderer
 
 class PanningAuralization( visr.CompositeComponent ):
     """
@@ -61,7 +73,15 @@ class PanningAuralization( visr.CompositeComponent ):
                  objectPort = 4242,
                  headTracking = False,
                  trackingPort = "",
-                 irTruncationLength = None
+                 irTruncationLength = None,
+                 trackingMode = "brir",
+                 trackingUpdateInterval = 0.02,
+                 trackingQuantisation = 1.0,
+                 brirReloadThreshold = 15.0,
+                 brirCache = None,
+                 partitionedConvolution = False,
+                 convolutionThreads = 1,
+                 directBinaural = False
                  ):
         """
         Constructor.
@@ -78,6 +98,9 @@ class PanningAuralization( visr.CompositeComponent ):
             Loudspeaker configuration object used in the ob ject renderer. Must not be None
         numberOfObjects: int
             The number of objects to be rendered.
+        objectPort: int or None
+            UDP port for receiving object metadata. If None, a parameter input "objects"
+            (pml.ObjectVector) is created instead, e.g., for offline rendering.
         sofaFile: string
             BRIR database provided as a SOFA file. This is an alternative to the hrirPosition, hrirData
             (and optionally hrirDelays) argument. Default None means that hrirData and hrirPosition must be provided.
@@ -88,41 +111,151 @@ class PanningAuralization( visr.CompositeComponent ):
             Linux: "/dev/"/dev/ttyUSB0", Mac OS: "/dev/cu.usbserial-AJ03GSC8"
         irTruncationLength: int or None
             Maximum number of samples of the BRIR impulse responses. Functional only if the BRIR is provided in a SOFA file.
+        trackingMode: string
+            How head rotations are compensated if headTracking is True. "brir" (default) passes every
+            orientation update to the virtual loudspeaker renderer. "objectRotation" counter-rotates the
+            object positions before the panning stage and updates the BRIR orientation only if the head
+            moves further than brirReloadThreshold, see HeadRotationController.
+        trackingUpdateInterval: float
+            Minimum time in seconds between two tracker evaluations (only for trackingMode "objectRotation").
+        trackingQuantisation: float
+            Angular resolution of the tracker data in degree (only for trackingMode "objectRotation").
+        brirReloadThreshold: float
+            Head rotation in degree that triggers a BRIR update (only for trackingMode "objectRotation").
+        brirCache: bool, string or None
+            Whether to load the BRIRs of the loudspeakers in lspConfig from a cache instead of parsing the
+            SOFA file at every start. True uses the default cache directory next to the SOFA file, a string
+            specifies the cache directory. None or False (default) passes the SOFA file to the binaural renderer.
+        partitionedConvolution: bool
+            Whether to use a uniformly partitioned convolver instead of the VirtualLoudspeakerRenderer.
+            This always uses the BRIR cache. With head tracking, the BRIRs of the closest orientation are
+            selected and crossfaded over one block, i.e., without BRIR interpolation.
+        convolutionThreads: int
+            Number of threads used by the partitioned convolver (only if partitionedConvolution is True).
+        directBinaural: bool
+            Whether to replace the object renderer and the binaural renderer by a DirectBinauralRenderer,
+            which convolves the objects directly with gain-weighted BRIRs whenever there are fewer active
+            objects than loudspeakers. This always uses the BRIR cache.
         """
         # Parameter checking
         if not isinstance( lspConfig, panning.LoudspeakerArray ):
             # Try to convert automatically
             lspConfig = panning.LoudspeakerArray( lspConfig )
+        if trackingMode not in ["brir", "objectRotation"]:
+            raise ValueError( "PanningAuralization: Unknown trackingMode '%s'." % trackingMode )
+        useObjectRotation = headTracking and (trackingMode == "objectRotation")
 
         super(PanningAuralization, self).__init__( context, name, parent )
 
         self.objectInput = visr.AudioInputFloat( "audioIn", self, numberOfObjects )
         self.binauralOutput = visr.AudioOutputFloat( "audioOut", self, 2 )
 
-        self.objectRenderer = RealtimeVbapRenderer( context, "ObjectRenderer", self,
-                                                    numberOfObjects = numberOfObjects,
-                                                    lspConfig=lspConfig,
-                                                    nwPort = objectPort )
+        if partitionedConvolution or directBinaural:
+            brirCache = brirCache or True
+        if brirCache:
+            cache = prepareBrirCache( sofaFile, lspConfig, context.period, context.samplingFrequency,
+                                     cacheDirectory = None if brirCache is True else brirCache,
+                                     irTruncationLength = irTruncationLength )
+            # Start with the BRIRs measured closest to the frontal direction.
+            frontIndex = int( np.argmax( cache.listenerViews[:,0] ) )
 
-        self.virtualLoudspeakerRenderer = VirtualLoudspeakerRenderer( context,
-                 "VirtualLoudspeakerRenderer", self,
-                 sofaFile=sofaFile,
-                 headTracking=headTracking,
-                 dynamicITD=False,
-                 hrirInterpolation=True,
-                 irTruncationLength=irTruncationLength,
-                 filterCrossfading=True,
-                 interpolatingConvolver=False )
+        if useObjectRotation or (objectPort is None) or directBinaural:
+            if directBinaural:
+                self.objectRenderer = DirectBinauralRenderer( context, "ObjectRenderer", self,
+                                                             numberOfObjects=numberOfObjects,
+                                                             lspConfig=lspConfig,
+                                                             filterPartitions=cache.partitions,
+                                                             listenerViews=cache.listenerViews,
+                                                             headTracking=headTracking,
+                                                             initialFilterSet=frontIndex )
+            else:
+                self.objectRenderer = VbapRenderer( context, "ObjectRenderer", self,
+                                                   numberOfObjects, lspConfig )
+            if objectPort is None:
+                # Object metadata is provided through a parameter input, e.g., for offline rendering.
+                self.objectIn = visr.ParameterInput( "objects", self,
+                                                    pml.ObjectVector.staticType,
+                                                    pml.DoubleBufferingProtocol.staticType,
+                                                    pml.EmptyParameterConfig() )
+                objectSource = self.objectIn
+            else:
+                # The network receiver and the scene decoder are instantiated here (instead
+                # of using a RealtimeVbapRenderer) to route the object metadata through the
+                # rotation controller.
+                self.receiver = rcl.UdpReceiver( context, "NetworkReceiver", self, port=objectPort )
+                self.decoder = rcl.SceneDecoder( context, "SceneDecoder", self )
+                self.parameterConnection( self.receiver.parameterPort("messageOutput"),
+                                         self.decoder.parameterPort("datagramInput") )
+                objectSource = self.decoder.parameterPort("objectVectorOutput")
+            if useObjectRotation:
+                self.rotationController = HeadRotationController( context, "RotationController", self,
+                                                                 updateInterval = trackingUpdateInterval,
+                                                                 quantisationStep = trackingQuantisation,
+                                                                 reloadThreshold = brirReloadThreshold )
+                self.parameterConnection( objectSource,
+                                         self.rotationController.parameterPort("objectIn") )
+                self.parameterConnection( self.rotationController.parameterPort("objectOut"),
+                                         self.objectRenderer.parameterPort("objects") )
+            else:
+                self.parameterConnection( objectSource, self.objectRenderer.parameterPort("objects") )
+        else:
+            self.objectRenderer = RealtimeVbapRenderer( context, "ObjectRenderer", self,
+                                                        numberOfObjects = numberOfObjects,
+                                                        lspConfig=lspConfig,
+                                                        nwPort = objectPort )
 
+        if directBinaural:
+            # The binaural output is produced by the object renderer itself.
+            self.virtualLoudspeakerRenderer = self.objectRenderer
+            binauralOut = self.objectRenderer.audioPort("out")
+        elif partitionedConvolution:
+            self.virtualLoudspeakerRenderer = PartitionedConvolver( context,
+                     "VirtualLoudspeakerRenderer", self,
+                     filterPartitions=cache.partitions,
+                     listenerViews=cache.listenerViews,
+                     headTracking=headTracking,
+                     initialFilterSet=frontIndex,
+                     numberOfThreads=convolutionThreads )
+            binauralIn = self.virtualLoudspeakerRenderer.audioPort("in")
+            binauralOut = self.virtualLoudspeakerRenderer.audioPort("out")
+        else:
+            # Deferred import, see the module docstring.
+            from visr_bst import VirtualLoudspeakerRenderer
+            if brirCache:
+                brirArgs = { 'hrirPositions': cache.listenerViewsSofa,
+                            'hrirData': cache.brirs,
+                            'hrirDelays': cache.delays }
+            else:
+                brirArgs = { 'sofaFile': sofaFile,
+                            'irTruncationLength': irTruncationLength }
+            self.virtualLoudspeakerRenderer = VirtualLoudspeakerRenderer( context,
+                     "VirtualLoudspeakerRenderer", self,
+                     headTracking=headTracking,
+                     dynamicITD=False,
+                     hrirInterpolation=True,
+                     filterCrossfading=True,
+                     interpolatingConvolver=False,
+                     **brirArgs )
+            binauralIn = self.virtualLoudspeakerRenderer.audioPort("audioIn")
+            binauralOut = self.virtualLoudspeakerRenderer.audioPort("audioOut")
 
         self.audioConnection( self.objectInput, self.objectRenderer.audioPort("in") )
-        self.audioConnection( self.objectRenderer.audioPort("out"),
-                             self.virtualLoudspeakerRenderer.audioPort("audioIn") )
-        self.audioConnection( self.virtualLoudspeakerRenderer.audioPort("audioOut"), self.binauralOutput)
+        if not directBinaural:
+            self.audioConnection( self.objectRenderer.audioPort("out"), binauralIn )
+        self.audioConnection( binauralOut, self.binauralOutput)
 
         if headTracking:
+            # Example tracker based on the Razor AHRS tracker
+            # https://github.com/Razor-AHRS/razor-9dof-ahrs
+            from visr_bst.tracker import RazorAHRSWithUdpCalibrationTrigger
             self.tracker = RazorAHRSWithUdpCalibrationTrigger( context, "Tracker", self,
                                                               port=trackingPort,
                                                               calibrationPort=9999)
-            self.parameterConnection( self.tracker.parameterPort("orientation"),
-                                     self.virtualLoudspeakerRenderer.parameterPort("tracking"))
+            if useObjectRotation:
+                self.parameterConnection( self.tracker.parameterPort("orientation"),
+                                         self.rotationController.parameterPort("trackingIn") )
+                self.parameterConnection( self.rotationController.parameterPort("trackingOut"),
+                                         self.virtualLoudspeakerRenderer.parameterPort("tracking") )
+            else:
+                self.parameterConnection( self.tracker.parameterPort("orientation"),
+                                         self.virtualLoudspeakerRenderer.parameterPort("tracking"))
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Andreas Franck <a.franck@soton.ac.uk>
+# Copyright (C) 2018 University of Southampton
+
+# Code accompanying the paper:
+
+# Andreas Franck and Filippo Maria Fazi, “VISR – A versatile open software
+# framework for audio signal processing,” in Proc. Audio Eng. Soc. 2018 Int. Conf.
+# Spatial Reproduction, Tokyo, Japan, 2018.
+
+# We kindly ask to acknowledge the use of this software in publications or software
+# by citing this paper.
+
+# The code is provided under the ISC (Internet Systems Consortium) license
+# https://www.isc.org/downloads/software-support-policy/isc-license/ :
+
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS
+# OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+File parallel_gain_table.py
+
+Parallel computation of panning gains for gain tables.
+
+Each table entry requires solving an independent optimisation problem, so the
+directions are split into chunks that are distributed to a pool of worker
+processes. Every worker constructs its solver (e.g., an L2GainSolver with its
+compiled problems) once and writes the gains directly into a shared-memory
+array. As every direction is solved independently by an identical solver, the
+result does not depend on the number of workers or the chunk size.
+
+Usage as a script: python parallel_gain_table.py LAYOUT.xml TABLE.npz [options]
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import os
+import sys
+import time
+
+import numpy as np
+
+from gain_table import GainTable, AdaptiveGainTable, CompressedGainTable
+from spread_kernels import SpreadKernelTable
+
+# Solver instance of a worker process, created by _initWorker().
+workerSolver = None
+
+def _initWorker( solverFactory, factoryArgs ):
+    global workerSolver
+    workerSolver = solverFactory( *factoryArgs )
+
+def _solveChunk( shmName, shape, directions, start ):
+    """
+    Compute the gains for a chunk of directions and write them to rows start... of the shared array.
+
+    Returns
+    -------
+    Number of directions in the chunk and number of failed (NaN) rows.
+    """
+    shm = shared_memory.SharedMemory( name=shmName, create=False )
+    try:
+        result = np.ndarray( shape, dtype=np.float64, buffer=shm.buf )
+        gains = workerSolver.calculateGains( directions )
+        result[start:start+directions.shape[0],:] = gains
+        del result
+    finally:
+        shm.close()
+    return directions.shape[0], int( np.count_nonzero( np.any( np.isnan( gains ), axis=-1 ) ) )
+
+class ParallelGainCalculator:
+    """
+    Pool of worker processes computing panning gains for sets of directions.
+
+    The object can be used as gain function for GainTable.build() and
+    AdaptiveGainTable.build(). Use it as a context manager or call close() to
+    terminate the workers.
+    """
+    def __init__( self, solverFactory, factoryArgs, numberOfOutputs, *,
+                 numberOfWorkers = None, chunkSize = 64, progress = None ):
+        """
+        Constructor.
+
+        Parameters
+        ----------
+        solverFactory: callable
+            Picklable function or class that creates the solver in each worker, for example
+            L2GainSolver. The solver must provide calculateGains( directions ).
+        factoryArgs: tuple
+            Arguments passed to solverFactory, for example (L, numberOfRegularLoudspeakers).
+        numberOfOutputs: int
+            Number of gains per direction.
+        numberOfWorkers: int, optional
+            Number of processes, default: number of CPUs.
+        chunkSize: int
+            Number of directions per task.
+        progress: callable, optional
+            Called as progress( numberOfFinishedDirections, numberOfDirections ) whenever a chunk is finished.
+        """
+        self.numberOfOutputs = numberOfOutputs
+        self.chunkSize = chunkSize
+        self.progress = progress
+        self.numberOfFailures = 0
+        self.pool = ProcessPoolExecutor( numberOfWorkers, initializer=_initWorker,
+                                        initargs=(solverFactory, factoryArgs) )
+
+    def calculateGains( self, directions ):
+        """
+        Compute the gains for a set of directions.
+
+        Parameters
+        ----------
+        directions: np.ndarray
+            Source positions, dimension #directions x 3.
+
+        Returns
+        -------
+        np.ndarray, dimension #directions x #outputs. Rows for which the solver failed are NaN.
+        """
+        directions = np.reshape( np.asarray( directions, dtype=np.float64 ), (-1,3) )
+        shape = (directions.shape[0], self.numberOfOutputs)
+        shm = shared_memory.SharedMemory( create=True, size=max( 1, 8 * shape[0] * shape[1] ) )
+        try:
+            result = np.ndarray( shape, dtype=np.float64, buffer=shm.buf )
+            result[...] = np.nan
+            futures = [ self.pool.submit( _solveChunk, shm.name, shape,
+                                          directions[start:start+self.chunkSize], start )
+                       for start in range( 0, shape[0], self.chunkSize ) ]
+            finished = 0
+            for future in as_completed( futures ):
+                numDirections, numFailed = future.result()
+                finished += numDirections
+                self.numberOfFailures += numFailed
+                if self.progress is not None:
+                    self.progress( finished, shape[0] )
+            gains = np.array( result )
+            del result
+        finally:
+            shm.close()
+            shm.unlink()
+        return gains
+
+    __call__ = calculateGains
+
+    def close( self ):
+        self.pool.shutdown()
+
+    def __enter__( self ):
+        return self
+
+    def __exit__( self, *args ):
+        self.close()
+
+def parallelL2GainCalculator( lspArray, **kwargs ):
+    """
+    Create a ParallelGainCalculator for the VBAP L2 problem of a loudspeaker layout.
+
+    Parameters
+    ----------
+    lspArray: panning.LoudspeakerArray
+        The loudspeaker layout.
+    kwargs:
+        Keyword arguments of ParallelGainCalculator.
+    """
+    from vbap_l2_panner import L2GainSolver
+    from helper.vectorFunctions import normalise
+    L = normalise( lspArray.positions().T, norm=2, axis=0 )
+    numSpeakers = lspArray.numberOfRegularLoudspeakers
+    return ParallelGainCalculator( L2GainSolver, (L, numSpeakers), numSpeakers, **kwargs )
+
+def printProgress( finished, total ):
+    sys.stdout.write( "\r%d/%d directions" % (finished, total) )
+    if finished == total:
+        sys.stdout.write( "\n" )
+    sys.stdout.flush()
+
+def main():
+    parser = argparse.ArgumentParser( description="Compute a VBAP L2 gain table in parallel." )
+    parser.add_argument( 'layout', help='Loudspeaker layout (XML).' )
+    parser.add_argument( 'output', help='Output file (.npz), loadable with gain_table.loadGainTable()'
+                        ' or SpreadKernelTable.load().' )
+    parser.add_argument( '--resolution', type=float, default=2.0,
+                        help='Azimuth and elevation resolution of a regular table in degree (default: 2).' )
+    parser.add_argument( '--adaptive', action='store_true',
+                        help='Build an AdaptiveGainTable instead of a regular grid.' )
+    parser.add_argument( '--spread', action='store_true',
+                        help='Build a SpreadKernelTable for extent sources instead of a gain table.' )
+    parser.add_argument( '--compress', choices=['uint16', 'float16'], default=None,
+                        help='Store a regular table as CompressedGainTable with the given precision.' )
+    parser.add_argument( '--tolerance', type=float, default=0.01,
+                        help='Interpolation tolerance of an adaptive table (default: 0.01).' )
+    parser.add_argument( '--workers', type=int, default=None,
+                        help='Number of worker processes (default: number of CPUs).' )
+    parser.add_argument( '--chunk-size', type=int, default=64,
+                        help='Number of directions per task (default: 64).' )
+    args = parser.parse_args()
+
+    import panning
+    lspArray = panning.LoudspeakerArray( args.layout )
+    startTime = time.time()
+    with parallelL2GainCalculator( lspArray, numberOfWorkers=args.workers,
+                                  chunkSize=args.chunk_size, progress=printProgress ) as calculator:
+        if args.spread:
+            table = SpreadKernelTable.build( calculator, azimuthResolution=args.resolution,
+                                            elevationResolution=args.resolution )
+            numEntries = table.kernels.shape[0] * table.powerKernels.shape[1]
+        elif args.adaptive:
+            table = AdaptiveGainTable.build( calculator, tolerance=args.tolerance )
+            numEntries = table.vertices.shape[0]
+            print( "Maximum interpolation error at the test points %.2e." % table.maxError )
+        else:
+            table = GainTable.build( calculator, args.resolution, args.resolution )
+            numEntries = table.flatGains.shape[0]
+            if args.compress is not None:
+                table = CompressedGainTable.fromGainTable( table, args.compress )
+                print( "Compressed to %d bytes, maximum error %.2e." % (table.nbytes, table.maxError) )
+        numFailures = calculator.numberOfFailures
+    table.save( args.output )
+    print( "%d entries (%d solver failures) in %.1f s, written to %s."
+          % (numEntries, numFailures, time.time() - startTime, os.path.basename( args.output )) )
+
+if __name__ == "__main__":
+    main()
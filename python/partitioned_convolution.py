@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Andreas Franck <a.franck@soton.ac.uk>
+# Copyright (C) 2018 University of Southampton
+
+# Code accompanying the paper:
+
+# Andreas Franck and Filippo Maria Fazi, “VISR – A versatile open software
+# framework for audio signal processing,” in Proc. Audio Eng. Soc. 2018 Int. Conf.
+# Spatial Reproduction, Tokyo, Japan, 2018.
+
+# We kindly ask to acknowledge the use of this software in publications or software
+# by citing this paper.
+
+# The code is provided under the ISC (Internet Systems Consortium) license
+# https://www.isc.org/downloads/software-support-policy/isc-license/ :
+
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS
+# OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+File partitioned_convolution.py
+
+Uniformly partitioned FFT convolution (overlap-save with a frequency-domain delay line).
+
+The impulse responses are split into partitions of the block size, so the latency
+equals one block and the computational cost per block grows only linearly with
+the number of partitions, independent of the FFT size. Switching between filter
+sets (e.g., BRIRs for different head orientations) is performed with a linear
+crossfade over one block.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import visr
+import pml
+
+from helper.rotationFunctions import rotationMatrix
+
+def computeFilterPartitions( irs, blockSize, dtype = np.complex64 ):
+    """
+    Split impulse responses into partitions and transform them into the frequency domain.
+
+    Parameters
+    ----------
+    irs: np.ndarray
+        Impulse responses, arbitrary leading dimensions, the last dimension is time.
+    blockSize: int
+        Partition length, must be equal to the processing block size.
+    dtype: numpy.dtype
+        Complex data type of the result.
+
+    Returns
+    -------
+    np.ndarray, dimension irs.shape[:-1] + (#partitions, blockSize+1)
+    """
+    irLength = irs.shape[-1]
+    numPartitions = max( 1, -(-irLength // blockSize) ) # Integer ceil
+    padded = np.zeros( irs.shape[:-1] + (numPartitions * blockSize,), dtype=irs.dtype )
+    padded[...,:irLength] = irs
+    partitions = np.reshape( padded, irs.shape[:-1] + (numPartitions, blockSize) )
+    # Each partition is zero-padded to twice the block size (overlap-save).
+    return np.fft.rfft( partitions, n=2*blockSize, axis=-1 ).astype( dtype )
+
+def multiplyAccumulate( filters, fdl ):
+    """
+    Frequency-domain multiply-accumulate over all inputs and partitions.
+
+    Parameters
+    ----------
+    filters: np.ndarray
+        Filter partitions, dimension #outputs x #inputs x #partitions x #bins
+    fdl: np.ndarray
+        Frequency-domain delay line, dimension #inputs x #partitions x #bins
+
+    Returns
+    -------
+    np.ndarray, output spectra, dimension #outputs x #bins
+    """
+    # Considerably faster than the equivalent np.einsum( 'oipf,ipf->of', ... ).
+    numOut, numIn, numPart, numBins = filters.shape
+    return np.sum( np.reshape( filters, (numOut, numIn*numPart, numBins) )
+                  * np.reshape( fdl, (1, numIn*numPart, numBins) ), axis=1 )
+
+class UniformPartitionedConvolutionEngine:
+    """
+    MIMO convolution engine using uniformly partitioned overlap-save convolution.
+
+    Each output is the sum of all inputs convolved with the respective filter. The
+    engine holds a number of filter sets, only one of which is active at a time.
+    """
+    def __init__( self, filterPartitions, blockSize, numberOfThreads = 1 ):
+        """
+        Constructor.
+
+        Parameters
+        ----------
+        filterPartitions: np.ndarray
+            Frequency-domain filter partitions as returned by computeFilterPartitions(),
+            dimension #filterSets x #outputs x #inputs x #partitions x (blockSize+1).
+            Memory-mapped arrays are supported.
+        blockSize: int
+            Number of samples processed per call to process().
+        numberOfThreads: int
+            Number of threads used for the frequency-domain multiply-accumulate. The
+            inputs are split into one group per thread. NumPy releases the GIL in
+            these operations, so this scales with the number of cores for larger
+            numbers of inputs and partitions. The threads are stopped by close().
+        """
+        if filterPartitions.ndim != 5 or filterPartitions.shape[-1] != blockSize+1:
+            raise ValueError( "UniformPartitionedConvolutionEngine: filterPartitions has an invalid shape." )
+        self.filters = filterPartitions
+        self.blockSize = blockSize
+        (self.numberOfFilterSets, self.numberOfOutputs, self.numberOfInputs,
+         self.numberOfPartitions, numBins) = filterPartitions.shape
+        # Frequency-domain delay line, newest input spectrum at partition index 0.
+        self.fdl = np.zeros( (self.numberOfInputs, self.numberOfPartitions, numBins),
+                            dtype=filterPartitions.dtype )
+        self.inputBuffer = np.zeros( (self.numberOfInputs, 2*blockSize), dtype=np.float32 )
+        self.currentSet = 0
+        self.nextSet = None
+        self.fadeIn = np.arange( 1, blockSize+1, dtype=np.float32 ) / blockSize
+        self.fadeOut = 1.0 - self.fadeIn
+        numberOfThreads = max( 1, min( numberOfThreads, self.numberOfInputs ) )
+        bounds = np.linspace( 0, self.numberOfInputs, numberOfThreads+1 ).astype( int )
+        self.inputGroups = [ slice( bounds[i], bounds[i+1] ) for i in range(numberOfThreads) ]
+        self.threadPool = ThreadPoolExecutor( numberOfThreads ) if numberOfThreads > 1 else None
+
+    def close( self ):
+        """
+        Stop the worker threads. Further blocks are processed in the calling thread.
+        """
+        if self.threadPool is not None:
+            self.threadPool.shutdown()
+            self.threadPool = None
+
+    def __del__( self ):
+        if getattr( self, 'threadPool', None ) is not None:
+            self.threadPool.shutdown( wait=False )
+
+    def selectFilterSet( self, index ):
+        """
+        Select the active filter set. The change takes effect with a crossfade over the next block.
+        """
+        if not 0 <= index < self.numberOfFilterSets:
+            raise IndexError( "UniformPartitionedConvolutionEngine: filter set index out of range." )
+        if index != self.currentSet:
+            self.nextSet = index
+
+    def convolveSpectrum( self, filterSet ):
+        """
+        Compute the time-domain output block for one filter set from the current delay line.
+        """
+        filters = self.filters[filterSet]
+        if self.threadPool is None:
+            spectrum = multiplyAccumulate( filters, self.fdl )
+        else:
+            partialSpectra = self.threadPool.map(
+                lambda group: multiplyAccumulate( filters[:,group,...], self.fdl[group,...] ),
+                self.inputGroups )
+            spectrum = sum( partialSpectra )
+        return np.fft.irfft( spectrum, n=2*self.blockSize, axis=-1 )[:,self.blockSize:]
+
+    def process( self, inputBlock ):
+        """
+        Process one block of audio.
+
+        Parameters
+        ----------
+        inputBlock: np.ndarray
+            Input signals, dimension #inputs x blockSize.
+
+        Returns
+        -------
+        np.ndarray, output signals, dimension #outputs x blockSize.
+        """
+        self.inputBuffer[:,:self.blockSize] = self.inputBuffer[:,self.blockSize:]
+        self.inputBuffer[:,self.blockSize:] = inputBlock
+        self.fdl[:,1:,:] = self.fdl[:,:-1,:]
+        self.fdl[:,0,:] = np.fft.rfft( self.inputBuffer, axis=-1 )
+        output = self.convolveSpectrum( self.currentSet )
+        if self.nextSet is not None:
+            newOutput = self.convolveSpectrum( self.nextSet )
+            output = self.fadeOut * output + self.fadeIn * newOutput
+            self.currentSet = self.nextSet
+            self.nextSet = None
+        return output
+
+class PartitionedConvolver( visr.AtomicComponent ):
+    """
+    VISR atomic component for static or head-tracked MIMO convolution using uniformly
+    partitioned FFT convolution.
+
+    With head tracking, the filter set whose listener view is closest to the
+    current head orientation is selected, and changes are crossfaded over one block.
+    """
+    def __init__( self, context, name, parent, *,
+                 filterPartitions,
+                 listenerViews = None,
+                 headTracking = False,
+                 initialFilterSet = 0,
+                 numberOfThreads = 1 ):
+        """
+        Constructor.
+
+        Parameters
+        ----------
+        context: visr.SignalFlowContext
+            A context object containing the sampling frequency and the block size.
+        name: string
+            Name of the component to be identified within a containing component.
+        parent: visr.CompositeComponent
+            A containing component, or None if this is the top-level component.
+        filterPartitions: np.ndarray
+            Frequency-domain filter partitions, dimension
+            #filterSets x #outputs x #inputs x #partitions x (period+1).
+        listenerViews: np.ndarray or None
+            Unit vectors of the listener view direction for each filter set, dimension
+            #filterSets x 3. Mandatory if headTracking is True.
+        headTracking: bool
+            Whether a parameter input "tracking" (pml.ListenerPosition) is created.
+        initialFilterSet: int
+            Index of the filter set used initially, respectively without head tracking.
+        numberOfThreads: int
+            Number of threads used by the convolution engine.
+        """
+        super().__init__( context, name, parent )
+        self.engine = UniformPartitionedConvolutionEngine( filterPartitions, context.period,
+                                                          numberOfThreads )
+        self.engine.currentSet = initialFilterSet
+        self.audioIn = visr.AudioInputFloat( "in", self, self.engine.numberOfInputs )
+        self.audioOut = visr.AudioOutputFloat( "out", self, self.engine.numberOfOutputs )
+        if headTracking:
+            if listenerViews is None:
+                raise ValueError( "PartitionedConvolver: Head tracking requires the listenerViews argument." )
+            self.listenerViews = np.asarray( listenerViews )
+            self.trackingIn = visr.ParameterInput( "tracking", self,
+                pml.ListenerPosition.staticType,
+                pml.DoubleBufferingProtocol.staticType,
+                pml.EmptyParameterConfig() )
+        else:
+            self.trackingIn = None
+
+    def process( self ):
+        """
+        Process function, executed for each block.
+        """
+        if (self.trackingIn is not None) and self.trackingIn.protocol.changed():
+            orientation = self.trackingIn.protocol.data().orientation
+            viewDirection = rotationMatrix( *orientation )[:,0]
+            self.engine.selectFilterSet( int( np.argmax( self.listenerViews @ viewDirection ) ) )
+            self.trackingIn.protocol.resetChanged()
+        self.audioOut.set( self.engine.process( self.audioIn.data() ) )
+
+    def close( self ):
+        """
+        Stop the worker threads of the convolution engine.
+        """
+        self.engine.close()
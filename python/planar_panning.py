@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Andreas Franck <a.franck@soton.ac.uk>
+# Copyright (C) 2018 University of Southampton
+
+# Code accompanying the paper:
+
+# Andreas Franck and Filippo Maria Fazi, “VISR – A versatile open software
+# framework for audio signal processing,” in Proc. Audio Eng. Soc. 2018 Int. Conf.
+# Spatial Reproduction, Tokyo, Japan, 2018.
+
+# We kindly ask to acknowledge the use of this software in publications or software
+# by citing this paper.
+
+# The code is provided under the ISC (Internet Systems Consortium) license
+# https://www.isc.org/downloads/software-support-policy/isc-license/ :
+
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS
+# OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+File planar_panning.py
+
+Closed-form pairwise panning for planar (2D) loudspeaker layouts.
+
+For loudspeakers in the horizontal plane, the minimum-L1 non-negative solution
+of the panning equations uses only the two loudspeakers adjacent in azimuth to
+the source direction, and the L2 stage of the VBAP L2 problem has no remaining
+freedom. So the VBAP L2 gains of a planar layout are pairwise VBAP gains, which
+are computed here without an optimisation solver: the loudspeaker pair is found
+by a binary search in the sorted azimuths, and the gains follow from the sine law.
+"""
+
+import bisect
+import math
+
+import numpy as np
+
+from helper.vectorFunctions import normalise
+
+def isPlanarLayout( lspArray, tolerance = 1e-3 ):
+    """
+    Whether a loudspeaker layout is planar, i.e., declared with dimension="2" in the
+    configuration file or with all loudspeakers (including virtual ones) in the horizontal plane.
+
+    Parameters
+    ----------
+    lspArray: panning.LoudspeakerArray
+    tolerance: float
+        Maximum absolute z component of the normalised loudspeaker directions.
+    """
+    if lspArray.is2D():
+        return True
+    L = normalise( np.asarray( lspArray.positions(), dtype=np.float64 ), norm=2, axis=-1 )
+    return bool( np.max( np.abs( L[:,2] ) ) < tolerance )
+
+class PlanarPanningCalculator:
+    """
+    Vectorised pairwise panning gains for planar loudspeaker layouts.
+
+    Elevated source directions are projected onto the horizontal plane. If two
+    adjacent loudspeakers are 180 degree or more apart (e.g., a stereo layout
+    without virtual loudspeakers), directions between them are panned to the
+    closer of the two.
+    """
+    def __init__( self, positions, numberOfRegularLoudspeakers = None ):
+        """
+        Constructor.
+
+        Parameters
+        ----------
+        positions: np.ndarray
+            Cartesian loudspeaker positions, dimension #loudspeakers x 3 (regular
+            loudspeakers first, followed by virtual loudspeakers). The z component is ignored.
+        numberOfRegularLoudspeakers: int or None
+            Number of regular loudspeakers, i.e., the number of returned gains. None
+            means that all loudspeakers are regular.
+        """
+        positions = np.asarray( positions, dtype=np.float64 )
+        self.numberOfLoudspeakers = positions.shape[0]
+        self.numberOfRegularLoudspeakers = self.numberOfLoudspeakers \
+          if numberOfRegularLoudspeakers is None else numberOfRegularLoudspeakers
+        azimuths = np.arctan2( positions[:,1], positions[:,0] )
+        # Loudspeaker indices sorted by azimuth, and the sorted azimuths extended by the
+        # first loudspeaker plus one turn, so that pair k consists of the sorted
+        # loudspeakers k and k+1 (cyclically).
+        self.order = np.argsort( azimuths )
+        sortedAz = azimuths[self.order]
+        self.azimuths = np.concatenate( (sortedAz, sortedAz[:1] + 2*np.pi) )
+        self.apertures = np.diff( self.azimuths )
+        self.sinApertures = np.sin( self.apertures )
+        # Plain Python copies for the scalar fast path.
+        self.azimuthList = self.azimuths.tolist()
+        self.orderList = self.order.tolist()
+
+    @classmethod
+    def fromLoudspeakerArray( cls, lspArray ):
+        """
+        Create a calculator for a panning.LoudspeakerArray.
+        """
+        return cls( lspArray.positions(), lspArray.numberOfRegularLoudspeakers )
+
+    def calculateGains( self, directions ):
+        """
+        Calculate the panning gains for a set of directions.
+
+        Parameters
+        ----------
+        directions: np.ndarray
+            Source positions (cartesian), dimension #directions x 3 or a single vector.
+
+        Returns
+        -------
+        np.ndarray, gains normalised to unit power (before discarding virtual
+        loudspeakers), dimension #directions x #regular loudspeakers, or a vector
+        if a single direction is passed.
+        """
+        directions = np.asarray( directions, dtype=np.float64 )
+        if directions.shape == (3,):
+            return self.calculateSingle( directions )
+        directions = np.reshape( directions, (-1,3) )
+        numDirs = directions.shape[0]
+        az = np.arctan2( directions[:,1], directions[:,0] )
+        # Map the azimuths to [azimuths[0], azimuths[0]+2pi) and find the enclosing pair.
+        az = self.azimuths[0] + np.mod( az - self.azimuths[0], 2*np.pi )
+        pair = np.clip( np.searchsorted( self.azimuths, az, side='right' ) - 1,
+                       0, len( self.apertures ) - 1 )
+        offset = az - self.azimuths[pair]
+        aperture = self.apertures[pair]
+        wide = aperture >= np.pi - 1e-9
+        sinAperture = np.where( wide, 1.0, self.sinApertures[pair] )
+        g1 = np.sin( aperture - offset ) / sinAperture
+        g2 = np.sin( offset ) / sinAperture
+        # Pairs spanning 180 degree or more: closer loudspeaker only.
+        closerFirst = offset <= 0.5 * aperture
+        g1 = np.where( wide, closerFirst.astype( np.float64 ), g1 )
+        g2 = np.where( wide, 1.0 - closerFirst, g2 )
+        norm = np.maximum( np.sqrt( g1*g1 + g2*g2 ), np.finfo( np.float64 ).tiny )
+        gains = np.zeros( (numDirs, self.numberOfLoudspeakers) )
+        rows = np.arange( numDirs )
+        # Two separate assignments, because both loudspeakers coincide if the layout
+        # consists of a single loudspeaker.
+        gains[rows, self.order[pair]] = g1 / norm
+        gains[rows, self.order[(pair+1) % self.numberOfLoudspeakers]] += g2 / norm
+        return gains[:,:self.numberOfRegularLoudspeakers]
+
+    def calculateSingle( self, direction ):
+        """
+        Scalar version of calculateGains() for a single direction, which avoids the
+        overhead of the array operations.
+        """
+        az0 = self.azimuthList[0]
+        az = az0 + math.fmod( math.atan2( direction[1], direction[0] ) - az0 + 4*math.pi, 2*math.pi )
+        pair = min( max( bisect.bisect_right( self.azimuthList, az ) - 1, 0 ), len( self.azimuthList ) - 2 )
+        offset = az - self.azimuthList[pair]
+        aperture = self.azimuthList[pair+1] - self.azimuthList[pair]
+        if aperture >= math.pi - 1e-9:
+            g1 = 1.0 if offset <= 0.5 * aperture else 0.0
+            g2 = 1.0 - g1
+        else:
+            g1 = math.sin( aperture - offset )
+            g2 = math.sin( offset )
+            norm = max( math.hypot( g1, g2 ), np.finfo( np.float64 ).tiny )
+            g1 /= norm
+            g2 /= norm
+        gains = np.zeros( self.numberOfLoudspeakers )
+        gains[self.orderList[pair]] = g1
+        gains[self.orderList[(pair+1) % self.numberOfLoudspeakers]] += g2
+        return gains[:self.numberOfRegularLoudspeakers]
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Andreas Franck <a.franck@soton.ac.uk>
+# Copyright (C) 2018 University of Southampton
+
+# Code accompanying the paper:
+
+# Andreas Franck and Filippo Maria Fazi, “VISR – A versatile open software
+# framework for audio signal processing,” in Proc. Audio Eng. Soc. 2018 Int. Conf.
+# Spatial Reproduction, Tokyo, Japan, 2018.
+
+# We kindly ask to acknowledge the use of this software in publications or software
+# by citing this paper.
+
+# The code is provided under the ISC (Internet Systems Consortium) license
+# https://www.isc.org/downloads/software-support-policy/isc-license/ :
+
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS
+# OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+Render an object-based scene offline to a binaural WAV file using the
+PanningAuralization signal flow (VBAP rendering to virtual loudspeakers and
+binaural convolution with the BRIRs of these loudspeakers).
+
+The rendering does not use an audio interface, so it runs as fast as the
+processing allows, e.g., for checking binaural deliverables on a headless
+machine. The convolution uses the uniformly partitioned convolver with the
+cached BRIRs of the loudspeaker layout, optionally distributed over multiple threads.
+
+Example:
+
+  python render_offline_auralization.py --layout ../data/bs2051-4+5+0.xml \
+      --sofa ../data/bbcrdlr_systemD.sofa --metadata scene.json \
+      --output binaural.wav --threads 4 objects.wav
+"""
+
+import argparse
+
+import visr
+import panning
+import rrl
+
+from panning_auralization import PanningAuralization
+from offline_rendering import MetadataTimeline, readAudioFiles, writeAudioFile, renderOffline
+
+def main():
+    parser = argparse.ArgumentParser( description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter )
+    parser.add_argument( 'audioFiles', nargs='+',
+                        help='WAV files containing the object signals, channels are numbered consecutively.' )
+    parser.add_argument( '--metadata', required=True, help='Metadata timeline (JSON).' )
+    parser.add_argument( '--layout', required=True, help='Loudspeaker configuration file (XML).' )
+    parser.add_argument( '--sofa', required=True, help='BRIR data set (SOFA, MultiSpeakerBRIR).' )
+    parser.add_argument( '--output', required=True, help='Binaural output file (WAV).' )
+    parser.add_argument( '--block-size', type=int, default=1024, help='Block size (default: 1024).' )
+    parser.add_argument( '--ir-length', type=int, default=4096,
+                        help='BRIR truncation length in samples (default: 4096).' )
+    parser.add_argument( '--threads', type=int, default=1,
+                        help='Number of convolution threads (default: 1).' )
+    parser.add_argument( '--cache-dir', default=None,
+                        help='Directory of the BRIR cache (default: next to the SOFA file).' )
+    parser.add_argument( '--direct-binaural', action='store_true',
+                        help='Convolve the objects with combined object-to-ear filters if there are fewer active objects than loudspeakers.' )
+    parser.add_argument( '--tail', type=float, default=0.0,
+                        help='Duration in seconds rendered after the end of the input (default: 0).' )
+    args = parser.parse_args()
+
+    inputSignal, fs = readAudioFiles( args.audioFiles )
+    numObjects = inputSignal.shape[0]
+    timeline = MetadataTimeline.fromFile( args.metadata )
+
+    context = visr.SignalFlowContext( args.block_size, fs )
+    lc = panning.LoudspeakerArray( args.layout )
+    renderer = PanningAuralization( context, 'auraliser', None,
+                                   numberOfObjects = numObjects,
+                                   lspConfig = lc,
+                                   sofaFile = args.sofa,
+                                   objectPort = None,
+                                   irTruncationLength = args.ir_length,
+                                   brirCache = args.cache_dir if args.cache_dir is not None else True,
+                                   partitionedConvolution = True,
+                                   convolutionThreads = args.threads,
+                                   directBinaural = args.direct_binaural )
+    flow = rrl.AudioSignalFlow( renderer )
+
+    output, realtimeFactor = renderOffline( flow, flow.parameterReceivePort( 'objects' ),
+                                           inputSignal, timeline, args.block_size, fs, 2,
+                                           tailLength = int( round( args.tail * fs ) ) )
+    writeAudioFile( args.output, output, fs )
+    print( "Rendered %.1f s of audio at %.1fx real time." % (output.shape[-1]/fs, realtimeFactor) )
+
+if __name__ == "__main__":
+    main()
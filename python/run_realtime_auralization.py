@@ -78,6 +78,12 @@ sofaFileName = 'bbcrdlr_systemD.sofa'
 # %% Tracking support.
 useTracking = False
 
+# How head rotations are compensated: "brir" updates the BRIRs on every tracker
+# update, "objectRotation" counter-rotates the objects and reloads the BRIRs only
+# for rotations larger than the threshold (in degree).
+trackingMode = "brir"
+brirReloadThreshold = 15.0
+
 # Specific settings for the Razor AHRS
 # TODO: Check and adjust port names for the individual system
 if platform == 'linux' or platform == 'linux2':
@@ -103,6 +109,17 @@ if not os.path.exists( fullSofaPath ):
     urlretrieve( 'http://data.bbcarp.org.uk/bbcrd-brirs/sofa/' + sofaFileName,
                 fullSofaPath )
 
+# %% BRIR preprocessing.
+# Load the BRIRs of the selected loudspeaker layout from a cache that is created
+# on the first start. True uses the directory 'brircache' next to the SOFA file.
+brirCache = True
+# Use the uniformly partitioned convolver instead of the BST virtual loudspeaker
+# renderer (no BRIR interpolation for head tracking).
+partitionedConvolution = False
+# Convolve the objects directly with gain-weighted BRIRs whenever there are fewer
+# active objects than loudspeakers (implies the BRIR cache).
+directBinaural = False
+
 # Number of objects rendered.
 # More objects are possible if the sound card supports a sufficient number of channels.
 numObjects = 2
@@ -118,7 +135,12 @@ renderer = PanningAuralization( context, 'auraliser', None,
                                objectPort = 4242,
                                headTracking = useTracking,
                                trackingPort = trackingPort,
-                               irTruncationLength = 4096 )
+                               irTruncationLength = 4096,
+                               trackingMode = trackingMode,
+                               brirReloadThreshold = brirReloadThreshold,
+                               brirCache = brirCache,
+                               partitionedConvolution = partitionedConvolution,
+                               directBinaural = directBinaural )
 
 # Instantiate a flow object that contains the runtime infrastructure for the renderer.
 flow = rrl.AudioSignalFlow( renderer )
@@ -38,6 +38,8 @@ import rrl
 import audiointerfaces as ai
 
 from vbap_renderer import RealtimeVbapRenderer
+from vbap_l2_renderer import RealtimeVbapL2Renderer
+from load_supervisor import DegradationSupervisor
 
 bs = 512   # Define the period / buffer size
 fs = 48000 # Define the sampling rate in Hz
@@ -63,6 +65,11 @@ configFile = '../data/stereo.xml'
 # More objects are possible if the sound card supports a sufficient number of channels.
 numObjects = 2
 
+# Whether to use the VBAP L2 renderer instead of VBAP. It reduces its quality
+# (table gains instead of the optimisation, lower update rate, no interpolation)
+# if the processing load gets close to the block period, see load_supervisor.py.
+useL2Renderer = False
+
 # Create a loudspeaker array object.
 lc = panning.LoudspeakerArray( configFile )
 
@@ -70,8 +77,16 @@ lc = panning.LoudspeakerArray( configFile )
 numLsp = lc.numberOfRegularLoudspeakers
 
 # Instantiate the signal flow.
-renderer = RealtimeVbapRenderer( context, 'renderer', None, numObjects,
-                              lspConfig=lc, nwPort=4242 )
+if useL2Renderer:
+    supervisor = DegradationSupervisor( bs, fs )
+    # The Python gain matrix reports its processing time to the supervisor.
+    renderer = RealtimeVbapL2Renderer( context, 'renderer', None, numObjects,
+                                      lspArray=lc, nwPort=4242,
+                                      adaptiveObjectCount=True, supervisor=supervisor )
+else:
+    supervisor = None
+    renderer = RealtimeVbapRenderer( context, 'renderer', None, numObjects,
+                                  lspConfig=lc, nwPort=4242 )
 
 # Instantiate a flow object that contains the runtime infrastructure for the renderer.
 flow = rrl.AudioSignalFlow( renderer )
@@ -107,6 +122,9 @@ while( True ):
 aIfc.stop()
 aIfc.unregisterCallback()
 
+if supervisor is not None:
+    print( "Blocks per quality tier: %s, peak load %.2f." % (supervisor.blocksPerTier, supervisor.peakLoad) )
+
 # Cleanup.
 del aIfc
 del flow
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Andreas Franck <a.franck@soton.ac.uk>
+# Copyright (C) 2018 University of Southampton
+
+# Code accompanying the paper:
+
+# Andreas Franck and Filippo Maria Fazi, “VISR – A versatile open software
+# framework for audio signal processing,” in Proc. Audio Eng. Soc. 2018 Int. Conf.
+# Spatial Reproduction, Tokyo, Japan, 2018.
+
+# We kindly ask to acknowledge the use of this software in publications or software
+# by citing this paper.
+
+# The code is provided under the ISC (Internet Systems Consortium) license
+# https://www.isc.org/downloads/software-support-policy/isc-license/ :
+
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS
+# OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+Persistent scene state for driving renderers from Python.
+
+SceneState keeps one objectmodel.PointSource per object id for the whole
+session. Updates are compared against the current state and only changed fields
+are written to the objects. The object vector is transferred to the parameter
+ports only if the scene changed since the last transfer.
+"""
+
+import numpy as np
+
+import objectmodel as om
+
+class SceneState:
+    """
+    Pool of point source objects keyed by object id.
+    """
+    def __init__( self ):
+        self.sources = []
+        self.index = {}
+        self.positions = np.zeros( (0,3) )
+        self.levels = np.zeros( 0 )
+        self.dirty = False
+
+    @property
+    def objectIds( self ):
+        return [ ps.objectId for ps in self.sources ]
+
+    def addPointSource( self, objectId, position = (1.0, 0.0, 0.0), level = 1.0, channel = None ):
+        """
+        Add a point source to the pool.
+
+        Parameters
+        ----------
+        objectId: int
+        position: array-like, Cartesian position.
+        level: float
+        channel: int, optional
+            Audio channel index. Default: the object id.
+        """
+        if objectId in self.index:
+            raise KeyError( "SceneState: Object id %d already exists." % objectId )
+        ps = om.PointSource( objectId )
+        ps.position = [ float(v) for v in position ]
+        ps.level = float( level )
+        ps.channels = [ objectId if channel is None else int( channel ) ]
+        self.index[objectId] = len( self.sources )
+        self.sources.append( ps )
+        self.positions = np.concatenate( (self.positions, np.asarray( position, dtype=np.float64 )[np.newaxis,:]) )
+        self.levels = np.append( self.levels, float( level ) )
+        self.dirty = True
+        return ps
+
+    def removeObject( self, objectId ):
+        row = self.index.pop( objectId )
+        del self.sources[row]
+        self.positions = np.delete( self.positions, row, axis=0 )
+        self.levels = np.delete( self.levels, row )
+        self.index = { ps.objectId: idx for idx, ps in enumerate( self.sources ) }
+        self.dirty = True
+
+    def update( self, objectId, position = None, level = None ):
+        """
+        Update a single object. Fields that are None or unchanged are not written.
+
+        Returns
+        -------
+        bool: Whether the object changed.
+        """
+        row = self.index[objectId]
+        changed = False
+        if position is not None:
+            position = np.asarray( position, dtype=np.float64 )
+            if np.any( position != self.positions[row] ):
+                self.positions[row] = position
+                self.sources[row].position = position.tolist()
+                changed = True
+        if level is not None and level != self.levels[row]:
+            self.levels[row] = level
+            self.sources[row].level = float( level )
+            changed = True
+        self.dirty |= changed
+        return changed
+
+    def updatePositions( self, positions, objectIds = None ):
+        """
+        Update the positions of multiple objects.
+
+        Parameters
+        ----------
+        positions: np.ndarray, shape (#objects, 3)
+            New positions, in the order of objectIds.
+        objectIds: sequence of int, optional
+            The objects to update. Default: all objects in the order they were added.
+
+        Returns
+        -------
+        int: Number of changed objects.
+        """
+        rows = np.arange( len( self.sources ) ) if objectIds is None \
+            else np.array( [ self.index[objId] for objId in objectIds ], dtype=np.intp )
+        positions = np.asarray( positions, dtype=np.float64 )
+        changedIdx = np.flatnonzero( np.any( positions != self.positions[rows], axis=-1 ) )
+        if changedIdx.size > 0:
+            changedRows = rows[changedIdx]
+            self.positions[changedRows] = positions[changedIdx]
+            for row, pos in zip( changedRows.tolist(), positions[changedIdx].tolist() ):
+                self.sources[row].position = pos
+            self.dirty = True
+        return changedIdx.size
+
+    def updateLevels( self, levels, objectIds = None ):
+        """
+        Update the levels of multiple objects, see updatePositions().
+        """
+        rows = np.arange( len( self.sources ) ) if objectIds is None \
+            else np.array( [ self.index[objId] for objId in objectIds ], dtype=np.intp )
+        levels = np.broadcast_to( np.asarray( levels, dtype=np.float64 ), rows.shape )
+        changedIdx = np.flatnonzero( levels != self.levels[rows] )
+        if changedIdx.size > 0:
+            changedRows = rows[changedIdx]
+            self.levels[changedRows] = levels[changedIdx]
+            for row, level in zip( changedRows.tolist(), levels[changedIdx].tolist() ):
+                self.sources[row].level = level
+            self.dirty = True
+        return changedIdx.size
+
+    def push( self, *ports, force = False ):
+        """
+        Transfer the scene to one or more parameter ports with double buffering
+        protocol (e.g., flow.parameterReceivePort('objects')), if it changed since
+        the last call.
+
+        Returns
+        -------
+        bool: Whether the scene was transferred.
+        """
+        if not (self.dirty or force):
+            return False
+        for port in ports:
+            port.data().set( self.sources )
+            port.swapBuffers()
+        self.dirty = False
+        return True
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Andreas Franck <a.franck@soton.ac.uk>
+# Copyright (C) 2018 University of Southampton
+
+# Code accompanying the paper:
+
+# Andreas Franck and Filippo Maria Fazi, “VISR – A versatile open software
+# framework for audio signal processing,” in Proc. Audio Eng. Soc. 2018 Int. Conf.
+# Spatial Reproduction, Tokyo, Japan, 2018.
+
+# We kindly ask to acknowledge the use of this software in publications or software
+# by citing this paper.
+
+# The code is provided under the ISC (Internet Systems Consortium) license
+# https://www.isc.org/downloads/software-support-policy/isc-license/ :
+
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS
+# OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+File spread_kernels.py
+
+Precomputed gain kernels for spread (extent) sources.
+
+The gains of a source with angular width w in direction d are defined as the
+power average of the point-source gains over the spherical cap of opening
+angle w centred at d. Computing this average per object and block would
+require many point-source solutions, so SpreadKernelTable evaluates the
+point-source gains once on a dense set of sample directions, forms the cap
+averages for a grid of directions and a set of widths, and interpolates
+between the grid directions and the widths at runtime.
+"""
+
+import numpy as np
+
+from gain_table import gridDirections, gridSize
+
+def fibonacciSphere( numberOfPoints ):
+    """
+    Approximately uniformly distributed unit vectors, dimension #points x 3.
+    """
+    idx = np.arange( numberOfPoints ) + 0.5
+    z = 1.0 - 2.0 * idx / numberOfPoints
+    phi = np.pi * (1.0 + np.sqrt( 5.0 )) * idx
+    rho = np.sqrt( 1.0 - z*z )
+    return np.stack( (rho * np.cos( phi ), rho * np.sin( phi ), z), axis=-1 )
+
+class SpreadKernelTable:
+    """
+    Spread source gains for a set of widths on a regular direction grid.
+
+    The grid is the same as for gain_table.GainTable. The lookup interpolates
+    bilinearly in azimuth and elevation between the four surrounding grid
+    directions, in the power domain.
+    """
+    def __init__( self, kernels, widths, azimuthResolution, elevationResolution ):
+        """
+        Constructor, use build() or load() to create a table.
+
+        Parameters
+        ----------
+        kernels: np.ndarray
+            Gains, dimension #widths x #elevations x #azimuths x #loudspeakers.
+        widths: array-like
+            Spread widths (full opening angle of the cap) in degree, increasing and positive.
+        azimuthResolution, elevationResolution: float
+            Grid spacing in degree, see GainTable.
+        """
+        self.widths = np.asarray( widths, dtype=np.float64 )
+        if np.any( self.widths <= 0.0 ) or np.any( np.diff( self.widths ) <= 0.0 ):
+            raise ValueError( "SpreadKernelTable: The widths must be positive and increasing." )
+        self.azimuthResolution = float( azimuthResolution )
+        self.elevationResolution = float( elevationResolution )
+        self.numAzimuths, self.numElevations = gridSize( azimuthResolution, elevationResolution )
+        self.kernels = np.asarray( kernels )
+        if self.kernels.shape[:3] != (self.widths.size, self.numElevations, self.numAzimuths):
+            raise ValueError( "SpreadKernelTable: The dimension of the kernels does not match the widths and the grid." )
+        self.numberOfLoudspeakers = self.kernels.shape[-1]
+        # Squared gains for interpolation in the power domain, flattened grid dimensions.
+        self.powerKernels = np.reshape( self.kernels.astype( np.float64 )**2,
+                                       (self.widths.size, -1, self.numberOfLoudspeakers) )
+
+    @classmethod
+    def build( cls, gainFunction, widths = (15.0, 30.0, 60.0, 90.0, 120.0, 180.0, 360.0),
+              azimuthResolution = 5.0, elevationResolution = 5.0, numberOfSamples = 2048 ):
+        """
+        Compute the kernels from a point-source gain function.
+
+        Parameters
+        ----------
+        gainFunction: callable
+            Function that takes an array of unit direction vectors (#directions x 3) and
+            returns the gains (#directions x #loudspeakers), e.g., L2GainSolver.calculateGains
+            or a parallel_gain_table.ParallelGainCalculator. Rows containing NaN are ignored.
+            It is called once with numberOfSamples directions.
+        widths: sequence of float
+            Spread widths in degree. 360 denotes a source covering the full sphere.
+        azimuthResolution, elevationResolution: float
+            Grid spacing of the kernel directions in degree.
+        numberOfSamples: int
+            Number of sample directions for the cap averages. The smallest width should
+            contain several samples, i.e., the sample spacing (about 4.5 degree for 2048
+            samples) must be small compared to the half width.
+        """
+        samples = fibonacciSphere( numberOfSamples )
+        samplePower = np.asarray( gainFunction( samples ), dtype=np.float64 )**2
+        valid = np.all( np.isfinite( samplePower ), axis=-1 )
+        samples, samplePower = samples[valid], samplePower[valid]
+        directions = np.reshape( gridDirections( azimuthResolution, elevationResolution ), (-1,3) )
+        cosAngles = directions @ samples.T # #directions x #samples
+        kernels = np.empty( (len( widths ), directions.shape[0], samplePower.shape[-1]) )
+        for widthIdx, width in enumerate( widths ):
+            inCap = cosAngles >= np.cos( np.deg2rad( 0.5 * width ) ) - 1e-12
+            counts = np.maximum( np.count_nonzero( inCap, axis=-1 ), 1 )
+            power = (inCap.astype( np.float64 ) @ samplePower) / counts[:,np.newaxis]
+            kernels[widthIdx] = np.sqrt( power / np.maximum( np.sum( power, axis=-1, keepdims=True ), 1e-30 ) )
+        numAz, numEl = gridSize( azimuthResolution, elevationResolution )
+        return cls( np.reshape( kernels, (len( widths ), numEl, numAz, -1) ).astype( np.float32 ),
+                   widths, azimuthResolution, elevationResolution )
+
+    @classmethod
+    def load( cls, fileName ):
+        """
+        Load a table stored with save().
+        """
+        data = np.load( fileName )
+        return cls( data['kernels'], data['widths'], float( data['azimuthResolution'] ),
+                   float( data['elevationResolution'] ) )
+
+    def save( self, fileName ):
+        """
+        Store the table in a .npz file.
+        """
+        np.savez( fileName, kernels=self.kernels, widths=self.widths,
+                 azimuthResolution=self.azimuthResolution,
+                 elevationResolution=self.elevationResolution )
+
+    def gridWeights( self, direction ):
+        """
+        Flat indices of the four grid directions surrounding a direction vector and
+        their bilinear interpolation weights.
+        """
+        x, y, z = float( direction[0] ), float( direction[1] ), float( direction[2] )
+        az = np.rad2deg( np.arctan2( y, x ) )
+        el = np.rad2deg( np.arctan2( z, np.hypot( x, y ) ) )
+        azPos = (az + 180.0) / self.azimuthResolution
+        elPos = min( max( (el + 90.0) / self.elevationResolution, 0.0 ), self.numElevations-1.0 )
+        az0 = int( np.floor( azPos ) )
+        el0 = min( int( elPos ), self.numElevations-2 )
+        azFrac, elFrac = azPos - az0, elPos - el0
+        # The azimuth wraps around, the last grid azimuth is adjacent to the first.
+        az0, az1 = az0 % self.numAzimuths, (az0+1) % self.numAzimuths
+        indices = np.array( [ el0*self.numAzimuths + az0, el0*self.numAzimuths + az1,
+                              (el0+1)*self.numAzimuths + az0, (el0+1)*self.numAzimuths + az1 ] )
+        weights = np.array( [ (1.0-elFrac)*(1.0-azFrac), (1.0-elFrac)*azFrac,
+                              elFrac*(1.0-azFrac), elFrac*azFrac ] )
+        return indices, weights
+
+    def kernelPower( self, widthIndex, indices, weights ):
+        """
+        Squared kernel gains of a width, interpolated between grid directions (see gridWeights()).
+        """
+        return weights @ self.powerKernels[widthIndex, indices]
+
+    def lookup( self, direction, width, pointGains = None ):
+        """
+        Gains of a spread source.
+
+        Parameters
+        ----------
+        direction: array-like
+            Direction vector of the source.
+        width: float
+            Spread width in degree. Widths between two table widths are interpolated
+            in the power domain, larger widths use the largest kernel.
+        pointGains: np.ndarray, optional
+            Point-source gains of the direction. Required for widths below the smallest
+            table width, which are interpolated between the point-source gains and the
+            first kernel.
+
+        Returns
+        -------
+        np.ndarray, gains of the loudspeakers (normalised power).
+        """
+        indices, weights = self.gridWeights( direction )
+        upper = int( np.searchsorted( self.widths, width, side='left' ) )
+        if upper >= self.widths.size:
+            power = self.kernelPower( -1, indices, weights )
+            return np.sqrt( power / np.sum( power ) )
+        upperPower = self.kernelPower( upper, indices, weights )
+        if width >= self.widths[upper]:
+            # Exactly a table width, including the smallest one (no point-source gains needed).
+            return np.sqrt( upperPower / np.sum( upperPower ) )
+        if upper == 0:
+            if pointGains is None:
+                raise ValueError( "SpreadKernelTable.lookup(): Point-source gains are required for widths below %g degree." % self.widths[0] )
+            lowerWidth, lowerPower = 0.0, np.asarray( pointGains, dtype=np.float64 )**2
+        else:
+            lowerWidth, lowerPower = self.widths[upper-1], self.kernelPower( upper-1, indices, weights )
+        alpha = (width - lowerWidth) / (self.widths[upper] - lowerWidth)
+        power = (1.0 - alpha) * lowerPower + alpha * upperPower
+        return np.sqrt( power / np.sum( power ) )
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Andreas Franck <a.franck@soton.ac.uk>
+# Copyright (C) 2018 University of Southampton
+
+# Code accompanying the paper:
+
+# Andreas Franck and Filippo Maria Fazi, “VISR – A versatile open software
+# framework for audio signal processing,” in Proc. Audio Eng. Soc. 2018 Int. Conf.
+# Spatial Reproduction, Tokyo, Japan, 2018.
+
+# We kindly ask to acknowledge the use of this software in publications or software
+# by citing this paper.
+
+# The code is provided under the ISC (Internet Systems Consortium) license
+# https://www.isc.org/downloads/software-support-policy/isc-license/ :
+
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS
+# OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+File telemetry.py
+
+Lock-free shared-memory ring buffer for publishing renderer telemetry (gain
+matrices, object positions and solver status) to a separate monitoring process.
+
+There is exactly one writer (the renderer) and any number of readers. The writer
+never blocks or waits: each slot is protected by a sequence counter that is odd
+while the slot is written (a 'seqlock'). Readers copy a slot and discard it if the
+counter changed in between or if the slot has been overwritten, i.e., slow readers
+lose data but never affect the writer.
+
+This module depends on NumPy only, so monitoring tools do not need VISR.
+"""
+
+from multiprocessing import shared_memory
+import atexit
+import os
+import time
+
+import numpy as np
+
+telemetryMagic = 0x56545232 # 'VTR2'
+
+headerType = np.dtype( [ ('magic', np.uint32), ('numSlots', np.uint32),
+                         ('numLoudspeakers', np.uint32), ('numObjects', np.uint32),
+                         ('writerPid', np.uint32), ('reserved', np.uint32),
+                         ('writeCount', np.uint64) ] )
+
+def slotType( numLoudspeakers, numObjects ):
+    """
+    Data type of a ring buffer slot for the given matrix dimensions.
+    """
+    return np.dtype( [ ('sequence', np.uint64),
+                       ('block', np.uint64),
+                       ('timestamp', np.float64),
+                       ('gains', np.float32, (numLoudspeakers, numObjects)),
+                       ('positions', np.float32, (numObjects, 3)),
+                       ('status', np.int32, (numObjects,)) ] )
+
+# Names of the blocks created by the writers of this process.
+_writerBlocks = set()
+
+def attachSharedMemory( name ):
+    """
+    Attach to an existing shared memory block without taking ownership.
+
+    Before Python 3.13, attaching registers the block with the resource tracker of
+    the attaching process, which removes it when that process exits, i.e., a
+    monitor would remove the buffer of a running renderer.
+    """
+    try:
+        return shared_memory.SharedMemory( name=name, create=False, track=False )
+    except TypeError: # No track argument before Python 3.13.
+        shm = shared_memory.SharedMemory( name=name, create=False )
+        # The tracker holds one registration per name, which belongs to the writer
+        # if the block was created by this process.
+        if (os.name == 'posix') and (name not in _writerBlocks):
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister( shm._name, 'shared_memory' )
+        return shm
+
+def processExists( pid ):
+    """
+    Whether a process with the given id is running. Always True except on POSIX
+    systems, where shared memory blocks can outlive their creator.
+    """
+    if os.name != 'posix':
+        return True
+    try:
+        os.kill( pid, 0 )
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class TelemetryWriter:
+    """
+    Writing end of the telemetry ring buffer. Creates the shared memory block.
+
+    The block is removed by close(), which is also registered as an exit handler,
+    so it is removed on a regular interpreter exit. A block left over by a crashed
+    writer of the same name is replaced, while a block whose writer is still running
+    raises FileExistsError.
+    """
+    def __init__( self, name, numLoudspeakers, numObjects, numSlots = 64 ):
+        """
+        Constructor.
+
+        Parameters
+        ----------
+        name: string
+            Name of the shared memory block, used by the readers to attach.
+        numLoudspeakers: int
+            Number of rows of the gain matrix.
+        numObjects: int
+            Number of objects (columns of the gain matrix).
+        numSlots: int
+            Capacity of the ring buffer.
+        """
+        sType = slotType( numLoudspeakers, numObjects )
+        size = headerType.itemsize + numSlots*sType.itemsize
+        try:
+            self.shm = shared_memory.SharedMemory( name=name, create=True, size=size )
+        except FileExistsError:
+            existing = attachSharedMemory( name )
+            writerPid = None
+            if existing.size >= headerType.itemsize:
+                header = np.ndarray( (), dtype=headerType, buffer=existing.buf )
+                if header['magic'] == telemetryMagic:
+                    writerPid = int( header['writerPid'] )
+                del header
+            existing.close()
+            if (writerPid is not None) and processExists( writerPid ):
+                raise FileExistsError( "TelemetryWriter: '%s' is in use by the running process %d."
+                                      % (name, writerPid) )
+            # Left over from a writer that did not exit regularly: remove it and start afresh,
+            # readers attached to the old block keep their (stale) mapping.
+            # A tracked handle, so the removal is not reported to the resource tracker twice.
+            stale = shared_memory.SharedMemory( name=name, create=False )
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory( name=name, create=True, size=size )
+        self.header = np.ndarray( (), dtype=headerType, buffer=self.shm.buf )
+        self.slots = np.ndarray( (numSlots,), dtype=sType, buffer=self.shm.buf,
+                                offset=headerType.itemsize )
+        self.slots['sequence'] = 0
+        self.header['numSlots'] = numSlots
+        self.header['numLoudspeakers'] = numLoudspeakers
+        self.header['numObjects'] = numObjects
+        self.header['writerPid'] = os.getpid()
+        self.name = name
+        _writerBlocks.add( name )
+        self.header['writeCount'] = 0
+        self.header['magic'] = telemetryMagic # Written last, marks the buffer as initialised.
+        self.numSlots = numSlots
+        self.writeCount = 0
+        atexit.register( self.close )
+
+    def publish( self, block, gains, positions, status ):
+        """
+        Write a new record. Never blocks.
+
+        Parameters
+        ----------
+        block: int
+            Block counter of the renderer.
+        gains: array-like
+            Gain matrix, dimension #loudspeakers x #objects.
+        positions: array-like
+            Object positions (cartesian), dimension #objects x 3. NaN for inactive objects.
+        status: array-like
+            Integer status for each object, e.g., the solver status.
+        """
+        slot = self.slots[self.writeCount % self.numSlots]
+        sequence = 2*self.writeCount + 1
+        slot['sequence'] = sequence # Odd: write in progress
+        slot['block'] = block
+        slot['timestamp'] = time.time()
+        slot['gains'] = gains
+        slot['positions'] = positions
+        slot['status'] = status
+        slot['sequence'] = sequence + 1
+        self.writeCount += 1
+        self.header['writeCount'] = self.writeCount
+
+    def close( self ):
+        """
+        Release and remove the shared memory block. Further calls have no effect.
+        """
+        if self.shm is None:
+            return
+        atexit.unregister( self.close )
+        _writerBlocks.discard( self.name )
+        del self.header, self.slots
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            # Already removed, e.g., by another process. unlink() raised before removing
+            # the registration with the resource tracker.
+            if os.name == 'posix':
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister( self.shm._name, 'shared_memory' )
+        self.shm = None
+
+class TelemetryReader:
+    """
+    Reading end of the telemetry ring buffer, attaches to an existing shared memory block.
+    """
+    def __init__( self, name ):
+        self.shm = attachSharedMemory( name )
+        if self.shm.size < headerType.itemsize:
+            raise ValueError( "TelemetryReader: '%s' is not an initialised telemetry buffer." % name )
+        self.header = np.ndarray( (), dtype=headerType, buffer=self.shm.buf )
+        if self.header['magic'] != telemetryMagic:
+            raise ValueError( "TelemetryReader: '%s' is not an initialised telemetry buffer." % name )
+        self.numSlots = int( self.header['numSlots'] )
+        self.numLoudspeakers = int( self.header['numLoudspeakers'] )
+        self.numObjects = int( self.header['numObjects'] )
+        self.slots = np.ndarray( (self.numSlots,), buffer=self.shm.buf, offset=headerType.itemsize,
+                                dtype=slotType( self.numLoudspeakers, self.numObjects ) )
+        self.readCount = int( self.header['writeCount'] )
+        # Number of records that were overwritten before they could be read.
+        self.lostRecords = 0
+
+    def readRecord( self, index ):
+        """
+        Read the record with the given write index.
+
+        Returns
+        -------
+        A copy of the record (numpy.void with the fields block, timestamp, gains,
+        positions and status), or None if the record is being written or has been overwritten.
+        """
+        slot = self.slots[index % self.numSlots]
+        expected = 2*index + 2
+        if slot['sequence'] != expected:
+            return None
+        record = slot.copy()
+        if slot['sequence'] != expected:
+            return None
+        return record
+
+    def latest( self ):
+        """
+        Return the most recent complete record, or None if there is none.
+        """
+        writeCount = int( self.header['writeCount'] )
+        for index in range( writeCount-1, max( writeCount-self.numSlots, 0 )-1, -1 ):
+            record = self.readRecord( index )
+            if record is not None:
+                return record
+        return None
+
+    def readNew( self ):
+        """
+        Return the list of records written since the last call.
+        """
+        writeCount = int( self.header['writeCount'] )
+        if writeCount - self.readCount > self.numSlots:
+            self.lostRecords += writeCount - self.readCount - self.numSlots
+            self.readCount = writeCount - self.numSlots
+        records = []
+        for index in range( self.readCount, writeCount ):
+            record = self.readRecord( index )
+            if record is None:
+                self.lostRecords += 1
+            else:
+                records.append( record )
+        self.readCount = writeCount
+        return records
+
+    def close( self ):
+        del self.header, self.slots
+        self.shm.close()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Andreas Franck <a.franck@soton.ac.uk>
+# Copyright (C) 2018 University of Southampton
+
+# Code accompanying the paper:
+
+# Andreas Franck and Filippo Maria Fazi, “VISR – A versatile open software
+# framework for audio signal processing,” in Proc. Audio Eng. Soc. 2018 Int. Conf.
+# Spatial Reproduction, Tokyo, Japan, 2018.
+
+# We kindly ask to acknowledge the use of this software in publications or software
+# by citing this paper.
+
+# The code is provided under the ISC (Internet Systems Consortium) license
+# https://www.isc.org/downloads/software-support-policy/isc-license/ :
+
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS
+# OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+File telemetry_tap.py
+
+VISR atomic component that publishes the gain matrix, the object positions and
+optionally the solver status of a renderer to a shared-memory telemetry ring
+buffer (see telemetry.py).
+"""
+
+import numpy as np
+
+import visr
+import pml
+import objectmodel
+
+from telemetry import TelemetryWriter
+from gain_matrix import objectChannel
+
+class TelemetryTap( visr.AtomicComponent ):
+    """
+    Component that taps the parameter connections of a renderer and publishes them
+    for live inspection.
+
+    The component only reads its inputs and writes a fixed-size record into shared
+    memory, so its cost per published block is bounded and independent of the
+    readers. The renderers create it only if telemetry is enabled.
+    """
+    def __init__( self, context, name, parent, *,
+                 numberOfObjects, numberOfLoudspeakers, telemetryName,
+                 statusInput = False, numSlots = 64, decimation = 1 ):
+        """
+        Constructor.
+
+        Parameters
+        ----------
+        context: visr.SignalFlowContext
+            A context object containing the sampling frequency and the block size.
+        name: string
+            Name of the component to be identified within a containing component.
+        parent: visr.CompositeComponent
+            A containing component, or None if this is the top-level component.
+        numberOfObjects: int
+            Number of columns of the gain matrix.
+        numberOfLoudspeakers: int
+            Number of rows of the gain matrix.
+        telemetryName: string
+            Name of the shared memory block.
+        statusInput: bool
+            Whether to create a parameter input "status" (pml.VectorParameterFloat) for the
+            per-object solver status.
+        numSlots: int
+            Capacity of the ring buffer.
+        decimation: int
+            Publish only every decimation-th block.
+        """
+        super().__init__( context, name, parent )
+        self.gainIn = visr.ParameterInput( "gains", self,
+            pml.MatrixParameterFloat.staticType,
+            pml.SharedDataProtocol.staticType,
+            pml.MatrixParameterConfig( numberOfLoudspeakers, numberOfObjects ) )
+        self.objectIn = visr.ParameterInput( "objects", self,
+            pml.ObjectVector.staticType,
+            pml.DoubleBufferingProtocol.staticType,
+            pml.EmptyParameterConfig() )
+        if statusInput:
+            self.statusIn = visr.ParameterInput( "status", self,
+                pml.VectorParameterFloat.staticType,
+                pml.SharedDataProtocol.staticType,
+                pml.VectorParameterConfig( numberOfObjects ) )
+        else:
+            self.statusIn = None
+        self.writer = TelemetryWriter( telemetryName, numberOfLoudspeakers, numberOfObjects, numSlots )
+        self.positions = np.full( (numberOfObjects, 3), np.nan, dtype=np.float32 )
+        self.status = np.zeros( numberOfObjects, dtype=np.int32 )
+        self.decimation = max( 1, decimation )
+        self.blockCounter = 0
+
+    def process( self ):
+        """
+        Process function, executed for each block.
+        """
+        if self.objectIn.protocol.changed():
+            self.positions[...] = np.nan
+            for obj in self.objectIn.protocol.data():
+                if not isinstance( obj, objectmodel.PointSource ):
+                    continue
+                # Same column as in the gain matrix and the status vector.
+                channel = objectChannel( obj )
+                if 0 <= channel < self.positions.shape[0]:
+                    self.positions[channel,:] = obj.position
+            self.objectIn.protocol.resetChanged()
+        if self.blockCounter % self.decimation == 0:
+            if self.statusIn is not None:
+                self.status[:] = np.asarray( self.statusIn.protocol.data() )
+            self.writer.publish( self.blockCounter, np.asarray( self.gainIn.protocol.data() ),
+                                self.positions, self.status )
+        self.blockCounter += 1
+
+    def close( self ):
+        """
+        Remove the shared memory block. Otherwise, it is removed when the interpreter exits.
+        """
+        self.writer.close()
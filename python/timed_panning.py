@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Andreas Franck <a.franck@soton.ac.uk>
+# Copyright (C) 2018 University of Southampton
+
+# Code accompanying the paper:
+
+# Andreas Franck and Filippo Maria Fazi, “VISR – A versatile open software
+# framework for audio signal processing,” in Proc. Audio Eng. Soc. 2018 Int. Conf.
+# Spatial Reproduction, Tokyo, Japan, 2018.
+
+# We kindly ask to acknowledge the use of this software in publications or software
+# by citing this paper.
+
+# The code is provided under the ISC (Internet Systems Consortium) license
+# https://www.isc.org/downloads/software-support-policy/isc-license/ :
+
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS
+# OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+File timed_panning.py
+
+Panning with sample-accurate, timestamped object metadata.
+
+Object updates are received as JSON messages that carry the time at which they
+take effect, either as an absolute sample index of the renderer's sample clock
+or as an offset into the next processed block:
+
+  { "sample": 96000,           # or "offset": 128
+    "objects": [ { "id": 0, "az": 30.0, "el": 0.0, "level": 1.0 } ] }
+
+Angles are given in degree (alternatively, "position": [x, y, z]). Objects not
+contained in a message keep their state. The audio block is split at the update
+times, so the timing accuracy does not depend on the block size. Updates that
+arrive too late are applied at the start of the block.
+"""
+
+import heapq
+import json
+
+import numpy as np
+
+import visr
+import pml
+import rcl
+
+from helper.baseTrigFunctions import deg2rad, sph2cart
+
+def parseTimedUpdate( message ):
+    """
+    Parse a timestamped update message.
+
+    Returns
+    -------
+    sample: int or None
+        Absolute sample time, None if the message contains an offset.
+    offset: int
+        Offset into the next block (0 if the message contains an absolute time).
+    objects: list of (objectId, position or None, level or None) tuples
+
+    Raises ValueError, KeyError, IndexError, TypeError or AttributeError for malformed messages.
+    """
+    data = json.loads( message )
+    objects = []
+    for desc in data.get( 'objects', [] ):
+        if 'position' in desc:
+            position = np.asarray( desc['position'], dtype=np.float64 )
+            if position.shape != (3,):
+                raise ValueError( "parseTimedUpdate: A position must have three elements." )
+        elif 'az' in desc or 'el' in desc:
+            position = sph2cart( deg2rad( float( desc.get( 'az', 0.0 ) ) ),
+                                deg2rad( float( desc.get( 'el', 0.0 ) ) ),
+                                float( desc.get( 'radius', 1.0 ) ) )
+        else:
+            position = None
+        level = float( desc['level'] ) if 'level' in desc else None
+        objects.append( (int( desc['id'] ), position, level) )
+    if 'sample' in data:
+        return int( data['sample'] ), 0, objects
+    return None, int( data.get( 'offset', 0 ) ), objects
+
+class TimedPanningMatrix( visr.AtomicComponent ):
+    """
+    Combined panning gain calculation and gain matrix with sub-block updates.
+
+    The object index is the audio input channel. Gains are computed with a
+    pluggable gain function for all objects changed by an update at once. Between
+    two updates, the gains are constant; each gain change is interpolated over
+    rampLength samples.
+    """
+    def __init__( self, context, name, parent, numberOfObjects, numberOfLoudspeakers,
+                 gainFunction, rampLength = 64 ):
+        """
+        Constructor.
+
+        Parameters
+        ----------
+        context: visr.SignalFlowContext
+        name: string
+        parent: visr.CompositeComponent or None
+        numberOfObjects: int
+            Number of audio inputs, i.e., the maximum object id plus one.
+        numberOfLoudspeakers: int
+            Number of audio outputs.
+        gainFunction: callable
+            Function that takes an array of unit direction vectors (#directions x 3) and
+            returns the gains (#directions x #loudspeakers), e.g.,
+            VbapCalculator.calculateGains or GainTable.lookup.
+        rampLength: int
+            Length of the linear crossfade for a gain change in samples (0: switch immediately).
+        """
+        super().__init__( context, name, parent )
+        self.audioIn = visr.AudioInputFloat( "in", self, numberOfObjects )
+        self.audioOut = visr.AudioOutputFloat( "out", self, numberOfLoudspeakers )
+        self.datagramIn = visr.ParameterInput( "datagrams", self,
+                                              pml.StringParameter.staticType,
+                                              pml.MessageQueueProtocol.staticType,
+                                              pml.EmptyParameterConfig() )
+        self.blockSize = context.period
+        self.gainFunction = gainFunction
+        self.rampLength = rampLength
+        self.ramp = np.arange( 1, rampLength+1, dtype=np.float32 ) / max( rampLength, 1 )
+        self.positions = np.tile( np.array( [1.0, 0.0, 0.0] ), (numberOfObjects, 1) )
+        self.levels = np.zeros( numberOfObjects )
+        self.panningGains = np.zeros( (numberOfLoudspeakers, numberOfObjects), dtype=np.float32 )
+        self.currentGains = np.zeros( (numberOfLoudspeakers, numberOfObjects), dtype=np.float32 )
+        # Pending updates as a heap of (sample time, sequence number, objects).
+        self.pending = []
+        self.sequence = 0
+        self.sampleCounter = 0
+        self.lateUpdates = 0
+        # Number of malformed messages, which are discarded.
+        self.parseErrors = 0
+
+    def receiveMessages( self ):
+        protocol = self.datagramIn.protocol
+        while not protocol.empty():
+            try:
+                sample, offset, objects = parseTimedUpdate( protocol.front().str() )
+            except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+                self.parseErrors += 1
+                continue
+            finally:
+                protocol.pop()
+            if sample is None:
+                sample = self.sampleCounter + offset
+            heapq.heappush( self.pending, (sample, self.sequence, objects) )
+            self.sequence += 1
+
+    def applyUpdate( self, objects ):
+        """
+        Update the object states and recompute the gains of the changed objects.
+        """
+        changed = []
+        for objectId, position, level in objects:
+            if not (0 <= objectId < self.levels.size):
+                continue
+            if position is not None:
+                self.positions[objectId] = position
+            if level is not None:
+                self.levels[objectId] = level
+            changed.append( objectId )
+        if changed:
+            changed = np.array( changed )
+            gains = np.asarray( self.gainFunction( self.positions[changed] ) )
+            self.panningGains[:,changed] = (gains * self.levels[changed,np.newaxis]).T
+
+    def process( self ):
+        self.receiveMessages()
+        ins = self.audioIn.data()
+        out = np.empty( (self.panningGains.shape[0], self.blockSize), dtype=np.float32 )
+        blockEnd = self.sampleCounter + self.blockSize
+        segmentStart = 0
+        while segmentStart < self.blockSize:
+            # Apply all updates due at the current segment start.
+            while self.pending and self.pending[0][0] <= self.sampleCounter + segmentStart:
+                sample, _, objects = heapq.heappop( self.pending )
+                if sample < self.sampleCounter:
+                    self.lateUpdates += 1
+                self.applyUpdate( objects )
+            segmentEnd = min( self.pending[0][0], blockEnd ) - self.sampleCounter \
+              if self.pending else self.blockSize
+            self.processSegment( ins, out, segmentStart, segmentEnd )
+            segmentStart = segmentEnd
+        self.sampleCounter = blockEnd
+        self.audioOut.set( out )
+
+    def processSegment( self, ins, out, start, end ):
+        """
+        Mix the samples start...end-1, crossfading to the current panning gains.
+        """
+        newGains = self.panningGains
+        if np.array_equal( newGains, self.currentGains ) or self.rampLength == 0:
+            out[:,start:end] = newGains @ ins[:,start:end]
+        else:
+            rampEnd = min( end, start + self.rampLength )
+            ramp = self.ramp[:rampEnd-start]
+            out[:,start:rampEnd] = (newGains @ ins[:,start:rampEnd]) * ramp \
+              + (self.currentGains @ ins[:,start:rampEnd]) * (1.0 - ramp)
+            out[:,rampEnd:end] = newGains @ ins[:,rampEnd:end]
+            if rampEnd < start + self.rampLength:
+                # Segment shorter than the ramp: continue from the intermediate gains.
+                alpha = ramp[-1]
+                self.currentGains = (alpha * newGains + (1.0 - alpha) * self.currentGains).astype( np.float32 )
+                return
+        self.currentGains = newGains.copy()
+
+class TimedVbapRenderer( visr.CompositeComponent ):
+    """
+    Renderer receiving timestamped object updates via UDP (or a parameter input),
+    with VBAP gains (or another gain function) applied sample-accurately.
+    """
+    def __init__( self, context, name, parent, numberOfObjects, lspConfig, nwPort = None,
+                 gainFunction = None, rampLength = 64 ):
+        """
+        Constructor.
+
+        Parameters
+        ----------
+        numberOfObjects: int
+            The maximum number of objects.
+        lspConfig: panning.LoudspeakerArray
+        nwPort: int or None
+            UDP port for the update messages. If None, the messages are received through
+            the parameter input "datagrams", e.g., for offline rendering with
+            metadata_replay.replayOffline().
+        gainFunction: callable or None
+            Gain function, see TimedPanningMatrix. Default: vectorised VBAP of the layout.
+        rampLength: int
+            Crossfade length of gain changes in samples.
+        """
+        super().__init__( context, name, parent )
+        numLsp = lspConfig.numberOfRegularLoudspeakers
+        if gainFunction is None:
+            from vbap_gains import VbapCalculator
+            gainFunction = VbapCalculator.fromLoudspeakerArray( lspConfig ).calculateGains
+        self.audioIn = visr.AudioInputFloat( "in", self, numberOfObjects )
+        self.audioOut = visr.AudioOutputFloat( "out", self, numLsp )
+        self.matrix = TimedPanningMatrix( context, "TimedPanningMatrix", self, numberOfObjects,
+                                         numLsp, gainFunction, rampLength )
+        if nwPort is None:
+            self.receiver = None
+            self.datagramIn = visr.ParameterInput( "datagrams", self,
+                                                  pml.StringParameter.staticType,
+                                                  pml.MessageQueueProtocol.staticType,
+                                                  pml.EmptyParameterConfig() )
+            self.parameterConnection( self.datagramIn, self.matrix.parameterPort("datagrams") )
+        else:
+            self.receiver = rcl.UdpReceiver( context, "NetworkReceiver", self, port=nwPort )
+            self.parameterConnection( self.receiver.parameterPort("messageOutput"),
+                                     self.matrix.parameterPort("datagrams") )
+        self.audioConnection( self.audioIn, self.matrix.audioPort("in") )
+        self.audioConnection( self.matrix.audioPort("out"), self.audioOut )
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Andreas Franck <a.franck@soton.ac.uk>
+# Copyright (C) 2018 University of Southampton
+
+# Code accompanying the paper:
+
+# Andreas Franck and Filippo Maria Fazi, “VISR – A versatile open software
+# framework for audio signal processing,” in Proc. Audio Eng. Soc. 2018 Int. Conf.
+# Spatial Reproduction, Tokyo, Japan, 2018.
+
+# We kindly ask to acknowledge the use of this software in publications or software
+# by citing this paper.
+
+# The code is provided under the ISC (Internet Systems Consortium) license
+# https://www.isc.org/downloads/software-support-policy/isc-license/ :
+
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS
+# OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+Precomputed object trajectories for simulations and offline rendering.
+
+The positions of a whole trajectory are computed in a single vectorised
+operation, and the objectmodel.PointSource objects are created before the
+processing loop, so the loop only passes precomputed objects to the renderers.
+"""
+
+import numpy as np
+
+import objectmodel as om
+
+from helper.baseTrigFunctions import sph2cart
+
+def sphericalTrajectory( az, el, r = 1.0, out = None ):
+    """
+    Cartesian positions of a trajectory given in spherical coordinates.
+
+    Parameters
+    ----------
+    az, el, r: array-like
+        Azimuth and elevation (radians) and radius per step, broadcast against each
+        other. Add a trailing dimension for multiple objects, e.g., az of shape
+        (#steps, #objects).
+    out: np.ndarray, optional
+        Preallocated output array of shape broadcastShape + (3,).
+
+    Returns
+    -------
+    np.ndarray of shape broadcastShape + (3,)
+    """
+    return sph2cart( np.asarray( az, dtype=np.float64 ), el, r, out=out )
+
+def circularTrajectory( numSteps, el = 0.0, r = 1.0, startAzimuth = 0.0, endAzimuth = 2*np.pi ):
+    """
+    Positions on a circle of constant elevation, with azimuth values evenly spaced
+    from startAzimuth to endAzimuth (both inclusive, in radians).
+
+    Returns
+    -------
+    np.ndarray of shape (numSteps, 3)
+    """
+    return sphericalTrajectory( np.linspace( startAzimuth, endAzimuth, numSteps ), el, r )
+
+def pointSourceSequence( positions, objectIds = 0, channels = None, levels = 1.0 ):
+    """
+    Create the point source objects for all steps of a trajectory.
+
+    Parameters
+    ----------
+    positions: np.ndarray
+        Positions, shape (#steps, 3) for a single object or (#steps, #objects, 3).
+    objectIds: int or sequence of int
+        Object ids, one per object.
+    channels: int or sequence of int, optional
+        Audio channel indices, one per object. Default: the object ids.
+    levels: float or array-like
+        Object levels, broadcast to (#steps, #objects).
+
+    Returns
+    -------
+    list with one entry per step, each a list of objectmodel.PointSource objects
+    that can be passed to pml.ObjectVector.set().
+    """
+    positions = np.asarray( positions, dtype=np.float64 )
+    if positions.ndim == 2:
+        positions = positions[:,np.newaxis,:]
+    numSteps, numObjects = positions.shape[:2]
+    objectIds = np.broadcast_to( objectIds, (numObjects,) )
+    channels = objectIds if channels is None else np.broadcast_to( channels, (numObjects,) )
+    levels = np.broadcast_to( levels, (numSteps, numObjects) )
+    # Convert to Python types once, the objectmodel setters are called per object.
+    positionList = positions.tolist()
+    levelList = levels.tolist()
+    channelLists = [ [int(ch)] for ch in channels ]
+    sequence = []
+    for stepIdx in range( numSteps ):
+        scene = []
+        for objIdx in range( numObjects ):
+            ps = om.PointSource( int( objectIds[objIdx] ) )
+            ps.position = positionList[stepIdx][objIdx]
+            ps.channels = channelLists[objIdx]
+            ps.level = levelList[stepIdx][objIdx]
+            scene.append( ps )
+        sequence.append( scene )
+    return sequence
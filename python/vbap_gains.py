@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Andreas Franck <a.franck@soton.ac.uk>
+# Copyright (C) 2018 University of Southampton
+
+# Code accompanying the paper:
+
+# Andreas Franck and Filippo Maria Fazi, “VISR – A versatile open software
+# framework for audio signal processing,” in Proc. Audio Eng. Soc. 2018 Int. Conf.
+# Spatial Reproduction, Tokyo, Japan, 2018.
+
+# We kindly ask to acknowledge the use of this software in publications or software
+# by citing this paper.
+
+# The code is provided under the ISC (Internet Systems Consortium) license
+# https://www.isc.org/downloads/software-support-policy/isc-license/ :
+
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS
+# OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+File vbap_gains.py
+
+Vectorised NumPy implementation of vector base amplitude panning (VBAP).
+
+Unlike rcl.PanningCalculator, this is not a VISR component but a plain Python
+class that computes gains for arbitrary numbers of directions at once. It is used
+wherever gains are needed outside the signal flow or as a cheap substitute
+for the VBAP L2 optimisation, e.g., as a fallback if the solver fails.
+
+The loudspeaker triplets are computed as the faces of the convex hull of the
+loudspeaker directions (including virtual loudspeakers), so the triplets
+defined in the configuration file are not used. For planar layouts, the
+loudspeaker pairs are the neighbours in azimuth.
+"""
+
+import numpy as np
+
+from helper.vectorFunctions import normalise
+
+def convexHullTriplets( L, tolerance = 1e-6 ):
+    """
+    Compute the triangular faces of the convex hull of a set of unit vectors.
+
+    Parameters
+    ----------
+    L: np.ndarray
+        Unit vectors, dimension #loudspeakers x 3.
+    tolerance: float
+        Tolerance for points lying on the plane of a face.
+
+    Returns
+    -------
+    np.ndarray, integer indices of the triplets, dimension #triplets x 3.
+
+    If four or more points lie in the plane of a face (e.g., a ring of loudspeakers
+    at a common elevation), this face is split into a fan of non-overlapping
+    triangles, so that every direction is enclosed by exactly one triplet.
+
+    The hull is computed with scipy.spatial.ConvexHull (Qhull), so the cost grows
+    with N log N in the number of points instead of enumerating all triples.
+    """
+    if (L.shape[0] < 4) or (np.linalg.matrix_rank( L[1:] - L[0], tol=tolerance ) < 3):
+        # Planar point sets have no closed hull.
+        return np.zeros( (0, 3), dtype=int )
+    # Deferred import, scipy.spatial takes a noticeable time to load.
+    from scipy.spatial import ConvexHull
+    hull = ConvexHull( L )
+    normals, offsets = hull.equations[:,:3], hull.equations[:,3]
+    # Facets whose plane contains the origin (e.g., a horizontal ring without loudspeakers
+    # below) do not form a valid loudspeaker base.
+    facets = np.abs( offsets ) > tolerance
+    # Each face plane once, represented by the points lying in it. Qhull splits
+    # coplanar faces into triangles of its own choice, which are replaced below.
+    dist = normals[facets] @ L.T + offsets[facets,np.newaxis] # #facets x #loudspeakers
+    planes = np.unique( np.abs( dist ) <= tolerance, axis=0 )
+    result = []
+    for onPlane in planes:
+        points = np.flatnonzero( onPlane )
+        if len( points ) > 3:
+            # The points lie on a circle (sphere and plane), i.e., they are the vertices
+            # of a convex polygon. Sort them by angle around the centroid.
+            centroid = np.mean( L[points], axis=0 )
+            normal = normalise( centroid, norm=2, axis=-1 )
+            u = normalise( L[points[0]] - centroid, norm=2, axis=-1 )
+            v = np.cross( normal, u )
+            rel = L[points] - centroid
+            points = points[np.argsort( np.arctan2( rel @ v, rel @ u ) )]
+        result.extend( [ (points[0], points[k], points[k+1]) for k in range( 1, len( points ) - 1 ) ] )
+    return np.array( result, dtype=int ).reshape( -1, 3 )
+
+class VbapCalculator:
+    """
+    Vectorised VBAP gain calculation for 3D and planar loudspeaker layouts.
+    """
+    def __init__( self, positions, numberOfRegularLoudspeakers = None, *, planarTolerance = 1e-3 ):
+        """
+        Constructor.
+
+        Parameters
+        ----------
+        positions: np.ndarray
+            Loudspeaker positions (cartesian), dimension #loudspeakers x 3, regular
+            loudspeakers first followed by virtual loudspeakers.
+        numberOfRegularLoudspeakers: int or None
+            Number of regular loudspeakers, i.e., the number of returned gains.
+            None means that all loudspeakers are regular.
+        planarTolerance: float
+            Maximum absolute z component of the normalised positions for treating the
+            layout as planar (2D).
+        """
+        self.L = normalise( np.asarray( positions, dtype=np.float64 ), norm=2, axis=-1 )
+        self.numberOfLoudspeakers = self.L.shape[0]
+        self.numberOfRegularLoudspeakers = self.numberOfLoudspeakers \
+          if numberOfRegularLoudspeakers is None else numberOfRegularLoudspeakers
+        self.is2D = bool( np.max( np.abs( self.L[:,2] ) ) < planarTolerance )
+        if self.is2D:
+            azimuths = np.arctan2( self.L[:,1], self.L[:,0] )
+            order = np.argsort( azimuths )
+            self.groups = np.stack( (order, np.roll( order, -1 )), axis=-1 )
+            bases = self.L[self.groups][:,:,:2] # #pairs x 2 (loudspeakers) x 2 (x,y)
+        else:
+            self.groups = convexHullTriplets( self.L )
+            bases = self.L[self.groups]
+        # Inverse loudspeaker bases: gains = inv @ direction
+        self.inverses = np.linalg.inv( np.transpose( bases, (0,2,1) ) )
+
+    @classmethod
+    def fromLoudspeakerArray( cls, lspArray ):
+        """
+        Create a calculator from a panning.LoudspeakerArray object.
+        """
+        return cls( lspArray.positions(), lspArray.numberOfRegularLoudspeakers )
+
+    def enclosingGroups( self, directions ):
+        """
+        Indices of the loudspeaker groups (rows of self.groups) that enclose the given
+        directions, i.e., the groups selected by calculateGains().
+
+        Parameters
+        ----------
+        directions: np.ndarray
+            Source positions (cartesian), dimension #directions x 3.
+
+        Returns
+        -------
+        np.ndarray, integer, dimension #directions
+        """
+        directions = np.reshape( np.asarray( directions, dtype=np.float64 ), (-1,3) )
+        if self.is2D:
+            directions = directions[:,:2]
+        groupGains = np.einsum( 'gij,dj->gdi', self.inverses, directions )
+        return np.argmax( np.min( groupGains, axis=-1 ), axis=0 )
+
+    def calculateGains( self, directions, chunkSize = 4096 ):
+        """
+        Calculate the VBAP gains for a set of directions.
+
+        Parameters
+        ----------
+        directions: np.ndarray
+            Source positions (cartesian), dimension #directions x 3 or a single vector.
+            For planar layouts, the z component is ignored.
+        chunkSize: int
+            Number of directions processed at once, limits the temporary memory.
+
+        Returns
+        -------
+        np.ndarray, gains normalised to unit power (before discarding virtual
+        loudspeakers), dimension #directions x #regular loudspeakers, or a vector
+        if a single direction is passed.
+        """
+        directions = np.asarray( directions, dtype=np.float64 )
+        single = directions.ndim == 1
+        directions = np.reshape( directions, (-1,3) )
+        if self.is2D:
+            directions = directions[:,:2]
+        numDirs = directions.shape[0]
+        gains = np.zeros( (numDirs, self.numberOfLoudspeakers) )
+        for start in range( 0, numDirs, chunkSize ):
+            chunk = directions[start:start+chunkSize,:]
+            # Gains for all loudspeaker groups, dimension #groups x #directions x groupSize
+            groupGains = np.einsum( 'gij,dj->gdi', self.inverses, chunk )
+            minGains = np.min( groupGains, axis=-1 )
+            # Select the group with the largest minimum gain, i.e., the one that encloses
+            # the direction (all gains non-negative). This also yields the closest
+            # group for directions outside the loudspeaker coverage.
+            best = np.argmax( minGains, axis=0 )
+            bestGains = np.maximum( groupGains[best, np.arange( chunk.shape[0] ), :], 0.0 )
+            rows = np.arange( start, start+chunk.shape[0] )
+            np.add.at( gains, (rows[:,np.newaxis], self.groups[best]), bestGains )
+        norms = np.linalg.norm( gains, axis=-1, keepdims=True )
+        gains = gains / np.maximum( norms, np.finfo( np.float64 ).tiny )
+        gains = gains[:,:self.numberOfRegularLoudspeakers]
+        return gains[0] if single else gains
@@ -37,19 +37,344 @@ import visr
 import pml
 import objectmodel
 
+import hashlib
+import threading
+import time
+import weakref
+
 import numpy as np
-import cvxpy
 
-cvxpyMajorVersion = int(cvxpy.__version__.split('.')[0])
+from helper.vectorFunctions import normalise, angleDifference
+from vbap_gains import VbapCalculator
+from planar_panning import PlanarPanningCalculator, isPlanarLayout
+from gain_table import loadGainTable, CompressedGainTable
+from spread_kernels import SpreadKernelTable
+from event_log import NonBlockingEventLog
+from gain_matrix import objectChannel
+from load_supervisor import tierFull, tierApproximateGains, tierReducedUpdateRate
+
+# Values of the per-object solver status, e.g., published through the "status" output.
+# If the solver fails, the status denotes the fallback that provided the gains.
+solverStatusOptimal = 0
+solverStatusFallbackLastGood = 1
+solverStatusFallbackTable = 2
+solverStatusFallbackVbap = 3
+
+def importCvxpy():
+    """
+    Import the cvxpy module on first use.
+
+    cvxpy and its solver stack take a considerable time to load, so the import is
+    deferred until a VbapL2Panner is actually constructed. This keeps importing
+    this module (or the renderers that reference it) cheap.
+
+    Returns
+    -------
+    cvxpy: module
+        The cvxpy module.
+    majorVersion: int
+        The major version number of cvxpy, used to select version-specific syntax.
+    """
+    import cvxpy
+    return cvxpy, int(cvxpy.__version__.split('.')[0])
+
+class L2GainSolver:
+    """
+    Solver for the VBAP L2 panning problem of a loudspeaker layout.
+
+    The gains are computed in two steps: The first problem determines the minimum
+    L1 norm of non-negative gains that reproduce the source direction, the second
+    minimises the L2 norm of the gains under this L1 norm. This class contains
+    the optimisation problems only and can be used outside a signal flow.
+
+    The problems hold the current source direction as a parameter, so solve() is
+    serialised by a lock. This allows several panners to share one solver (see
+    sharedL2GainSolver()); the lock is uncontended if they run in the same thread.
+    """
+    def __init__( self, L, numberOfRegularLoudspeakers ):
+        """
+        Constructor.
+
+        Parameters
+        ----------
+        L: np.ndarray
+            Unit vectors of the loudspeaker directions, dimension 3 x #loudspeakers
+            (regular loudspeakers first, followed by virtual loudspeakers).
+        numberOfRegularLoudspeakers: int
+            Number of regular loudspeakers, i.e., the number of returned gains.
+        """
+        self.L = L
+        self.numSpeakers = numberOfRegularLoudspeakers
+        self.lock = threading.Lock()
+        cvxpy, cvxpyMajorVersion = importCvxpy()
+        # Keep references to the module to avoid import statements in solve().
+        self.cvxpy = cvxpy
+        self.cvxpyMajorVersion = cvxpyMajorVersion
+        # %% Set up the optimisation problems.
+        self.g = cvxpy.Variable( self.L.shape[1] )
+        self.b = cvxpy.Parameter( self.L.shape[0] )
+        self.prob1 = cvxpy.Problem( cvxpy.Minimize( cvxpy.norm( self.g, 1 ) ),
+          [ self.L @ self.g == self.b, self.g >= 0.0 ] )
+        # Note: incompatible syntax
+        if cvxpyMajorVersion < 1:
+            self.l1min = cvxpy.Parameter( sign='positive' )
+            self.prob2 = cvxpy.Problem( cvxpy.Minimize( cvxpy.norm( self.g, 2 ) ),
+                                       [ self.L @ self.g == self.b,
+                                        cvxpy.sum_entries( self.g ) == self.l1min,
+                                        self.g >= 0.0 ] )
+        else:
+            self.l1min = cvxpy.Parameter( nonneg = True )
+            self.prob2 = cvxpy.Problem( cvxpy.Minimize( cvxpy.norm( self.g, 2 ) ),
+                                       [ self.L @ self.g == self.b,
+                                        cvxpy.sum( self.g ) == self.l1min,
+                                        self.g >= 0.0 ] )
+
+    def solve( self, position ):
+        """
+        Compute the gains for a single source position.
+
+        Parameters
+        ----------
+        position: array-like
+            Cartesian source position (3-element vector).
+
+        Returns
+        -------
+        gains: np.ndarray or None
+            Normalised gains of the regular loudspeakers, None if the solver failed.
+        status: string
+            The solver status, or a description of the error.
+        """
+        with self.lock:
+            return self.solveUnlocked( position )
+
+    def solveUnlocked( self, position ):
+        """
+        solve() without acquiring the lock, for callers that own the solver exclusively.
+        """
+        cvxpy = self.cvxpy
+        try:
+            self.b.value = np.asarray( position, dtype=np.float64 )
+            self.prob1.solve(solver=cvxpy.ECOS)
+            if self.prob1.status != cvxpy.OPTIMAL:
+                return None, "L1 problem: %s" % self.prob1.status
+            self.l1min.value = self.prob1.value
+            self.prob2.solve(solver=cvxpy.ECOS)
+            if self.prob2.status != cvxpy.OPTIMAL:
+                return None, "L2 problem: %s" % self.prob2.status
+            # The indexing discards the gains of virtual loudspeakers.
+            # Note: CVXPY 0.4.11 returns a 2D array, CVXPY >= 1.0 a vector.
+            return normalise( np.ravel( self.g.value ) )[:self.numSpeakers], self.prob2.status
+        except Exception as ex:
+            return None, "exception: %s" % str(ex)
+
+    def calculateGains( self, directions ):
+        """
+        Compute the gains for a set of directions, e.g., for building gain tables.
+
+        Parameters
+        ----------
+        directions: np.ndarray
+            Source positions, dimension #directions x 3.
+
+        Returns
+        -------
+        np.ndarray, dimension #directions x #regular loudspeakers. Rows for which the
+        solver failed are NaN.
+        """
+        directions = np.reshape( directions, (-1,3) )
+        gains = np.full( (directions.shape[0], self.numSpeakers), np.nan )
+        for idx, direction in enumerate( directions ):
+            g, _ = self.solve( direction )
+            if g is not None:
+                gains[idx,:] = g
+        return gains
+
+    def warmUp( self ):
+        """
+        Solve once for the first loudspeaker direction, so that cvxpy canonicalises the
+        problems now rather than in the first call from the audio thread.
+        """
+        self.solve( self.L[:,0] )
+
+class LocalL2GainSolver:
+    """
+    Solver for the VBAP L2 panning problem restricted to the loudspeakers around the source direction.
+
+    The minimum-L1 solution consists of the loudspeakers on the face of the convex
+    hull of the loudspeaker directions that the source direction intersects. If
+    several loudspeakers lie in the plane of this face, the L2 stage selects among
+    them. So it suffices to solve the problem over the loudspeakers of the enclosing
+    VBAP triplet, all loudspeakers coplanar with it, and (as a safety margin) the
+    loudspeakers adjacent to the triplet. The candidate sets are precomputed for
+    all triplets, and one reduced problem per distinct set is created on first
+    use. The size of the reduced problems is independent of the number of
+    loudspeakers.
+
+    If a reduced problem fails, the full problem is solved instead (if a full solver
+    is provided). The reduction can be checked against the full problem with
+    verify_local_l2_solver.py.
+    """
+    def __init__( self, L, numberOfRegularLoudspeakers, fullSolver = None, planeTolerance = 1e-6 ):
+        """
+        Constructor.
+
+        Parameters
+        ----------
+        L: np.ndarray
+            Unit vectors of the loudspeaker directions, dimension 3 x #loudspeakers
+            (regular loudspeakers first, followed by virtual loudspeakers).
+        numberOfRegularLoudspeakers: int
+            Number of regular loudspeakers, i.e., the number of returned gains.
+        fullSolver: L2GainSolver or None
+            Solver for the full problem, used if a reduced problem fails.
+        planeTolerance: float
+            Tolerance for the normals and offsets of coplanar triplets.
+        """
+        self.L = L
+        self.numSpeakers = numberOfRegularLoudspeakers
+        self.lock = threading.Lock()
+        self.fullSolver = fullSolver
+        self.vbap = VbapCalculator( L.T, numberOfRegularLoudspeakers )
+        groups = self.vbap.groups
+        numGroups = groups.shape[0]
+        incidence = np.zeros( (numGroups, L.shape[1]), dtype=np.int64 )
+        incidence[np.arange( numGroups )[:,np.newaxis], groups] = 1
+        # Groups sharing at least one loudspeaker.
+        related = (incidence @ incidence.T) > 0
+        if not self.vbap.is2D:
+            bases = self.vbap.L[groups] # #groups x 3 (loudspeakers) x 3 (x,y,z)
+            normals = normalise( np.cross( bases[:,1,:] - bases[:,0,:], bases[:,2,:] - bases[:,0,:] ),
+                                norm=2, axis=-1 )
+            offsets = np.sum( normals * bases[:,0,:], axis=-1 )
+            # Orient the normals outwards.
+            normals *= np.sign( offsets )[:,np.newaxis]
+            offsets = np.abs( offsets )
+            related |= (np.abs( normals @ normals.T - 1.0 ) < planeTolerance) \
+              & (np.abs( offsets[:,np.newaxis] - offsets[np.newaxis,:] ) < planeTolerance)
+        candidates = (related.astype( np.int64 ) @ incidence) > 0
+        # Distinct candidate sets, and the set index of each group.
+        self.candidateSets, self.groupCandidateSet = np.unique( candidates, axis=0, return_inverse=True )
+        self.groupCandidateSet = np.ravel( self.groupCandidateSet )
+        self.subSolvers = [ None ] * self.candidateSets.shape[0]
+        self.localFailures = 0
+
+    def candidates( self, position ):
+        """
+        Indices of the loudspeakers of the reduced problem for a source position, and the
+        index of the candidate set.
+        """
+        setIndex = self.groupCandidateSet[ self.vbap.enclosingGroups( position )[0] ]
+        return np.flatnonzero( self.candidateSets[setIndex] ), setIndex
+
+    def subSolver( self, setIndex ):
+        """
+        Return the loudspeaker indices and the solver of a reduced problem, creating the solver on first use.
+        """
+        if self.subSolvers[setIndex] is None:
+            indices = np.flatnonzero( self.candidateSets[setIndex] )
+            # All loudspeakers of the subproblem are treated as regular, the virtual ones
+            # are discarded after mapping the gains to the full layout.
+            self.subSolvers[setIndex] = (indices, L2GainSolver( self.L[:,indices], len( indices ) ))
+        return self.subSolvers[setIndex]
 
-from helper.vectorFunctions import normalise
+    # Same interface as L2GainSolver.
+    solve = L2GainSolver.solve
+    calculateGains = L2GainSolver.calculateGains
+
+    def solveUnlocked( self, position ):
+        """
+        solve() without acquiring the lock, for callers that own the solver exclusively.
+        """
+        _, setIndex = self.candidates( position )
+        indices, solver = self.subSolver( setIndex )
+        g, status = solver.solveUnlocked( position )
+        if g is None:
+            self.localFailures += 1
+            if self.fullSolver is None:
+                return None, "reduced %s" % status
+            return self.fullSolver.solve( position )
+        gains = np.zeros( self.L.shape[1] )
+        gains[indices] = g
+        return gains[:self.numSpeakers], status
+
+    def warmUp( self ):
+        """
+        Create and canonicalise all reduced problems (and the full problem), so that this
+        does not happen in the audio thread. Takes a considerable time for large layouts.
+        """
+        groups = self.vbap.groups
+        for setIndex in range( len( self.subSolvers ) ):
+            group = groups[ np.flatnonzero( self.groupCandidateSet == setIndex )[0] ]
+            # A direction inside the group, within the loudspeaker plane for planar layouts.
+            self.solve( normalise( np.sum( self.L[:,group], axis=-1 ), norm=2, axis=0 ) )
+        if self.fullSolver is not None:
+            self.fullSolver.warmUp()
+
+def createL2GainSolver( L, numberOfRegularLoudspeakers, localNeighbourhood = False ):
+    """
+    Create a solver for the full L2 problem, or a LocalL2GainSolver (with a full solver
+    as fallback) if localNeighbourhood is True.
+    """
+    if localNeighbourhood:
+        return LocalL2GainSolver( L, numberOfRegularLoudspeakers,
+                                 fullSolver = L2GainSolver( L, numberOfRegularLoudspeakers ) )
+    return L2GainSolver( L, numberOfRegularLoudspeakers )
+
+# Solvers shared between panners, keyed by layoutKey(). Entries are removed when
+# no panner references the solver anymore.
+_solverRegistry = weakref.WeakValueDictionary()
+_solverRegistryLock = threading.Lock()
+
+def layoutKey( L, numberOfRegularLoudspeakers ):
+    """
+    Hash identifying the L2 problem of a layout.
+    """
+    L = np.ascontiguousarray( L, dtype=np.float64 )
+    digest = hashlib.sha1( L.tobytes() )
+    digest.update( repr( (L.shape, numberOfRegularLoudspeakers) ).encode() )
+    return digest.hexdigest()
+
+def sharedL2GainSolver( L, numberOfRegularLoudspeakers, localNeighbourhood = False ):
+    """
+    Return the L2GainSolver (or LocalL2GainSolver if localNeighbourhood is True) for a
+    layout, creating (and warming up) it on first use.
+
+    All callers with the same loudspeaker directions receive the same instance, so
+    the cvxpy problems are constructed and canonicalised once per layout.
+    """
+    key = layoutKey( L, numberOfRegularLoudspeakers ) + ("-local" if localNeighbourhood else "")
+    with _solverRegistryLock:
+        solver = _solverRegistry.get( key )
+        if solver is None:
+            solver = createL2GainSolver( L, numberOfRegularLoudspeakers, localNeighbourhood )
+            solver.warmUp()
+            _solverRegistry[key] = solver
+    return solver
 
 class VbapL2Panner( visr.AtomicComponent ):
     """
     Component to calculate panning gains from point sources in an object vector.
+
+    If the solver fails for an object, the gains are taken from the first
+    available entry of a fallback chain: the last successfully computed gains of
+    this object (if the object moved less than fallbackTolerance), the closest
+    entry of a precomputed gain table (if provided), or plain VBAP gains.
+    Failures are counted and logged from a background thread.
+
+    Extent objects (objectmodel.PointSourceExtent) are rendered with precomputed
+    spread kernels if these are provided, see spread_kernels.py.
+
+    For planar layouts, the optimisation problem reduces to pairwise panning,
+    so the gains of all objects are computed in closed form (see planar_panning.py)
+    and no solver is created.
     """
     def __init__( self, context, name, parent,
-                 numObjects, lspArray ):
+                 numObjects, lspArray, statusOutput = False,
+                 gainTable = None, fallbackTolerance = 5.0, failureLog = None,
+                 skipSilentObjects = False, spreadKernels = None, supervisor = None,
+                 updateDecimation = 4, sharedSolver = True, planarEngine = True,
+                 localNeighbourhood = False ):
         """
         Constructor.
 
@@ -66,9 +391,55 @@ class VbapL2Panner( visr.AtomicComponent ):
         parent: visr.Compositcomponent
             A containing component, or None if this is the top-level component.
         numObjects: int
-            The number of objects for which gains are computed.
+            The number of objects for which gains are computed. The gains of an object are
+            written to the column of its audio channel (as in rcl.PanningCalculator), so this
+            is the number of object audio channels.
         lspArray: panning.LoudspeakerArray
             Object containing the loudspeaker positions.
+        statusOutput: bool
+            Whether to create a parameter output "status" (pml.VectorParameterFloat) holding
+            the solver status of each object audio channel (one of the solverStatus* values).
+        gainTable: GainTable, AdaptiveGainTable, CompressedGainTable, string or None
+            Precomputed gains for the layout (or the name of a file created with the
+            save() method of these classes), used as a fallback if the solver fails.
+        fallbackTolerance: float
+            Maximum angle in degree between the current object position and the position
+            of the last successful solution for reusing the last gains as fallback.
+        failureLog: NonBlockingEventLog or None
+            Log for solver failures, e.g., shared between several panners. By default,
+            a log writing to the logger "vbap_l2_panner" is created.
+        skipSilentObjects: bool
+            Whether to skip the gain calculation for objects with level 0. Only valid if
+            the gain matrix mutes these objects, e.g., gain_matrix.ActiveObjectGainMatrix.
+        spreadKernels: SpreadKernelTable, string, True or None
+            Precomputed spread kernels for the layout (or the name of a file created with
+            SpreadKernelTable.save()) to render objectmodel.PointSourceExtent objects with
+            their width (in degree). True computes the kernels with the L2 solver during
+            construction, which takes a considerable time. None (default) renders extent
+            objects as point sources.
+        supervisor: load_supervisor.DegradationSupervisor or None
+            If given, the panner reports its processing time and reduces its cost according
+            to the quality tier. As the first component of the renderer, it closes the
+            previous block of the supervisor at the start of each block, so the block
+            includes the times reported by the components after it (e.g., the gain
+            matrix). From
+            tierApproximateGains on, the gains are taken from the gain table (or VBAP)
+            instead of the solver, from tierReducedUpdateRate on, object updates are
+            processed only every updateDecimation blocks.
+        updateDecimation: int
+            Update interval in blocks in the reduced update rate tier.
+        sharedSolver: bool
+            Whether to use the solver shared by all panners of the same layout (see
+            sharedL2GainSolver()). Per-object state such as the last good gains is kept
+            in the panner. False creates a private solver.
+        planarEngine: bool
+            Whether to use the closed-form PlanarPanningCalculator instead of the solver if the
+            layout is planar (dimension="2" in the configuration file, or all loudspeakers in
+            the horizontal plane).
+        localNeighbourhood: bool
+            Whether to solve the problem only over the loudspeakers around the enclosing VBAP
+            triplet (LocalL2GainSolver), which keeps the solve time roughly constant for
+            large layouts. Failed reduced problems are solved with the full problem.
         """
         super().__init__( context, name, parent ) # Call the base class contructor (mandatory)
         # Instantiate a parameter input for type "ObjectVector"
@@ -81,65 +452,161 @@ class VbapL2Panner( visr.AtomicComponent ):
         # We need the number of real loudspeakers because there might be imaginary/virtual
         # loudspeakers in the config.
         self.numSpeakers = lspArray.numberOfRegularLoudspeakers
+        self.numObjects = numObjects
         # Instantiate a parameter output for the gain matrices.
         self.gainOut = visr.ParameterOutput( "gains", self,
             pml.MatrixParameterFloat.staticType,
             pml.SharedDataProtocol.staticType,
             pml.MatrixParameterConfig( self.numSpeakers, numObjects ) )
-        # %% Set up the optimisation problems.
-        self.g = cvxpy.Variable( self.L.shape[1] )
-        self.b = cvxpy.Parameter( self.L.shape[0] )
-        self.prob1 = cvxpy.Problem( cvxpy.Minimize( cvxpy.norm( self.g, 1 ) ),
-          [ self.L @ self.g == self.b, self.g >= 0.0 ] )
-        # Note: incompatible syntax
-        if cvxpyMajorVersion < 1:
-            self.l1min = cvxpy.Parameter( sign='positive' )
-            self.prob2 = cvxpy.Problem( cvxpy.Minimize( cvxpy.norm( self.g, 2 ) ),
-                                       [ self.L @ self.g == self.b,
-                                        cvxpy.sum_entries( self.g ) == self.l1min,
-                                        self.g >= 0.0 ] )
+        self.status = np.full( numObjects, solverStatusOptimal, dtype=np.int32 )
+        if statusOutput:
+            self.statusOut = visr.ParameterOutput( "status", self,
+                pml.VectorParameterFloat.staticType,
+                pml.SharedDataProtocol.staticType,
+                pml.VectorParameterConfig( numObjects ) )
         else:
-            self.l1min = cvxpy.Parameter( nonneg = True )
-            self.prob2 = cvxpy.Problem( cvxpy.Minimize( cvxpy.norm( self.g, 2 ) ),
-                                       [ self.L @ self.g == self.b,
-                                        cvxpy.sum( self.g ) == self.l1min,
-                                        self.g >= 0.0 ] )
+            self.statusOut = None
+        # %% Set up the optimisation problems, unless the layout is planar.
+        if planarEngine and isPlanarLayout( lspArray ):
+            self.planar = PlanarPanningCalculator.fromLoudspeakerArray( lspArray )
+            self.solver = None
+        else:
+            self.planar = None
+            self.solver = sharedL2GainSolver( self.L, self.numSpeakers, localNeighbourhood ) if sharedSolver \
+              else createL2GainSolver( self.L, self.numSpeakers, localNeighbourhood )
+
+        # %% Fallback data
+        self.lastGoodGains = np.zeros( (numObjects, self.numSpeakers) )
+        # Direction of the last good solution, NaN if there is none.
+        self.lastGoodDirections = np.full( (numObjects, 3), np.nan )
+        self.fallbackTolerance = np.deg2rad( fallbackTolerance )
+        if isinstance( gainTable, str ):
+            gainTable = loadGainTable( gainTable )
+        if (gainTable is not None) and (gainTable.numberOfLoudspeakers != self.numSpeakers):
+            raise ValueError( "VbapL2Panner: The gain table does not match the loudspeaker layout." )
+        self.gainTable = gainTable
+        self.vbap = VbapCalculator.fromLoudspeakerArray( lspArray )
+        self.failureLog = NonBlockingEventLog( "vbap_l2_panner" ) if failureLog is None else failureLog
+        self.skipSilentObjects = skipSilentObjects
+        if isinstance( spreadKernels, str ):
+            spreadKernels = SpreadKernelTable.load( spreadKernels )
+        elif spreadKernels is True:
+            spreadKernels = SpreadKernelTable.build( self.solver.calculateGains if self.planar is None
+                                                    else self.planar.calculateGains )
+        if (spreadKernels is not None) and (spreadKernels.numberOfLoudspeakers != self.numSpeakers):
+            raise ValueError( "VbapL2Panner: The spread kernels do not match the loudspeaker layout." )
+        self.spreadKernels = spreadKernels
+        self.supervisor = supervisor
+        self.updateDecimation = updateDecimation
+        self.blockCounter = 0
+
+    def fallbackGains( self, channel, position ):
+        """
+        Return the gains of the first applicable fallback for an object (given by its audio channel)
+        and the corresponding status.
+        """
+        lastDirection = self.lastGoodDirections[channel,:]
+        if np.all( np.isfinite( lastDirection ) ) \
+          and angleDifference( lastDirection, position ) <= self.fallbackTolerance:
+            return self.lastGoodGains[channel,:], solverStatusFallbackLastGood
+        return self.approximateGains( position )
+
+    def approximateGains( self, position ):
+        """
+        Gains without solving the optimisation problem: from the gain table if available,
+        otherwise VBAP. Returns the gains and the corresponding status.
+        """
+        if self.gainTable is not None:
+            gains = self.gainTable.lookup( position )
+            if np.all( np.isfinite( gains ) ):
+                return gains, solverStatusFallbackTable
+        return self.vbap.calculateGains( position ), solverStatusFallbackVbap
+
+    def spreadWidth( self, obj ):
+        """
+        Spread width of an object in degree, 0 for point sources or if spread rendering is disabled.
+        """
+        if (self.spreadKernels is None) or not isinstance( obj, objectmodel.PointSourceExtent ):
+            return 0.0
+        return max( float( obj.width ), 0.0 )
 
     def process( self ):
         """
         Process funtcioy called in every iteration.
         """
-        # Check whether there is a new object vector input.
-        if self.objectIn.protocol.changed():
+        if self.supervisor is not None:
+            startTime = time.perf_counter()
+            if self.blockCounter > 0:
+                # All components have reported the previous block.
+                self.supervisor.endBlock()
+            tier = self.supervisor.tier
+        else:
+            tier = tierFull
+        self.blockCounter += 1
+        # Check whether there is a new object vector input. At reduced update rate, a change
+        # is kept pending until the next update block.
+        if self.objectIn.protocol.changed() and ((tier < tierReducedUpdateRate)
+                                                  or (self.blockCounter % self.updateDecimation == 0)):
             self.objectIn.protocol.resetChanged()
             # Access the new data.
             objVec = self.objectIn.protocol.data()
             # Retrieve the output parameter to be set.
             gains = np.asarray( self.gainOut.protocol.data() )
+            pointSources = [o for o in objVec
+             if isinstance( o, objectmodel.PointSource )
+             and not (self.skipSilentObjects and o.level == 0.0)]
+            tableIndices = None
+            if self.planar is not None:
+                # Closed-form gains for all objects at once.
+                planarGains = self.planar.calculateGains(
+                  np.reshape( [ np.asarray( o.position ) for o in pointSources ], (-1,3) ) )
+            elif (tier >= tierApproximateGains) and isinstance( self.gainTable, CompressedGainTable ):
+                # Sparse table lookup for all objects at once.
+                tableIndices, tableGains = self.gainTable.lookupSparse(
+                  np.reshape( [ np.asarray( o.position ) for o in pointSources ], (-1,3) ) )
             # Perform the calculation for all point sources in the object vector.
-            for obj in [o for o in objVec
-             if isinstance( o, objectmodel.PointSource )]:
-                try:
-                    self.b.value = obj.position
-                    self.prob1.solve(solver=cvxpy.ECOS)
-                    if self.prob1.status != cvxpy.OPTIMAL:
-                        print( "Error1 status: %s" % self.prob1.status )
-                        gains[:,obj.objectId] = np.NaN
-                        pass
-                    self.l1min.value = self.prob1.value
-                    self.prob2.solve(solver=cvxpy.ECOS)
-                    if self.prob2.status != cvxpy.OPTIMAL:
-                        print( "Error2 status: %s" % self.prob2.status )
-                        gains[:,obj.objectId] = np.NaN
-                        pass
-                    # Assign a column in the gain matrix for each point source.
-                    # The indexing at the end of the assignment is to discard gains of virtual
-                    # loudspeakers.
-                    # Note: CVXPY 0.4.11 returns a 2D array, CVXPY >= 1.0 a vector.
-                    if cvxpyMajorVersion < 1:
-                        gains[:,obj.objectId] = normalise( self.g.value.T )[:,:self.numSpeakers]
+            for objIdx, obj in enumerate( pointSources ):
+                # Gains, status and fallback state are indexed by the object's audio channel,
+                # i.e., the gain matrix column, as in rcl.PanningCalculator.
+                channel = objectChannel( obj )
+                if not 0 <= channel < self.numObjects:
+                    continue
+                position = np.asarray( obj.position )
+                width = self.spreadWidth( obj )
+                if (width > 0.0) and (width >= self.spreadKernels.widths[0]):
+                    # Wide sources are taken from the kernels only, without solving the point-source problem.
+                    gains[:,channel] = self.spreadKernels.lookup( position, width )
+                    self.status[channel] = solverStatusOptimal
+                    continue
+                if self.planar is not None:
+                    g = planarGains[objIdx,:]
+                    self.status[channel] = solverStatusOptimal
+                elif (tier >= tierApproximateGains) and (tableIndices is not None) \
+                  and np.all( np.isfinite( tableGains[objIdx,:] ) ):
+                    # The extra element receives the unused slots of the entry.
+                    g = np.zeros( self.numSpeakers+1 )
+                    g[tableIndices[objIdx,:]] = tableGains[objIdx,:]
+                    g = g[:self.numSpeakers]
+                    self.status[channel] = solverStatusFallbackTable
+                elif tier >= tierApproximateGains:
+                    g, self.status[channel] = self.approximateGains( position )
+                else:
+                    g, solverStatus = self.solver.solve( position )
+                    if g is not None:
+                        self.status[channel] = solverStatusOptimal
+                        self.lastGoodGains[channel,:] = g
+                        self.lastGoodDirections[channel,:] = position
                     else:
-                        gains[:,obj.objectId] = normalise( self.g.value.T )[:self.numSpeakers]
-                except Exception as ex:
-                    print( "Caught exception: %s" % str(ex) )
-                    gains[:,obj.objectId] = np.NaN
+                        g, self.status[channel] = self.fallbackGains( channel, position )
+                        # No printing in the audio thread, the message is written asynchronously.
+                        self.failureLog.post( self.status[channel],
+                                             "Solver failed for object %d (%s), fallback %d used.",
+                                             obj.objectId, solverStatus, self.status[channel] )
+                if width > 0.0:
+                    g = self.spreadKernels.lookup( position, width, g )
+                # Assign a column in the gain matrix for each point source.
+                gains[:,channel] = g
+            if self.statusOut is not None:
+                np.asarray( self.statusOut.protocol.data() )[:] = self.status
+        if self.supervisor is not None:
+            self.supervisor.report( time.perf_counter() - startTime )
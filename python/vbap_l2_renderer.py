@@ -11,9 +11,12 @@ import panning
 import rcl
 
 from vbap_l2_panner import VbapL2Panner
+from gain_matrix import ActiveObjectGainMatrix, AdaptiveInterpolationGainMatrix
 
 class VbapL2Renderer( visr.CompositeComponent ):
-    def __init__( self, context, name, parent, numberOfObjects, lspArray ):
+    def __init__( self, context, name, parent, numberOfObjects, lspArray,
+                 telemetryName = None, adaptiveObjectCount = False, supervisor = None,
+                 adaptiveInterpolation = False, localNeighbourhood = False ):
         numLsp = lspArray.numberOfRegularLoudspeakers
         super().__init__( context, name, parent )
         self.audioIn = visr.AudioInputFloat( "in", self, numberOfObjects )
@@ -24,32 +27,87 @@ class VbapL2Renderer( visr.CompositeComponent ):
                                             pml.EmptyParameterConfig()
                                             )
         self.calculator = VbapL2Panner( context, "VbapGainCalculator", self,
-                                       numberOfObjects, lspArray )
-        self.matrix = rcl.GainMatrix( context, "GainMatrix", self, numberOfObjects,
-                                     numLsp, interpolationSteps=context.period,
-                                     initialGains=0.0)
+                                       numberOfObjects, lspArray,
+                                       statusOutput = telemetryName is not None,
+                                       skipSilentObjects = adaptiveObjectCount,
+                                       supervisor = supervisor,
+                                       localNeighbourhood = localNeighbourhood )
+        # Optional load-dependent quality reduction, see load_supervisor.py. Disabling the
+        # interpolation requires the Python gain matrix (adaptiveObjectCount).
+        self.supervisor = supervisor
+        if adaptiveObjectCount:
+            # Mix only the active objects, see VbapRenderer.
+            self.matrix = ActiveObjectGainMatrix( context, "GainMatrix", self,
+                                                 numberOfObjects, numLsp,
+                                                 supervisor = supervisor )
+            self.parameterConnection( self.objectIn, self.matrix.parameterPort("objects") )
+        elif adaptiveInterpolation:
+            # Ramp length depending on the size of the gain change, see VbapRenderer.
+            self.matrix = AdaptiveInterpolationGainMatrix( context, "GainMatrix", self,
+                                                          numberOfObjects, numLsp )
+        else:
+            self.matrix = rcl.GainMatrix( context, "GainMatrix", self, numberOfObjects,
+                                         numLsp, interpolationSteps=context.period,
+                                         initialGains=0.0)
         self.audioConnection( self.audioIn, self.matrix.audioPort("in") )
         self.audioConnection( self.matrix.audioPort("out"), self.audioOut )
         self.parameterConnection( self.objectIn,
                                  self.calculator.parameterPort("objects") )
         self.parameterConnection( self.calculator.parameterPort("gains"),
                                 self.matrix.parameterPort("gainInput" ) )
+        # Optional telemetry, see telemetry.py
+        if telemetryName is not None:
+            # Deferred import, shared memory support is loaded only if telemetry is enabled.
+            from telemetry_tap import TelemetryTap
+            self.telemetry = TelemetryTap( context, "Telemetry", self,
+                                          numberOfObjects = numberOfObjects,
+                                          numberOfLoudspeakers = numLsp,
+                                          telemetryName = telemetryName,
+                                          statusInput = True )
+            self.parameterConnection( self.objectIn, self.telemetry.parameterPort("objects") )
+            self.parameterConnection( self.calculator.parameterPort("gains"),
+                                     self.telemetry.parameterPort("gains") )
+            self.parameterConnection( self.calculator.parameterPort("status"),
+                                     self.telemetry.parameterPort("status") )
 
 class RealtimeVbapL2Renderer( visr.CompositeComponent ):
-    def __init__( self, context, name, parent, numberOfObjects, lspArray, nwPort ):
+    def __init__( self, context, name, parent, numberOfObjects, lspArray, nwPort,
+                 telemetryName = None, adaptiveObjectCount = False, supervisor = None,
+                 ingress = None, adaptiveInterpolation = False, localNeighbourhood = False ):
         super().__init__( context, name, parent )
         if not isinstance( lspArray, panning.LoudspeakerArray ):
             lspArray =  panning.LoudspeakerArray( lspArray )
         self.audioIn = visr.AudioInputFloat( "in", self, numberOfObjects )
         self.audioOut = visr.AudioOutputFloat( "out", self,
                                               lspArray.numberOfRegularLoudspeakers )
-        self.receiver = rcl.UdpReceiver( context, "NetworkReceiver", self, port=nwPort)
-        self.decoder = rcl.SceneDecoder( context, "SceneDecoder", self )
-        self.panner = VbapL2Renderer( context, "VbapPanner", self, numberOfObjects, lspArray )
+        # ingress takes the objects from a metadata_ingress.MetadataIngress, nwPort=None replaces
+        # the UDP receiver by a parameter input for the datagrams, see RealtimeVbapRenderer.
+        if ingress is not None:
+            self.receiver = None
+            # Deferred import, asyncio is loaded only if the metadata ingress is used.
+            from metadata_ingress import IngressObjectSource
+            self.decoder = IngressObjectSource( context, "MetadataIngress", self, ingress )
+        elif nwPort is None:
+            self.receiver = None
+            self.decoder = rcl.SceneDecoder( context, "SceneDecoder", self )
+            self.datagramIn = visr.ParameterInput( "datagrams", self,
+                                                  pml.StringParameter.staticType,
+                                                  pml.MessageQueueProtocol.staticType,
+                                                  pml.EmptyParameterConfig() )
+            self.parameterConnection( self.datagramIn, self.decoder.parameterPort("datagramInput") )
+        else:
+            self.decoder = rcl.SceneDecoder( context, "SceneDecoder", self )
+            self.receiver = rcl.UdpReceiver( context, "NetworkReceiver", self, port=nwPort)
+            self.parameterConnection( self.receiver.parameterPort("messageOutput"),
+                                     self.decoder.parameterPort("datagramInput") )
+        self.panner = VbapL2Renderer( context, "VbapPanner", self, numberOfObjects, lspArray,
+                                     telemetryName = telemetryName,
+                                     adaptiveObjectCount = adaptiveObjectCount,
+                                     supervisor = supervisor,
+                                     adaptiveInterpolation = adaptiveInterpolation,
+                                     localNeighbourhood = localNeighbourhood )
         self.audioConnection( self.audioIn, self.panner.audioPort("in") )
         self.audioConnection( self.panner.audioPort("out"), self.audioOut )
-        self.parameterConnection( self.receiver.parameterPort("messageOutput"),
-                                 self.decoder.parameterPort("datagramInput") )
         self.parameterConnection( self.decoder.parameterPort("objectVectorOutput"),
                                  self.panner.parameterPort("objects") )
 
@@ -38,13 +38,15 @@ import pml
 import panning
 import rcl
 
-from gain_matrix import GainMatrix
+from gain_matrix import GainMatrix, ActiveObjectGainMatrix, AdaptiveInterpolationGainMatrix
 
 class VbapRenderer( visr.CompositeComponent ):
     """
     VISR component for rendering object audio to an arbitrary loudspeaker configuration.
     """
-    def __init__( self, context, name, parent, numberOfObjects, lspConfig ):
+    def __init__( self, context, name, parent, numberOfObjects, lspConfig,
+                 telemetryName = None, adaptiveObjectCount = False,
+                 adaptiveInterpolation = False ):
         """
         Constructor, instantiates the component, all contained sub-components,
         and their connections.
@@ -65,6 +67,17 @@ class VbapRenderer( visr.CompositeComponent ):
             The maximum number of objects to be rendered.
         lspConfig: panning.LoudspeakerArray
             Object containing the loudspeaker positions.
+        telemetryName: string or None
+            If given, the gains and object positions are published to a shared-memory
+            telemetry buffer of this name (see telemetry.py). None (default) disables telemetry.
+        adaptiveObjectCount: bool
+            If True, only the objects that are present in the object vector and have a nonzero
+            level are mixed (see gain_matrix.ActiveObjectGainMatrix), so the cost depends on
+            the number of active objects rather than numberOfObjects.
+        adaptiveInterpolation: bool
+            If True (and adaptiveObjectCount is False), gain changes are interpolated over a
+            ramp length that depends on the size of the change, and unchanged gains are not
+            interpolated (see gain_matrix.AdaptiveInterpolationGainMatrix).
         """
         numLsp = lspConfig.numberOfRegularLoudspeakers
         super().__init__( context, name, parent )
@@ -77,9 +90,17 @@ class VbapRenderer( visr.CompositeComponent ):
                                             )
         self.calculator = rcl.PanningCalculator( context, "VbapGainCalculator", self,
                                                 numberOfObjects, lspConfig )
-        self.matrix = rcl.GainMatrix( context, "GainMatrix", self, numberOfObjects,
-                                     numLsp, interpolationSteps=context.period,
-                                     initialGains=0.0 )
+        if adaptiveObjectCount:
+            self.matrix = ActiveObjectGainMatrix( context, "GainMatrix", self,
+                                                 numberOfObjects, numLsp )
+            self.parameterConnection( self.objectIn, self.matrix.parameterPort("objects") )
+        elif adaptiveInterpolation:
+            self.matrix = AdaptiveInterpolationGainMatrix( context, "GainMatrix", self,
+                                                          numberOfObjects, numLsp )
+        else:
+            self.matrix = rcl.GainMatrix( context, "GainMatrix", self, numberOfObjects,
+                                         numLsp, interpolationSteps=context.period,
+                                         initialGains=0.0 )
 # Uncomment this and comment the lines above to use the simple, Python-based
 # GainMatrix class instead.
 #        self.matrix = GainMatrix( context, "GainMatrix", self, numberOfObjects,
@@ -90,6 +111,16 @@ class VbapRenderer( visr.CompositeComponent ):
                                  self.calculator.parameterPort("objectVectorInput") )
         self.parameterConnection( self.calculator.parameterPort("vbapGains"),
                                 self.matrix.parameterPort("gainInput" ) )
+        if telemetryName is not None:
+            # Deferred import, shared memory support is loaded only if telemetry is enabled.
+            from telemetry_tap import TelemetryTap
+            self.telemetry = TelemetryTap( context, "Telemetry", self,
+                                          numberOfObjects = numberOfObjects,
+                                          numberOfLoudspeakers = numLsp,
+                                          telemetryName = telemetryName )
+            self.parameterConnection( self.objectIn, self.telemetry.parameterPort("objects") )
+            self.parameterConnection( self.calculator.parameterPort("vbapGains"),
+                                     self.telemetry.parameterPort("gains") )
 
 class RealtimeVbapRenderer( visr.CompositeComponent ):
     """
@@ -97,7 +128,9 @@ class RealtimeVbapRenderer( visr.CompositeComponent ):
 
     This variant adds a UDP network receiver to accept object metadata as network messages.
     """
-    def __init__( self, context, name, parent, numberOfObjects, lspConfig, nwPort ):
+    def __init__( self, context, name, parent, numberOfObjects, lspConfig, nwPort,
+                 telemetryName = None, adaptiveObjectCount = False, ingress = None,
+                 adaptiveInterpolation = False ):
         """
         Constructor, instantiates the component, all contained sub-components,
         and their connections.
@@ -118,8 +151,21 @@ class RealtimeVbapRenderer( visr.CompositeComponent ):
             The maximum number of objects to be rendered.
         lspConfig: panning.LoudspeakerArray
             Object containing the loudspeaker positions.
-        nwPort: int
-            Port number of a UDP connection to receive object metadata messages.
+        nwPort: int or None
+            Port number of a UDP connection to receive object metadata messages. If None,
+            the metadata messages are received through a parameter input "datagrams"
+            (pml.StringParameter, message queue protocol) instead, e.g., to replay recorded
+            messages in an offline signal flow (see metadata_replay.py).
+        telemetryName: string or None
+            Name of a shared-memory telemetry buffer, see VbapRenderer. None disables telemetry.
+        adaptiveObjectCount: bool
+            Whether to mix only the active objects, see VbapRenderer.
+        ingress: metadata_ingress.MetadataIngress or None
+            If given, the object metadata is taken from this ingress, which merges the
+            messages of multiple UDP and TCP senders on a background thread, and nwPort
+            is ignored.
+        adaptiveInterpolation: bool
+            Whether to adapt the gain interpolation to the size of the changes, see VbapRenderer.
         """
         super().__init__( context, name, parent )
         if not isinstance( lspConfig, panning.LoudspeakerArray ):
@@ -127,12 +173,30 @@ class RealtimeVbapRenderer( visr.CompositeComponent ):
         self.audioIn = visr.AudioInputFloat( "in", self, numberOfObjects )
         self.audioOut = visr.AudioOutputFloat( "out", self,
                                               lspConfig.numberOfRegularLoudspeakers )
-        self.receiver = rcl.UdpReceiver( context, "NetworkReceiver", self, port=nwPort)
-        self.decoder = rcl.SceneDecoder( context, "SceneDecoder", self )
-        self.panner = VbapRenderer( context, "VbapPanner", self, numberOfObjects, lspConfig )
+        if ingress is not None:
+            # Parsing and merging happen on the ingress thread, see metadata_ingress.py.
+            self.receiver = None
+            # Deferred import, asyncio is loaded only if the metadata ingress is used.
+            from metadata_ingress import IngressObjectSource
+            self.decoder = IngressObjectSource( context, "MetadataIngress", self, ingress )
+        elif nwPort is None:
+            self.receiver = None
+            self.decoder = rcl.SceneDecoder( context, "SceneDecoder", self )
+            self.datagramIn = visr.ParameterInput( "datagrams", self,
+                                                  pml.StringParameter.staticType,
+                                                  pml.MessageQueueProtocol.staticType,
+                                                  pml.EmptyParameterConfig() )
+            self.parameterConnection( self.datagramIn, self.decoder.parameterPort("datagramInput") )
+        else:
+            self.decoder = rcl.SceneDecoder( context, "SceneDecoder", self )
+            self.receiver = rcl.UdpReceiver( context, "NetworkReceiver", self, port=nwPort)
+            self.parameterConnection( self.receiver.parameterPort("messageOutput"),
+                                     self.decoder.parameterPort("datagramInput") )
+        self.panner = VbapRenderer( context, "VbapPanner", self, numberOfObjects, lspConfig,
+                                   telemetryName = telemetryName,
+                                   adaptiveObjectCount = adaptiveObjectCount,
+                                   adaptiveInterpolation = adaptiveInterpolation )
         self.audioConnection( self.audioIn, self.panner.audioPort("in") )
         self.audioConnection( self.panner.audioPort("out"), self.audioOut )
-        self.parameterConnection( self.receiver.parameterPort("messageOutput"),
-                                 self.decoder.parameterPort("datagramInput") )
         self.parameterConnection( self.decoder.parameterPort("objectVectorOutput"),
                                  self.panner.parameterPort("objects") )
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+# -*- coding: utf-8 -*-
+
+# Copyright (C) 2018 Andreas Franck <a.franck@soton.ac.uk>
+# Copyright (C) 2018 University of Southampton
+
+# Code accompanying the paper:
+
+# Andreas Franck and Filippo Maria Fazi, “VISR – A versatile open software
+# framework for audio signal processing,” in Proc. Audio Eng. Soc. 2018 Int. Conf.
+# Spatial Reproduction, Tokyo, Japan, 2018.
+
+# We kindly ask to acknowledge the use of this software in publications or software
+# by citing this paper.
+
+# The code is provided under the ISC (Internet Systems Consortium) license
+# https://www.isc.org/downloads/software-support-policy/isc-license/ :
+
+# Permission to use, copy, modify, and/or distribute this software for any
+# purpose with or without fee is hereby granted, provided that the above
+# copyright notice and this permission notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND THE AUTHOR DISCLAIMS ALL WARRANTIES
+# WITH REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS. IN NO EVENT SHALL THE AUTHOR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM LOSS
+# OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE OR OTHER TORTIOUS
+# ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS SOFTWARE.
+
+"""
+File verify_local_l2_solver.py
+
+Compares the gains of the reduced VBAP L2 problems (LocalL2GainSolver) with the
+full problem (L2GainSolver) on approximately uniformly distributed directions
+(for planar layouts, on directions in the horizontal plane), and reports the maximum gain deviation, the solver failures, the size of the
+reduced problems and the solve times.
+
+Usage: python verify_local_l2_solver.py [LAYOUT.xml ...] [--synthetic N ...] [--directions N] [--tolerance TOL]
+
+--synthetic adds layouts of N loudspeakers distributed on the sphere, e.g., to
+check the solve times of large arrays.
+
+Exits with status 1 if the deviation exceeds the tolerance for any layout.
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+
+import panning
+
+from vbap_l2_panner import L2GainSolver, LocalL2GainSolver
+from spread_kernels import fibonacciSphere
+from helper.vectorFunctions import normalise
+
+def compareSolvers( positions, numberOfRegularLoudspeakers, directions ):
+    """
+    Solve the full and the reduced problems for a set of directions.
+
+    Parameters
+    ----------
+    positions: np.ndarray
+        Loudspeaker positions, dimension #loudspeakers x 3 (regular loudspeakers first).
+    numberOfRegularLoudspeakers: int
+    directions: np.ndarray
+        Source directions, dimension #directions x 3.
+
+    Returns
+    -------
+    dict with the maximum absolute gain difference ('maxError'), the number of
+    failures of both solvers ('fullFailures', 'localFailures'), the mean and maximum
+    number of loudspeakers in the reduced problems, and the mean solve times in seconds.
+    """
+    L = normalise( np.asarray( positions, dtype=np.float64 ).T, norm=2, axis=0 )
+    numReg = numberOfRegularLoudspeakers
+    fullSolver = L2GainSolver( L, numReg )
+    # No fallback, to count the failures of the reduced problems.
+    localSolver = LocalL2GainSolver( L, numReg )
+    fullSolver.warmUp()
+    localSolver.warmUp()
+    startTime = time.perf_counter()
+    fullGains = fullSolver.calculateGains( directions )
+    fullTime = time.perf_counter() - startTime
+    startTime = time.perf_counter()
+    localGains = localSolver.calculateGains( directions )
+    localTime = time.perf_counter() - startTime
+    sizes = np.array( [ len( localSolver.candidates( d )[0] ) for d in directions ] )
+    valid = np.all( np.isfinite( fullGains ), axis=-1 ) & np.all( np.isfinite( localGains ), axis=-1 )
+    return { 'maxError': float( np.max( np.abs( fullGains[valid] - localGains[valid] ), initial=0.0 ) ),
+             'fullFailures': int( np.sum( ~np.all( np.isfinite( fullGains ), axis=-1 ) ) ),
+             'localFailures': int( np.sum( ~np.all( np.isfinite( localGains ), axis=-1 ) ) ),
+             'meanSize': float( np.mean( sizes ) ), 'maxSize': int( np.max( sizes ) ),
+             'fullTime': fullTime / len( directions ), 'localTime': localTime / len( directions ) }
+
+def main():
+    parser = argparse.ArgumentParser( description="Verify the reduced VBAP L2 problems against the full problem." )
+    parser.add_argument( 'layouts', nargs='*',
+                        help='Layout files (default: all XML files in ../data).' )
+    parser.add_argument( '--synthetic', type=int, nargs='*', default=[],
+                        help='Numbers of loudspeakers of additional synthetic layouts.' )
+    parser.add_argument( '--directions', type=int, default=1000,
+                        help='Number of test directions (default: 1000).' )
+    parser.add_argument( '--tolerance', type=float, default=1e-4,
+                        help='Maximum accepted gain difference (default: 1e-4).' )
+    args = parser.parse_args()
+    layouts = args.layouts if args.layouts else \
+        sorted( glob.glob( os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), '..', 'data', '*.xml' ) ) )
+    cases = []
+    for layout in layouts:
+        lspArray = panning.LoudspeakerArray( layout )
+        cases.append( (os.path.basename( layout ), lspArray.positions(), lspArray.numberOfRegularLoudspeakers) )
+    for numLsp in args.synthetic:
+        cases.append( ("synthetic-%d" % numLsp, fibonacciSphere( numLsp ), numLsp) )
+    sphere = fibonacciSphere( args.directions )
+    azimuths = np.linspace( -np.pi, np.pi, args.directions, endpoint=False )
+    circle = np.stack( (np.cos( azimuths ), np.sin( azimuths ), np.zeros_like( azimuths )), axis=-1 )
+    passed = True
+    for name, positions, numReg in cases:
+        planar = np.max( np.abs( normalise( positions, norm=2, axis=-1 )[:,2] ) ) < 1e-3
+        result = compareSolvers( positions, numReg, circle if planar else sphere )
+        ok = (result['maxError'] <= args.tolerance) and (result['localFailures'] <= result['fullFailures'])
+        passed = passed and ok
+        print( "%-20s %3d loudspeakers, reduced size mean %4.1f max %2d, max error %.2e, failures full %d reduced %d,"
+               " solve time full %.2f ms reduced %.2f ms %s"
+               % (name, numReg, result['meanSize'], result['maxSize'],
+                  result['maxError'], result['fullFailures'], result['localFailures'],
+                  1e3*result['fullTime'], 1e3*result['localTime'], "ok" if ok else "FAILED") )
+    sys.exit( 0 if passed else 1 )
+
+if __name__ == "__main__":
+    main()